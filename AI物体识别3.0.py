@@ -5,34 +5,62 @@ import uasyncio as asyncio
 from machine import Pin, SPI, I2C, reset
 import atk_xl9555 as io_ex
 import atk_lcd as lcd
-import urequests
+import async_http
+import llm_client
+import metrics
+import http_server
+from frame_source import FrameSource
+from result_cache import ResultCache
+from monitor import Monitor, ChangeDetector
+from job_queue import JobQueue
+from static_assets import StaticAssets
+from adaptive_quality import QualityController
+from circuit_breaker import CircuitBreaker
+from lcd_preview import Preview
+import local_classifier
+import roi
+import detections
+from detection_log import DetectionLog
+import mqtt_events
+import websocket
+from startup import Startup
+import startup
+import jpeg_features
 import json
+import struct
 import gc
-import ubinascii
+
+# --------- 启动状态 ----------
+# WiFi 连接与摄像头、LCD 的上电序列同时进行；网络就绪即启动 HTTP 服务，
+# 摄像头就绪前相关接口返回 503 和启动状态（见 needs_camera、/status）
+boot = Startup(("wifi", "lcd", "camera", "http"))
 
 # --------- 硬件初始化 ----------
-def hardware_init():
+CAMERA_RESET_MS = 150          # 摄像头复位脉冲宽度
+LCD_RESET_MS = 100             # LCD 复位脉冲宽度
+LCD_RESET_WAIT_MS = 150        # LCD 复位释放后到可以初始化的时间
+CAMERA_INIT_TIMEOUT_MS = 5000  # 摄像头上电后轮询初始化的总时限
+
+def io_expander_init():
+    i2c0 = I2C(0, scl=Pin(42), sda=Pin(41), freq=400000)
+    xl9555 = io_ex.init(i2c0)
+    
+    # 初始化蜂鸣器（低电平触发）
+    xl9555.write_bit(io_ex.BEEP, 0)
+    return xl9555
+
+async def lcd_init(xl9555):
+    """
+    LCD 复位序列、SPI 初始化并开启电源
+    :return: 显示对象，失败返回 None
+    """
+    phase = boot.begin("lcd", "lcd")
     try:
-        i2c0 = I2C(0, scl=Pin(42), sda=Pin(41), freq=400000)
-        xl9555 = io_ex.init(i2c0)
-        
-        # 初始化蜂鸣器（低电平触发）
-        xl9555.write_bit(io_ex.BEEP, 0)
-        
-        # 摄像头复位序列
-        xl9555.write_bit(io_ex.OV_RESET, 0)  # 复位拉低
-        xl9555.write_bit(io_ex.OV_PWDN, 1)  # 电源关闭
-        time.sleep_ms(150)
-        
-        xl9555.write_bit(io_ex.OV_RESET, 1)  # 复位释放
-        xl9555.write_bit(io_ex.OV_PWDN, 0)  # 电源开启
-        time.sleep_ms(250)  # 等待摄像头稳定
-        
         # LCD 复位序列
         xl9555.write_bit(io_ex.SLCD_RST, 0)
-        time.sleep_ms(100)
+        await asyncio.sleep_ms(LCD_RESET_MS)
         xl9555.write_bit(io_ex.SLCD_RST, 1)
-        time.sleep_ms(150)
+        await asyncio.sleep_ms(LCD_RESET_WAIT_MS)
         
         # 初始化 SPI 和 LCD
         spi = SPI(2, baudrate=80000000, sck=Pin(12), mosi=Pin(11), miso=Pin(13))
@@ -44,518 +72,1337 @@ def hardware_init():
             lcd=0
         )
         xl9555.write_bit(io_ex.SLCD_PWR, 1)  # LCD电源开启
-        time.sleep_ms(200)
-        
-        # 摄像头初始化（带重试机制）
-        cam_success = False
-        for i in range(5):
-            try:
-                cam = camera.init(
-                    0, 
-                    format=camera.JPEG, 
-                    fb_location=camera.PSRAM,
-                    framesize=camera.FRAME_QQVGA,  # 使用更小的分辨率
-                    xclk_freq=20000000
-                )
-                if cam:
-                    print(f"Camera initialized on attempt {i+1}")
-                    cam_success = True
-                    break
-            except Exception as e:
-                print(f"Camera init error: {e}")
-            camera.deinit()
-            time.sleep(1)
-        
-        if not cam_success:
-            print("Camera init failed after retries")
-            return None, None
-        
-        return xl9555, display
+    except Exception as e:
+        boot.end(phase, "lcd", False, e)
+        return None
+    boot.end(phase, "lcd")
+    return display
+
+def camera_try_init():
+    """尝试初始化一次摄像头，传感器尚未就绪时失败"""
+    try:
+        if camera.init(
+            0, 
+            format=camera.JPEG, 
+            fb_location=camera.PSRAM,
+            framesize=camera.FRAME_QQVGA,  # 使用更小的分辨率
+            xclk_freq=20000000
+        ):
+            return True
+    except Exception as e:
+        print(f"Camera init error: {e}")
+    camera.deinit()
+    return False
+
+async def camera_init(xl9555):
+    """
+    摄像头复位、上电并初始化
+    上电后不再固定等待 250ms、失败后等 1s 重试，而是从 50ms 开始按指数间隔轮询初始化
+    :return: 是否成功
+    """
+    phase = boot.begin("camera", "camera")
+    # 摄像头复位序列
+    xl9555.write_bit(io_ex.OV_RESET, 0)  # 复位拉低
+    xl9555.write_bit(io_ex.OV_PWDN, 1)  # 电源关闭
+    await asyncio.sleep_ms(CAMERA_RESET_MS)
+    xl9555.write_bit(io_ex.OV_RESET, 1)  # 复位释放
+    xl9555.write_bit(io_ex.OV_PWDN, 0)  # 电源开启
     
+    ok = await startup.poll(camera_try_init, CAMERA_INIT_TIMEOUT_MS)
+    boot.end(phase, "camera", bool(ok), None if ok else "camera init timed out")
+    return bool(ok)
+
+async def hardware_init():
+    """
+    硬件初始化，LCD 和摄像头的上电序列同时进行
+    :return: (xl9555, display)，失败时返回 (None, None)
+    """
+    try:
+        xl9555 = io_expander_init()
     except Exception as e:
         print(f"Hardware init failed: {e}")
+        boot.state["camera"] = boot.state["lcd"] = startup.FAILED
         return None, None
+    display, cam_ok = await asyncio.gather(lcd_init(xl9555), camera_init(xl9555))
+    if display is None or not cam_ok:
+        return None, None
+    return xl9555, display
 
 # --------- 连接 WiFi ----------
-def connect_wifi(ssid, password):
+WIFI_SSID = "Your_Wifi_Name"          # 使用你的WiFi凭证
+WIFI_PASSWORD = "Your_Wifi_Password"
+WIFI_TIMEOUT_MS = 20000               # 每次连接尝试的时限
+WIFI_RETRIES = 3
+
+# 明确失败的连接状态（固件有定义时），不必等到超时
+WIFI_FAILURES = tuple(getattr(network, name) for name in
+                      ("STAT_WRONG_PASSWORD", "STAT_NO_AP_FOUND", "STAT_CONNECT_FAIL")
+                      if hasattr(network, name))
+
+def wifi_start(ssid, password):
+    """开始连接 WiFi，立即返回（连接在后台进行）"""
     wlan = network.WLAN(network.STA_IF)
     wlan.active(True)
     wlan.disconnect()  # 确保从之前的连接中断开
     
     print(f'Connecting to {ssid}...')
     wlan.connect(ssid, password)
-    
-    max_retry = 20
-    for i in range(max_retry):
-        if wlan.isconnected():
-            break
-        print(f'Waiting... ({i+1}/{max_retry})')
-        time.sleep(1)
-    
-    if not wlan.isconnected():
-        print('WiFi connection failed!')
-        return None
-    
-    print('Network config:', wlan.ifconfig())
-    return wlan.ifconfig()[0]
+    return wlan
+
+def wifi_ip(wlan):
+    """
+    轮询用：已连接时返回 IP
+    :raises OSError: 连接已明确失败，或其他启动步骤已失败
+    """
+    if wlan.isconnected():
+        return wlan.ifconfig()[0]
+    status = wlan.status()
+    if status in WIFI_FAILURES:
+        raise OSError(f"WiFi status {status}")
+    if boot.failed():
+        raise OSError(f"{', '.join(boot.failed())} failed")
+    return None
+
+async def connect_wifi(wlan, ssid, password):
+    """
+    等待 WiFi 连接，失败时立即重新连接（最多 WIFI_RETRIES 次）
+    :return: IP 地址，失败返回 None
+    """
+    phase = boot.begin("wifi", "wifi")
+    error = None
+    for i in range(WIFI_RETRIES):
+        if i:
+            print(f"WiFi connection failed ({error}), retry {i}/{WIFI_RETRIES - 1}")
+            wlan.disconnect()
+            wlan.connect(ssid, password)
+        try:
+            ip = await startup.poll(lambda: wifi_ip(wlan), WIFI_TIMEOUT_MS, interval_ms=50, max_interval_ms=50)
+        except OSError as e:
+            ip, error = None, e
+            if boot.failed():
+                break
+        else:
+            error = "timeout"
+        if ip:
+            boot.end(phase, "wifi")
+            print('Network config:', wlan.ifconfig())
+            return ip
+    boot.end(phase, "wifi", False, error)
+    return None
 
 # Moonshot API配置
 MOONSHOT_API_KEY = "sk-1*****************nabssY"  # 替换为你的Moonshot API密钥
 MOONSHOT_API_URL = "https://api.moonshot.cn/v1/chat/completions" # 替换为你所需模型
 
-def analyze_image_with_ai(image_data, prompt="请描述这张图片的内容"):
+# 与API服务器保持的 keep-alive 连接，避免每次请求都重新进行 TCP/TLS 握手
+api_pool = async_http.ConnectionPool(max_idle=1, idle_ms=20000)
+
+# 超时与重试：连接、首字节、两次读取之间各自限时，整个调用（含重试）不超过 API_TOTAL_MS
+API_TIMEOUTS = async_http.Timeouts(connect_ms=8000, ttfb_ms=20000, read_ms=10000)
+API_TOTAL_MS = 45000
+API_RETRIES = 2
+# 连续 API_BREAKER_FAILURES 次失败后熔断，冷却期内直接返回错误（或转到备用后端）
+API_BREAKER_FAILURES = 3
+API_BREAKER_RESET_MS = 30000
+
+# 备用后端（可选）：主后端失败或熔断时使用，可以是另一个模型或局域网内的服务，如
+# FALLBACK_BACKEND = llm_client.local("http://192.168.1.100:8000/v1/chat/completions", model="qwen2-vl")
+FALLBACK_BACKEND = None
+
+def make_client(backend, fallback=None):
+    """创建带超时、重试和熔断的客户端（连接池按主机区分，主备共用）"""
+    return llm_client.LLMClient(
+        backend,
+        pool=api_pool,
+        timeouts=API_TIMEOUTS,
+        total_ms=API_TOTAL_MS,
+        retries=API_RETRIES,
+        breaker=CircuitBreaker(API_BREAKER_FAILURES, API_BREAKER_RESET_MS),
+        fallback=fallback
+    )
+
+# 视觉模型客户端：请求头和请求体模板在创建时生成一次
+vision_client = make_client(
+    llm_client.moonshot(MOONSHOT_API_KEY, url=MOONSHOT_API_URL),
+    make_client(FALLBACK_BACKEND) if FALLBACK_BACKEND is not None else None
+)
+is_api_failure = llm_client.is_api_failure
+
+def analysis_fields(result):
+    """分析结果的 status / analysis 字段，失败时附带结构化的 error"""
+    if is_api_failure(result):
+        return {"status": "error", "analysis": str(result), "error": result.info()}
+    return {"status": "success", "analysis": result}
+
+async def analyze_image_with_ai(image_data, prompt="请描述这张图片的内容", labels=None):
     """
-    使用Moonshot API分析图片
-    :param image_data: 图片的二进制数据
+    使用Moonshot API分析图片（异步，等待期间服务器仍可处理其他请求）
+    :param image_data: 图片的二进制数据，或多张图片的列表
     :param prompt: 给AI的提示词
+    :param labels: 多张图片时每张图片的说明文字
     :return: AI的分析结果
     """
-    # 将图片转换为base64编码
-    image_b64 = ubinascii.b2a_base64(image_data).decode('utf-8').strip()
-    
-    # 创建请求头
-    headers = {
-        "Authorization": f"Bearer {MOONSHOT_API_KEY}",
-        "Content-Type": "application/json"
+    return await vision_client.vision(image_data, prompt, labels)
+
+async def analyze_image_stream(image_data, on_delta, prompt="请描述这张图片的内容", labels=None):
+    """
+    以流式模式（stream: true）调用Moonshot API分析图片
+    边解析 server-sent events 边回调，不在内存中保留完整回复
+    :param image_data: 图片的二进制数据，或多张图片的列表
+    :param on_delta: 每收到一段增量文本时 await 的回调 on_delta(text)
+    :param prompt: 给AI的提示词
+    :param labels: 多张图片时每张图片的说明文字
+    :return: 成功返回 None，失败返回错误信息
+    """
+    return await vision_client.vision(image_data, prompt, labels, on_delta=on_delta)
+
+# --------- 分析结果缓存 ----------
+CACHE_ENABLED = True
+CACHE_THRESHOLD = 6            # 感知哈希汉明距离阈值（64 位中不同的位数）
+CACHE_TTL_MS = 5 * 60 * 1000   # 缓存有效期
+CACHE_MAX_ENTRIES = 16
+CACHE_MAX_BYTES = 8 * 1024     # 缓存文本的内存上限
+
+result_cache = ResultCache(
+    threshold=CACHE_THRESHOLD,
+    ttl_ms=CACHE_TTL_MS,
+    max_entries=CACHE_MAX_ENTRIES,
+    max_bytes=CACHE_MAX_BYTES
+)
+
+# --------- 本地分类器 ----------
+# 用默认提示词分析时先在本地分类（模型文件由 host/eval_classifier.py 训练生成），
+# 置信度不低于阈值时直接回答，否则调用云端模型；自定义提示词的请求总是交给云端
+LOCAL_MODEL_FILE = "classifier.json"
+LOCAL_THRESHOLD = 0.3
+LOCAL_PROMPTS = ("请描述这张图片的内容",)
+
+local_model = local_classifier.load(LOCAL_MODEL_FILE, LOCAL_THRESHOLD)
+
+# --------- 感兴趣区域（ROI） ----------
+# 上传前把帧无损裁剪到有用的区域，上传字节数和图片 token 数按面积减少
+# ROI_MODE: "off" 整帧；"fixed" 使用 ROI_REGIONS；
+#           "motion" 与上次分析的画面比较取变化区域（无变化时使用 ROI_REGIONS，未配置则整帧）
+# 可用 /analyze?roi=off|fixed|motion 按请求指定
+ROI_MODE = "off"
+ROI_REGIONS = [(0.1, 0.1, 0.8, 0.8)]  # (x, y, w, h)，相对画面宽高的比例；多个区域即分块
+ROI_TILES = "together"                # "together" 各区域放在同一条消息中，"each" 每个区域单独分析
+ROI_MODES = ("off", "fixed", "motion")
+
+motion_roi = roi.MotionROI()
+roi_stats = {"crops": 0, "bytes": 0, "full_bytes": 0}  # 裁剪次数、实际上传与整帧的字节数
+
+# --------- 结构化结果与识别记录 ----------
+# 结构化模式下要求模型只输出 JSON（类别、数量、可选的坐标框），校验后放在结果的 detections 字段，
+# 坐标换算为原图像素；每条结果写入 flash 上的识别记录日志（32 字节定长记录，分段轮换，带时间索引），
+# 可用 /history?from=&to=&label= 按时间和类别查询
+STRUCTURED_OUTPUT = True          # /analyze 和监控的默认格式，可用 /analyze?format=json|text 按请求指定
+HISTORY_ENABLED = True
+HISTORY_DIR = "history"
+HISTORY_SEGMENT_RECORDS = 4096    # 每段记录数（每段 128KB）
+HISTORY_MAX_SEGMENTS = 10         # 最多占用 1.25MB，写满后删除最旧的一段
+HISTORY_MAX_RESULTS = 100         # /history 单次最多返回的记录数
+# 记录时间用 time.time()：RTC 断电后从纪元（2000 年）重新开始，每次启动的记录时间会重叠，
+# 日志每次时间倒退都换新段，几次重启就会把旧记录挤掉。因此联网后先用 NTP 校时，
+# 时钟早于 CLOCK_VALID_AFTER（未校时）时不写识别记录
+NTP_HOST = "ntp.aliyun.com"       # None 表示不校时（如 RTC 有后备电池）
+NTP_RETRY_MS = 60000              # 校时失败后的重试间隔
+CLOCK_VALID_AFTER = 757382400     # 2024-01-01（2000 年纪元；1970 年纪元的时间更大，同样有效）
+
+history = DetectionLog(HISTORY_DIR, HISTORY_SEGMENT_RECORDS, HISTORY_MAX_SEGMENTS).open() if HISTORY_ENABLED else None
+structured_stats = {"parsed": 0, "invalid": 0}  # 结构化回复校验通过/失败的次数
+history_unsynced = [0]  # 时钟未校准而没有写入的记录数
+
+def clock_valid():
+    return time.time() >= CLOCK_VALID_AFTER
+
+async def sync_clock():
+    """联网后用 NTP 校准 RTC，失败时每 NTP_RETRY_MS 重试，直到时钟有效"""
+    while not clock_valid():
+        try:
+            import ntptime
+            ntptime.host = NTP_HOST
+            ntptime.settime()  # 阻塞，最多等待 ntptime.timeout 秒
+            print("Clock synced:", time.localtime())
+        except (ImportError, OSError) as e:
+            print(f"NTP sync failed: {e}")
+            await asyncio.sleep_ms(NTP_RETRY_MS)
+
+def decode_frame(image_data, force=False):
+    """
+    解码帧的 DC 缩略图，感知哈希、本地分类器、ROI 和结构化结果的坐标换算共用
+    :param force: 缓存和本地分类器都关闭时也解码（ROI、结构化结果需要）
+    :return: jpeg_features.decode_dc() 的结果，不需要或 JPEG 无法解析时返回 None
+    """
+    if not (CACHE_ENABLED or local_model is not None or force):
+        return None
+    start = time.ticks_ms()
+    try:
+        dc = jpeg_features.decode_dc(image_data)
+    except Exception as e:
+        print(f"Frame decode error: {e}")
+        return None
+    metrics.since("decode", start)
+    return dc
+
+def frame_hash(dc):
+    """
+    帧的感知哈希（基于JPEG的DC系数缩略图）
+    :param dc: decode_frame() 的结果
+    :return: 64位哈希，缓存关闭或JPEG无法解析时返回 None
+    """
+    if not CACHE_ENABLED or dc is None:
+        return None
+    return jpeg_features.dhash_plane(*dc[2][0])
+
+def classify_local(dc, prompt):
+    """
+    本地分类
+    :return: 分类结果 {"label", "confidence", "local", "ms"}，不适用时返回 None
+    """
+    if local_model is None or dc is None or prompt not in LOCAL_PROMPTS:
+        return None
+    guess = local_model.classify_dc(dc)
+    print(f"Local classifier: {guess}")
+    return guess
+
+def roi_mode(req):
+    """请求指定的 ROI 模式，未指定或无效时使用 ROI_MODE"""
+    mode = req.param("roi")
+    return mode if mode in ROI_MODES else ROI_MODE
+
+def output_format(req):
+    """请求是否使用结构化结果：format=json|text，未指定时按 STRUCTURED_OUTPUT"""
+    fmt = req.param("format")
+    if fmt in ("json", "text"):
+        return fmt == "json"
+    return STRUCTURED_OUTPUT
+
+def cache_key(prompt, mode, structured=False):
+    """结果缓存的键：裁剪后的分析结果与整帧不同，按 ROI 模式区分；结构化结果单独缓存"""
+    key = prompt if mode == "off" else prompt + "\n#roi=" + mode
+    return key + "\n#json" if structured else key
+
+def upload_regions(dc, roi_info):
+    """上传的各图片在原图中的区域 [(x, y, w, h)]，画面尺寸未知时返回 None"""
+    if roi_info is not None:
+        return [(r["x"], r["y"], r["w"], r["h"]) for r in roi_info["regions"]]
+    if dc is not None:
+        return [(0, 0, dc[0], dc[1])]
+    return None
+
+def parse_detections(result, regions):
+    """
+    校验结构化回复
+    :return: detections.parse() 的结果，回复不符合格式时返回 None（按普通文本返回）
+    """
+    try:
+        found = detections.parse(result, regions)
+    except ValueError as e:
+        structured_stats["invalid"] += 1
+        print(f"Invalid structured reply: {e}")
+        return None
+    structured_stats["parsed"] += 1
+    return found
+
+def record_detections(found, source, seq, dc):
+    """把识别结果追加到识别记录日志"""
+    if history is None or found is None:
+        return
+    if not clock_valid():
+        history_unsynced[0] += 1
+        return
+    start = time.ticks_ms()
+    try:
+        history.append(int(time.time()), seq or 0, source, found["objects"], (dc[0], dc[1]) if dc else None)
+    except OSError as e:
+        print(f"History write error: {e}")
+    metrics.since("history_write", start)
+
+async def prepare_upload(image_data, dc, mode):
+    """
+    按 ROI 模式裁剪要上传的图片
+    :param dc: decode_frame() 的结果
+    :return: (图片或图片列表, 每张图片的说明文字或 None, ROI 信息或 None)
+    """
+    if mode == "off" or dc is None:
+        return image_data, None, None
+    width, height = dc[0], dc[1]
+    rects = None
+    if mode == "motion":
+        rect = motion_roi.update(dc)
+        rects = [rect] if rect else None
+    if rects is None and ROI_REGIONS:
+        rects = roi.fixed_rects(width, height, ROI_REGIONS)
+    if not rects:
+        return image_data, None, None
+    try:
+        tiles = await roi.crop(image_data, rects)
+    except ValueError as e:
+        print(f"ROI crop failed, sending full frame: {e}")
+        return image_data, None, None
+    images = []
+    labels = []
+    regions = []
+    for i, (tile, region) in enumerate(tiles):
+        images.append(tile)
+        labels.append(f"区域{i + 1}（原图 {width}x{height} 中 x={region.x}, y={region.y}, {region.w}x{region.h}）")
+        info = region.info()
+        info["bytes"] = len(tile)
+        regions.append(info)
+    sent = sum(len(t) for t in images)
+    roi_stats["crops"] += 1
+    roi_stats["bytes"] += sent
+    roi_stats["full_bytes"] += len(image_data)
+    print(f"ROI {mode}: {len(images)} region(s), {sent} of {len(image_data)} bytes")
+    return images, labels, {
+        "mode": mode,
+        "frame": {"width": width, "height": height},
+        "regions": regions,
+        "bytes": sent,
+        "full_bytes": len(image_data),
+        "area": round(sum(r["w"] * r["h"] for r in regions) / (width * height), 3)
     }
+
+async def analyze_tiles(images, labels, prompt):
+    """ROI_TILES = "each"：每个区域单独分析，结果按区域合并；有区域失败时返回第一个错误"""
+    results = []
+    for i in range(len(images)):
+        result = await analyze_image_with_ai(images[i], prompt, [labels[i]])
+        if is_api_failure(result):
+            return result
+        results.append(f"区域{i + 1}: {result}")
+    return "\n".join(results)
+
+async def analyze_cached(image_data, prompt="请描述这张图片的内容", mode="off", structured=False, seq=None):
+    """
+    带缓存的图片分析：画面与缓存中的某帧足够相似且提示词相同时直接返回缓存结果，
+    其次由本地分类器回答，都不行时（按 ROI 裁剪后）调用云端模型
+    :param mode: ROI 模式
+    :param structured: 要求模型输出结构化结果，校验后写入识别记录日志
+    :param seq: 帧序号（写入识别记录）
+    :return: (分析结果, 来源 "cache" / "local" / "cloud", 本地分类结果或 None, ROI 信息或 None,
+              结构化结果或 None)；结构化结果有效时分析结果为其中的 summary
+    """
+    dc = decode_frame(image_data, mode != "off" or structured)
+    phash = frame_hash(dc)
+    key = cache_key(prompt, mode, structured)
+    if phash is not None:
+        result = result_cache.get(phash, key)
+        if result is not None:
+            print(f"Cache hit: {result_cache.stats()}")
+            found = None
+            if structured:
+                # 缓存中保存的是校验后的结构化结果
+                found = json.loads(result)
+                result = found["summary"]
+                record_detections(found, "cache", seq, dc)
+            return result, "cache", None, None, found
     
-    # 创建Moonshot格式的请求体
-    payload = {
-        "model": "moonshot-v1-8k-vision-preview",
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{image_b64}"
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
-            }
-        ],
-        "max_tokens": 500
-    }
+    guess = classify_local(dc, prompt)
+    if guess is not None and guess["local"]:
+        result = local_model.text(guess["label"])
+        preview.set_text(result)
+        found = None
+        if structured:
+            found = detections.from_label(guess["label"], result)
+            record_detections(found, "local", seq, dc)
+        return result, "local", guess, None, found
     
+    images, labels, roi_info = await prepare_upload(image_data, dc, mode)
+    ask = detections.structured_prompt(prompt) if structured else prompt
+    # 结构化模式下各区域总是放在同一条消息中，由回复中的 image 序号区分
+    if roi_info is not None and ROI_TILES == "each" and len(images) > 1 and not structured:
+        result = await analyze_tiles(images, labels, ask)
+    else:
+        result = await analyze_image_with_ai(images, ask, labels)
+    found = None
+    if not is_api_failure(result):
+        cached = result
+        if structured:
+            found = parse_detections(result, upload_regions(dc, roi_info))
+            if found is not None:
+                cached = json.dumps(found)
+                result = found["summary"]
+                record_detections(found, "cloud", seq, dc)
+            else:
+                cached = None  # 格式不对的回复不缓存，下次重新请求
+        if phash is not None and cached is not None:
+            result_cache.put(phash, key, cached)
+        preview.set_text(result)
+    return result, "cloud", guess, roi_info, found
+
+
+def extract_prompt(req, default="请描述这张图片的内容"):
+    """
+    从查询参数中提取 prompt
+    :param req: http_server.Request
+    :param default: 未提供 prompt 时使用的默认提示词
+    :return: 解码后的提示词
+    """
+    prompt = req.param("prompt", default)
+    if prompt != default:
+        print(f"Using custom prompt: {prompt}")
+    return prompt
+
+
+# --------- 后台采集 ----------
+CAPTURE_FPS = 5           # 后台采集目标帧率（也是 /stream 帧率）
+CAPTURE_DEPTH = 3         # 环形缓冲保存的帧数
+CAPTURE_ON_DEMAND = True  # True: 只在有请求时采集，空闲时停止以省电
+
+# /capture、/analyze、/stream 共享同一个采集任务
+frames = FrameSource(camera.capture, fps=CAPTURE_FPS, depth=CAPTURE_DEPTH, on_demand=CAPTURE_ON_DEMAND)
+
+async def get_frame(req, fresh=False):
+    """
+    按请求参数从采集缓冲取帧
+    frame=next 等待请求之后采集的下一帧，默认取最新帧
+    :param fresh: 摄像头刚切换档位，丢弃切换后的第一帧，取其后的新帧
+    :return: (序号, 时间戳, JPEG 数据)，采集失败返回 None
+    """
     try:
-        print("\nSending image to Moonshot API...")
-        print(f"Image size: {len(image_data)} bytes, Base64 size: {len(image_b64)} chars")
-        
-        # 发送请求前检查内存
-        gc.collect()
-        free_mem = gc.mem_free()
-        alloc_mem = gc.mem_alloc()
-        print(f"Memory: Free={free_mem}, Allocated={alloc_mem}")
-        
-        # 发送请求
-        response = urequests.post(
-            MOONSHOT_API_URL, 
-            data=json.dumps(payload).encode('utf-8'),
-            headers=headers
-        )
-        
-        status = response.status_code
-        raw_response = response.text
-        
-        print(f"API Response Status: {status}")
-        print("Raw Response:", raw_response[:200])  # 打印前200个字符
-        
-        # 检查HTTP状态码
-        if status != 200:
-            # 尝试解析错误信息
-            try:
-                error_data = json.loads(raw_response)
-                error_msg = error_data.get("error", {}).get("message", "Unknown error")
-                return f"API error {status}: {error_msg}"
-            except:
-                return f"API error {status}: {raw_response[:200]}"
-        
-        # 解析JSON响应
-        response_data = json.loads(raw_response)
-        
-        # 提取助手的回复内容
-        if "choices" in response_data and len(response_data["choices"]) > 0:
-            return response_data["choices"][0]["message"]["content"]
-        else:
-            return "Unexpected API response format"
-            
-    except Exception as e:
-        print("Image analysis request failed:", e)
-        # 打印详细错误信息
-        import sys
-        sys.print_exception(e)
-        return f"API request failed: {str(e)}"
-    finally:
-        # 确保关闭响应以释放内存
-        if 'response' in locals():
-            response.close()
-        gc.collect()
-
-
-# 添加 URL 解码函数
-def urldecode(encoded_str):
-    """
-    简单的 URL 解码实现
-    :param encoded_str: 编码后的字符串（字节形式）
-    :return: 解码后的字符串（UTF-8）
-    """
-    decoded_bytes = bytearray()
-    i = 0
-    while i < len(encoded_str):
-        if encoded_str[i] == 37:  # 37 是 '%' 的 ASCII 码
-            # 处理 %XX 形式的编码
-            if i + 2 < len(encoded_str):
-                hex_str = encoded_str[i+1:i+3]
-                try:
-                    decoded_bytes.append(int(hex_str, 16))
-                    i += 3
-                    continue
-                except:
-                    # 转换失败，保留原字符
-                    pass
-        elif encoded_str[i] == 43:  # 43 是 '+' 的 ASCII 码
-            # 将 '+' 转换为空格
-            decoded_bytes.append(32)
-            i += 1
-            continue
-        
-        decoded_bytes.append(encoded_str[i])
-        i += 1
-    
-    return decoded_bytes.decode('utf-8', 'ignore')
+        if fresh:
+            await frames.next_after_now()
+            return await frames.next_after_now()
+        if req.param("frame") == "next":
+            return await frames.next_after_now()
+        return await frames.newest()
+    except OSError as e:
+        print(f"Frame capture error: {e}")
+        return None
 
+# --------- 自适应分辨率 / 画质 ----------
+ADAPTIVE_ENABLED = True
+ANALYZE_TARGET_MS = 4000   # 分析请求的目标端到端延迟
+# 档位，画质从低到高: (framesize 常量名, 宽, 高, JPEG 质量 0..63，越小越清晰)
+QUALITY_LEVELS = [
+    ("FRAME_QQVGA", 160, 120, 12),
+    ("FRAME_QVGA", 320, 240, 15),
+    ("FRAME_QVGA", 320, 240, 10),
+    ("FRAME_HVGA", 480, 320, 12),
+    ("FRAME_VGA", 640, 480, 12),
+    ("FRAME_VGA", 640, 480, 10),
+]
 
-# --------- HTTP 服务器 ----------
-async def handle_client(reader, writer):
+quality_ctl = QualityController(QUALITY_LEVELS, target_ms=ANALYZE_TARGET_MS, initial=1)
+camera_level = 0  # hardware_init 以 QQVGA 初始化摄像头
+
+def set_camera_level(index):
+    """
+    切换摄像头分辨率和 JPEG 质量（/capture 和 /stream 也会随之改变）
+    :return: 是否切换成功
+    """
+    global camera_level
+    name, _, _, q = QUALITY_LEVELS[index]
     try:
-        request = await reader.read(1024)
-        client_ip = writer.get_extra_info('peername')[0]
-        print(f"\nRequest from {client_ip}")
-        
-        # 捕获图像请求
-        if b"GET /capture" in request:
-            # 捕获图像
-            buf = camera.capture()
-            if not buf:
-                error_response = "HTTP/1.1 500 Internal Server Error\r\n"
-                error_response += "Content-Type: text/plain; charset=utf-8\r\n"
-                error_response += "Connection: close\r\n\r\n"
-                error_response += "Camera capture failed"
-                await writer.awrite(error_response.encode('utf-8'))
-                return
-
-            # 返回JPEG图像
-            headers = "HTTP/1.1 200 OK\r\n"
-            headers += "Content-Type: image/jpeg\r\n"
-            headers += "Connection: close\r\n"
-            headers += "Content-Length: {}\r\n\r\n".format(len(buf))
-            await writer.awrite(headers.encode() + buf)
-            print(f"Sent image to {client_ip}")
-
-        # AI分析图像请求
-        elif b"GET /analyze" in request:
-            # 从请求中提取提示词
-            prompt = "请描述这张图片的内容"
-            if b"prompt=" in request:
-                try:
-                    # 提取类似: GET /analyze?prompt=描述图片中的物体
-                    start_idx = request.index(b"prompt=") + 7
-                    end_idx = request.index(b" HTTP/1.1")  # 注意这里添加了空格
-                    prompt_bytes = request[start_idx:end_idx].split(b"&")[0]
-                    prompt = urldecode(prompt_bytes)
-                    print(f"Using custom prompt: {prompt}")
-                except Exception as e:
-                    print(f"Prompt extraction error: {e}")
-            
-            # 捕获图像
-            buf = camera.capture()
-            
-            if not buf:
-                error_response = "HTTP/1.1 500 Internal Server Error\r\n"
-                error_response += "Content-Type: text/plain; charset=utf-8\r\n"
-                error_response += "Connection: close\r\n\r\n"
-                error_response += "Camera capture failed"
-                await writer.awrite(error_response.encode('utf-8'))
-                return
-            
-            print(f"Analyzing image for {client_ip}... Size: {len(buf)} bytes")
-            
-            # 使用AI分析图像
-            analysis_result = analyze_image_with_ai(buf, prompt)
-            
-            # 返回分析结果
-            headers = "HTTP/1.1 200 OK\r\n"
-            headers += "Content-Type: application/json; charset=utf-8\r\n"
-            headers += "Connection: close\r\n\r\n"
-            
-            # 创建JSON响应
-            response_data = {
-                "status": "success" if "API error" not in analysis_result else "error",
-                "analysis": analysis_result,
-                "image_size": len(buf),
-                "prompt": prompt
-            }
-            
-            # 修复：确保正确编码响应数据
-            json_data = json.dumps(response_data)
-            await writer.awrite(headers.encode('utf-8') + json_data.encode('utf-8'))
-            print(f"Sent analysis to {client_ip}")
-        
-        # 主页面请求
-        else:
-            # 返回简单主页 - 明确指定UTF-8编码
-            html = """HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-  <meta charset="UTF-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <title>ESP32 AI 相机</title>
-  <!-- 引用 Exo 2 字体 -->
-  <link href="https://fonts.googleapis.com/css2?family=Exo+2:wght@400;700&display=swap" rel="stylesheet">
-  <style>
-    * { margin: 0; padding: 0; box-sizing: border-box; }
-    html, body { width:100%; height:100%; }
-
-    body {
-      font-family: 'Exo 2', sans-serif;
-      background: #e0e5ec;
-      display: flex;
-      flex-direction: column;
-      align-items: center;
-      padding: 20px;
-    }
+        camera.framesize(getattr(camera, name))
+        camera.quality(q)
+    except (AttributeError, OSError) as e:
+        # 固件不支持运行时切换时保持原档位
+        print(f"Camera level switch failed: {e}")
+        return False
+    print(f"Camera level -> {name} q={q}")
+    camera_level = index
+    return True
 
-    .container {
-      width: 90%;
-      max-width: 800px;
-    }
+async def get_analysis_frame(req):
+    """
+    为分析取帧：先按延迟预测选择档位，必要时切换摄像头设置
+    :return: ((序号, 时间戳, JPEG 数据), 档位参数)，采集失败时帧为 None
+    """
+    switched = False
+    if ADAPTIVE_ENABLED:
+        index = quality_ctl.choose()
+        if index != camera_level:
+            switched = set_camera_level(index)
+    frame = await get_frame(req, fresh=switched)
+    if frame:
+        quality_ctl.observe_frame(camera_level, len(frame[2]))
+    return frame, quality_ctl.params(camera_level)
 
-    /* 通用卡片风格 + Neumorphism */
-    .card {
-      width: 90%;
-      max-width: 800px;
-      margin: 1rem auto;  /* 所有卡片都居中 */
-    }
+# 每次成功的 API 调用都更新吞吐量和延迟估计
+vision_client.on_timing = quality_ctl.record
 
-    .card {
-      background: #e0e5ec;
-      border-radius: 16px;
-      box-shadow:
-        8px 8px 16px rgba(163,177,198,0.6),
-       -8px -8px 16px rgba(255,255,255,0.8);
-      transition: transform 0.2s ease, box-shadow 0.2s ease;
-      padding: 25px;
-      margin-bottom: 25px;
-    }
-    .card:hover {
-      transform: translateY(-4px);
-      box-shadow:
-        12px 12px 24px rgba(163,177,198,0.6),
-       -12px -12px 24px rgba(255,255,255,0.8);
-    }
-    button {
-        padding: 12px 24px;
-        background: #3498db;
-        color: white;
-        border: none;
-        border-radius: 6px;
-        cursor: pointer;
-        font-size: 16px;
-        font-weight: 600;
-        transition: all 0.3s;
-        display: block;
-        margin: 15px auto 0;
-}
-
-    header.card h1 {
-      font-size: 2.5rem;
-      font-weight: 700;
-      color: #333;
-      text-align: center;
-      margin-bottom: 0.5rem;
+# --------- MQTT 事件推送 ----------
+# 与 HTTP 服务并行，把分析结果和设备状态推送到 MQTT broker，看板订阅 <MQTT_PREFIX>/# 即可，不必轮询：
+#   <前缀>/detection  每次 /analyze 或监控触发的分析结果
+#   <前缀>/status     上线时和每 MQTT_STATUS_MS 的状态（retained），掉线时由 broker 按遗嘱发布 offline
+# 断线期间事件暂存在内存队列中，重连后按顺序发出
+MQTT_ENABLED = False
+MQTT_BROKER = "192.168.1.100"
+MQTT_PORT = 1883
+MQTT_USER = None
+MQTT_PASSWORD = None
+MQTT_CLIENT_ID = "esp32-s3-cam"
+MQTT_PREFIX = "esp32cam/" + MQTT_CLIENT_ID
+MQTT_QOS = 1              # 0 最多一次；1 至少一次（等待 broker 确认，断线重连后重发）
+MQTT_BATCH_MS = 20        # 同时产生的事件合并为一次写出
+MQTT_QUEUE = 64           # 离线队列上限（条），满了丢弃最旧的
+MQTT_STATUS_MS = 60000
+
+def make_publisher(host, port=MQTT_PORT):
+    return mqtt_events.Publisher(
+        host, port,
+        client_id=MQTT_CLIENT_ID,
+        prefix=MQTT_PREFIX,
+        qos=MQTT_QOS,
+        batch_ms=MQTT_BATCH_MS,
+        max_queue=MQTT_QUEUE,
+        user=MQTT_USER,
+        password=MQTT_PASSWORD,
+        status_ms=MQTT_STATUS_MS
+    )
+
+publisher = make_publisher(MQTT_BROKER) if MQTT_ENABLED else None
+
+def device_status(ip):
+    """status 消息的内容"""
+    return {
+        "url": f"http://{ip}/",
+        "ready": boot.is_ready("camera"),
+        "heap_free": gc.mem_free(),
+        "quality_level": quality_ctl.level,
+        "monitor": monitor.running,
+        "api_breaker": vision_client.breaker.state,
+        "history_records": history.stats()["records"] if history else 0
     }
-    header.card h2 {
-      font-size: 1.25rem;
-      font-weight: 400;
-      color: #666;
-      text-align: center;
+
+def publish_result(trigger, seq, result, source, found=None):
+    """
+    推送分析结果（MQTT 的 <前缀>/detection 和所有 WebSocket 连接），API 调用失败的不推送
+    :param trigger: "analyze" 或 "monitor"
+    """
+    if is_api_failure(result) or (publisher is None and not ws_clients):
+        return
+    event = {
+        "time": int(time.time()),
+        "trigger": trigger,
+        "frame_seq": seq,
+        "source": source,
+        "analysis": result,
+        "detections": found
     }
+    if publisher is not None:
+        publisher.publish("detection", event)
+    ws_broadcast("detection", event)
+
+# --------- WebSocket ----------
+# 主页通过 /ws 与设备保持一条连接，代替轮询 /capture 和每次分析新建的请求：
+# 设备推送 JPEG 帧（binary，前 4 字节为帧序号）和 JSON 消息（text，type 字段区分），页面以 JSON 发送命令:
+#   {"type": "capture"}                  推送一帧
+#   {"type": "stream", "on": true}       开始 / 停止（false）连续推送帧
+#   {"type": "ack"}                      页面显示完一帧；未确认的帧达到 WS_FRAME_WINDOW 时暂停推送，慢客户端只拿最新帧
+#   {"type": "analyze", "id": 1, "prompt": "...", "roi": "fixed"}
+#                                        分析一帧，推送 {"type": "delta"} 分段结果，最后推送 {"type": "done"}
+#                                        （字段与 /analyze/stream 的 done 事件相同），队列已满时推送 {"type": "busy"}
+# 设备主动推送 {"type": "status"}（连接时和每 WS_STATUS_MS）以及所有分析结果 {"type": "detection"}
+WS_MAX_CLIENTS = 3        # 同时连接数上限（每个连接占用一个套接字和收发缓冲）
+WS_PING_MS = 15000
+WS_TIMEOUT_MS = 45000     # 超过该时间没有收到任何数据（包括 pong）时断开
+WS_FRAME_WINDOW = 2       # 未确认的帧数上限
+WS_STATUS_MS = 10000
+
+ws_clients = []
+ws_stats = {"connections": 0, "rejected": 0, "frames": 0, "messages": 0, "dropped": 0}
+
+def ws_broadcast(kind, data):
+    """推送给所有 WebSocket 连接（进入各自的发件箱，不等待）"""
+    if not ws_clients:
+        return
+    message = {"type": kind}
+    message.update(data)
+    text = json.dumps(message)
+    for ws in ws_clients:
+        ws.post(text)
+    ws_stats["messages"] += len(ws_clients)
+
+# --------- 分析任务队列 ----------
+ANALYZE_WORKERS = 1       # 同时进行的分析数（每个分析都要占用较多内存）
+ANALYZE_MAX_PENDING = 4   # 排队上限，超过时返回 429
+
+jobs = JobQueue(workers=ANALYZE_WORKERS, max_pending=ANALYZE_MAX_PENDING)
+
+async def analyze_job(image_data, seq, prompt, params=None, mode="off", structured=False):
+    """
+    分析任务
+    :param mode: ROI 模式
+    :param structured: 是否使用结构化结果
+    :return: /analyze 的 JSON 结果
+    """
+    print(f"Analyzing frame {seq}... Size: {len(image_data)} bytes")
+    # 使用AI分析图像（相似画面命中缓存时直接返回）
+    analysis_result, source, guess, roi_info, found = await analyze_cached(image_data, prompt, mode, structured, seq)
+    publish_result("analyze", seq, analysis_result, source, found)
+    data = analysis_fields(analysis_result)
+    if structured:
+        data["detections"] = found
+        if found is None and data["status"] == "success":
+            # 回复不是有效的结构化结果：analysis 为原文
+            data["structured_error"] = "invalid structured reply"
+    data.update({
+        "image_size": len(image_data),
+        "frame_seq": seq,
+        "cached": source == "cache",
+        "source": source,
+        "local": guess,
+        "roi": roi_info,
+        "prompt": prompt,
+        "capture": params
+    })
+    return data
+
+def submit_analysis(image_data, seq, prompt, params=None, mode="off", structured=False):
+    """
+    提交分析任务，同一帧 + 同一提示词 + 同一 ROI 模式 + 同一格式的请求合并为一个任务
+    :param params: 采集该帧时的档位参数，原样放入结果
+    :return: Job，队列已满时返回 None
+    """
+    return jobs.submit(
+        (seq, prompt, mode, structured),
+        lambda: analyze_job(image_data, seq, prompt, params, mode, structured)
+    )
+
+async def send_busy(resp):
+    """队列已满：返回 429 并提示重试时间"""
+    await resp.send_json(
+        {"status": "error", "message": "analysis queue full"},
+        429,
+        {"Retry-After": jobs.retry_after()}
+    )
+
+async def send_job(req, resp, job, prompt, extra=None):
+    """
+    返回已入队的分析任务
+    wait=1 时等待任务完成并返回结果，否则返回 202 和任务 id
+    :param extra: 202 响应中附加的字段
+    """
+    if req.param("wait") == "1":
+        # 同步模式：等待任务完成后直接返回分析结果
+        await job.wait()
+        status = 200
+        response_data = job.result if job.state == "done" else {"status": "error", "analysis": job.error, "prompt": prompt}
+    else:
+        # 默认：返回任务 id，客户端通过 /result/<id> 查询
+        status = 202
+        response_data = job.info()
+        response_data["result_url"] = f"/result/{job.id}"
+        if extra:
+            response_data.update(extra)
+    await resp.send_json(response_data, status)
+    print(f"Sent analysis job {job.id} to {req.client_ip}")
+
+# --------- 多帧批量分析 ----------
+BATCH_MAX_FRAMES = 4           # 单次最多帧数（每帧都要留在内存中直到上传完成）
+BATCH_MAX_INTERVAL_MS = 10000  # 帧间隔上限
+BATCH_PROMPT = "这些图片按时间顺序拍摄，请比较它们之间的变化"
+
+async def capture_batch(count, interval_ms):
+    """
+    按间隔采集多帧
+    :return: [(序号, 相对第一帧的毫秒数, JPEG 数据)]
+    :raises OSError: 采集失败
+    """
+    batch = []
+    first_ts = None
+    for i in range(count):
+        if i:
+            await asyncio.sleep_ms(interval_ms)
+        seq, ts, buf = await frames.next_after_now()
+        if first_ts is None:
+            first_ts = ts
+        batch.append((seq, time.ticks_diff(ts, first_ts), buf))
+    return batch
+
+async def batch_job(batch, prompt):
+    """
+    多帧分析任务：所有帧放在同一条消息中，共用一个提示词，
+    各帧的 base64 在发送时依次编码，不会同时出现在内存中
+    :return: /analyze_batch 的 JSON 结果
+    """
+    images = [f[2] for f in batch]
+    labels = [f"第{i + 1}张 (t=+{f[1] / 1000:.1f}s)" for i, f in enumerate(batch)]
+    print(f"Analyzing batch of {len(batch)} frames...")
+    analysis_result = await analyze_image_with_ai(images, prompt, labels)
+    data = analysis_fields(analysis_result)
+    data["frames"] = [{"frame_seq": f[0], "offset_ms": f[1], "image_size": len(f[2])} for f in batch]
+    data["prompt"] = prompt
+    return data
+
+# --------- 连续监控 ----------
+MONITOR_ENABLED = False        # 启动时是否开启监控，也可通过 /monitor?enable=1 开启
+MONITOR_INTERVAL_MS = 1000     # 取帧间隔
+MONITOR_PROMPT = "请描述这张图片的内容"
+
+async def monitor_job(image_data):
+    """
+    监控分析任务
+    :return: status / analysis / error / source 字段（可直接作为 /result 的 JSON）
+    """
+    result, source, _, _, found = await analyze_cached(image_data, MONITOR_PROMPT, ROI_MODE, STRUCTURED_OUTPUT)
+    publish_result("monitor", None, result, source, found)
+    data = analysis_fields(result)
+    data["source"] = source
+    return data
+
+async def monitor_analyze(image_data):
+    """监控触发的分析同样经过任务队列，受并发上限约束"""
+    job = jobs.submit(None, lambda: monitor_job(image_data))
+    if job is None:
+        raise OSError("analysis queue full")
+    await job.wait()
+    if job.state == "failed":
+        raise OSError(job.error)
+    # 本地分类器回答的也不计入 API 调用
+    return job.result["analysis"], job.result["source"] != "cloud"
+
+monitor = Monitor(
+    frames,
+    monitor_analyze,
+    interval_ms=MONITOR_INTERVAL_MS,
+    detector=ChangeDetector(change_threshold=3.0, stable_threshold=1.0, stable_frames=3)
+)
+
+# --------- LCD 预览 ----------
+PREVIEW_ENABLED = True  # 在 LCD 上显示画面和最近的分析结果
+PREVIEW_FPS = 4         # LCD 最高刷新帧率
+# 启动和每次显示新结果后实时预览的时长，之后只显示其他请求采集到的帧，摄像头照常按需采集；
+# None 表示一直实时预览（摄像头持续采集，功耗与 CAPTURE_ON_DEMAND = False 相同）
+PREVIEW_ACTIVE_MS = 30000
+
+# 显示对象在 main() 中硬件初始化后设置
+preview = Preview(None, frames, fps=PREVIEW_FPS, active_ms=PREVIEW_ACTIVE_MS)
+
+# --------- 实时视频流 ----------
+STREAM_BOUNDARY = "frame"
+
+async def handle_stream(req, resp):
+    """
+    以 multipart/x-mixed-replace 持续推送 JPEG 帧，直到客户端断开
+    """
+    writer = resp.writer
+    await resp.start_stream(
+        f"multipart/x-mixed-replace; boundary={STREAM_BOUNDARY}",
+        headers={"Cache-Control": "no-cache"}
+    )
     
-    /* 给视频卡片留出内边距 */
-    .video-container.card {
-      padding: 20px;    /* 原来是 padding:0; 现在改为 20px */
-      overflow: hidden;
-    }
+    frames.acquire()
+    print(f"Stream viewer joined: {req.client_ip} ({frames.consumers} consumers)")
+    # 每帧的分段头在预分配的缓冲中填写，只有长度不同
+    part = http_server.HeadBuffer(96)
+    boundary = f"--{STREAM_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: ".encode('utf-8')
+    try:
+        seq = frames.seq  # 从下一帧开始推送，不发送旧帧
+        while True:
+            seq, _, buf = await frames.next_frame(seq)
+            part.reset()
+            part.add(boundary)
+            part.add_int(len(buf))
+            part.add(b"\r\n\r\n")
+            # 分开写出，帧数据按块写出，不复制
+            await writer.awrite(part.view())
+            await http_server.write_body(writer, buf)
+            await writer.awrite(b"\r\n")
+    except OSError:
+        pass  # 客户端断开
+    finally:
+        frames.release()
+        print(f"Stream viewer left: {req.client_ip} ({frames.consumers} consumers)")
 
-    /* 确保图片在卡片内有边距 */
-    .video-container.card img {
-      display: block;
-      width: 100%;
-      height: auto;
-      border-radius: 12px;
-      margin: 0 auto;  /* 图片居中 */
-    }
+# --------- 运行指标 ----------
+METRICS_ENABLED = True  # 关闭后不再记录耗时和请求数（/metrics 仍输出当前堆内存和计数）
+metrics.ENABLED = METRICS_ENABLED
 
-    .divider {
-      width: 70%;
-      height: 1px;
-      background: rgba(0,0,0,0.1);
-      margin: 1rem auto;
-      border-radius: 1px;
-    }
+# --------- HTTP 路由处理 ----------
+async def send_capture_failed(resp):
+    await resp.send("Camera capture failed", 500)
 
-    .video-container.card {
-      padding: 0;
-      overflow: hidden;
-    }
-    .video-container.card img {
-      display: block;
-      width: 100%;
-      height: auto;
-      border-radius: 16px;
-    }
+# 捕获图像请求
+async def handle_capture(req, resp):
+    # 从采集缓冲取图像
+    frame = await get_frame(req)
+    if not frame:
+        await send_capture_failed(resp)
+        return
+    
+    # 返回JPEG图像
+    seq, _, buf = frame
+    await resp.send(buf, content_type="image/jpeg", headers={"X-Frame-Seq": seq})
+    print(f"Sent image to {req.client_ip}")
 
-    .analysis.card label {
-      display: block;
-      margin-bottom: 8px;
-      color: #333;
-    }
-    .analysis.card input {
-      width: 100%;
-      padding: 12px;
-      border: 1px solid #ddd;
-      border-radius: 6px;
-      font-size: 16px;
-      margin-bottom: 15px;
-      box-sizing: border-box;
-    }
+# 分析结果缓存统计
+async def handle_cache(req, resp):
+    await resp.send_json(result_cache.stats())
 
-    .analysis.card #result {
-      margin-top: 20px;
-      padding: 20px;
-      background: #e8f4fd;
-      border-radius: 8px;
-      white-space: pre-wrap;
-      line-height: 1.6;
-      border-left: 4px solid #3498db;
-      color: #333;
-    }
+# 监控开关与统计: /monitor?enable=1 或 /monitor?enable=0
+async def handle_monitor(req, resp):
+    enable = req.param("enable")
+    if enable == "1":
+        monitor.start()
+    elif enable == "0":
+        monitor.stop()
+    await resp.send_json(monitor.stats())
+
+# 监控检测到的最近事件
+async def handle_events(req, resp):
+    await resp.send_json({"monitor": monitor.stats(), "events": monitor.events})
+
+async def stream_analysis(buf, prompt, mode, relay):
+    """
+    流式分析一帧（/analyze/stream 和 WebSocket 共用），缓存命中或本地分类器足够确定时一次性发送结果；
+    云端的回复边转发边收集，成功后写入结果缓存
+    :param relay: async relay(text)，收到每段结果时调用
+    :return: (错误, 来源, ROI 信息)
+    """
+    dc = decode_frame(buf, mode != "off")
+    phash = frame_hash(dc)
+    key = cache_key(prompt, mode)
+    if phash is not None:
+        # /analyze 结构化模式的结果也可以用，取其中的 summary
+        hit, cached = result_cache.lookup(phash, (key, cache_key(prompt, mode, True)))
+        if cached is not None:
+            await relay(cached if hit == key else json.loads(cached)["summary"])
+            return None, "cache", None
+    guess = classify_local(dc, prompt)
+    if guess is not None and guess["local"]:
+        await relay(local_model.text(guess["label"]))
+        return None, "local", None
+    # 流式模式下各区域总是放在同一条消息中
+    images, labels, roi_info = await prepare_upload(buf, dc, mode)
+    if phash is None:
+        return await analyze_image_stream(images, relay, prompt, labels), "cloud", roi_info
+    parts = []
+    size = [0]  # 已收到的字节数，超过缓存上限（写入时也会被拒绝）后不再收集
+
+    async def collect(text):
+        await relay(text)
+        size[0] += len(text.encode('utf-8'))
+        if size[0] <= result_cache.max_bytes:
+            parts.append(text)
+        elif parts:
+            del parts[:]
 
-    .status {
-      text-align: center;
-      margin-bottom: 30px;
-      color: #7f8c8d;
-      font-size: 14px;
+    error = await analyze_image_stream(images, collect, prompt, labels)
+    if error is None and parts and size[0] <= result_cache.max_bytes:
+        result_cache.put(phash, key, "".join(parts))
+    return error, "cloud", roi_info
+
+def stream_done(error, source, roi_info, buf, seq, prompt, params):
+    """流式分析结束时的结果（SSE 的 done 事件 / WebSocket 的 done 消息）"""
+    return {
+        "status": "error" if error else "success",
+        "message": str(error) if error else None,
+        "error": error.info() if is_api_failure(error) else None,
+        "image_size": len(buf),
+        "frame_seq": seq,
+        "cached": source == "cache",
+        "source": source,
+        "roi": roi_info,
+        "prompt": prompt,
+        "capture": params
     }
+
+async def stream_job(buf, seq, prompt, params, mode, relay):
+    """
+    流式分析任务
+    :return: done 事件的内容，也是 /result 返回的任务结果（错误已转换为可序列化的字段）
+    """
+    error, source, roi_info = await stream_analysis(buf, prompt, mode, relay)
+    return stream_done(error, source, roi_info, buf, seq, prompt, params)
+
+def stream_result(job, buf, seq, prompt, params):
+    """流式任务结束后的 done 内容，任务异常失败时同样返回错误"""
+    if job.state == "done":
+        return job.result
+    return stream_done(job.error, "cloud", None, buf, seq, prompt, params)
+
+# AI流式分析请求：以 server-sent events 逐段返回
+async def handle_analyze_stream(req, resp):
+    prompt = extract_prompt(req)
     
-    footer.card div {
-      color: #444;
-      font-size: 0.95rem;
-      margin: 0.5rem 0;
-      text-align: center;
-    }
+    # 从采集缓冲取图像（分辨率和画质由自适应策略决定）
+    frame, params = await get_analysis_frame(req)
+    if not frame:
+        await send_capture_failed(resp)
+        return
+    seq, _, buf = frame
+    writer = resp.writer
     
-    @media (max-width: 600px) {
-      header.card h1 { font-size: 2rem; }
-      header.card h2 { font-size: 1rem; }
-      .divider { width: 90%; }
-    }
-  </style>
-</head>
-<body>
-
-  <!-- 独立 Header 卡片 -->
-  <header class="card">
-    <h1>ESP32 AI 视觉系统</h1>
-    <h2>Course: Intelligent Embedded Vision Applications</h2>
-  </header>
-
-  <div class="divider"></div>
-
-  <div class="container">
-    <div class="card video-container">
-      <h2 style="text-align:center; color:#3498db; margin-bottom:15px;">实时图像</h2>
-      <img id="live-image" src="/capture"
-           onerror="this.src='data:image/svg+xml;charset=UTF-8,<svg xmlns=&quot;http://www.w3.org/2000/svg&quot; viewBox=&quot;0 0 400 300&quot;><rect width=&quot;400&quot; height=&quot;300&quot; fill=&quot;%23f0f2f5&quot;/><text x=&quot;50%&quot; y=&quot;50%&quot; font-family=&quot;Arial&quot; font-size=&quot;16&quot; fill=&quot;%23999&quot; text-anchor=&quot;middle&quot; dominant-baseline=&quot;middle&quot;>正在加载图像...</text></svg>';" />
-      <button onclick="refreshImage()">刷新图像</button>
-    </div>
-
-    <div class="divider"></div>
-
-    <div class="card analysis">
-      <h2 style="text-align:center; color:#3498db; margin-bottom:15px;">AI 图像分析</h2>
-      <label for="prompt-input">分析提示:</label>
-      <input type="text" id="prompt-input" name="prompt"
-             value="请描述这张图片的内容" placeholder="输入分析提示..." />
-      <button onclick="analyzeImage()">分析图像</button>
-      <div id="result">等待分析结果...</div>
-    </div>
-
-    <div class="status">
-      <p>设备 IP: <span id="device-ip">加载中...</span></p>
-      <p>状态: <span id="status">就绪</span></p>
-    </div>
-
-    <div class="divider"></div>
-
-<!--     <div class="card">
-#       <div>Team Members: Lu Yiming | Chen Litian | Huang Xuankai | Ou Peiyi | Qian Yibin | Wang Zichang</div>
-#       <div>Instructors: He Hui &amp; Liu Chunxiu</div>
-#       <div>Sponsors: Turinger</div>
-#     </div>
--->
-    <footer class="card">
-        <div>© 2025 Rubbish Vision Tracking Project</div>
-        <div class="members">Team Members: Lu Yiming | Chen Litian | Huang Xuankai | Ou Peiyi | Qian Yibin | Wang Zichang</div>
-        <div class="instructor">Instructors: He Hui &amp; Liu Chunxiu</div>
-        <div class="sponsors">Sponsors: Turinger</div>
-      </footer>
-  </div>
-
-  <script>
-    function getDeviceIP() {
-      document.getElementById('device-ip').textContent = window.location.hostname;
-    }
-    function refreshImage() {
-      const img = document.getElementById('live-image');
-      img.src = '/capture?' + Date.now();
-      document.getElementById('status').textContent = '图像已刷新';
-    }
-    function analyzeImage() {
-      const prompt = document.getElementById('prompt-input').value;
-      const resultDiv = document.getElementById('result');
-      const statusEl = document.getElementById('status');
-      resultDiv.innerHTML = '<div class="loading">分析中，请稍候...</div>';
-      statusEl.textContent = '正在分析图像...';
-      const timeoutId = setTimeout(() => {
-        resultDiv.innerHTML = '<div class="loading">分析时间较长，请耐心等待...</div>';
-      }, 3000);
-      fetch('/analyze?prompt=' + encodeURIComponent(prompt))
-        .then(resp => { clearTimeout(timeoutId); if (!resp.ok) throw new Error(resp.status); return resp.json(); })
-        .then(data => {
-          resultDiv.innerHTML = data.status==='success' ? data.analysis : '分析失败: '+(data.message||data.analysis);
-          statusEl.textContent = data.status==='success' ? '分析完成' : '分析失败';
-        })
-        .catch(err => {
-          clearTimeout(timeoutId);
-          resultDiv.innerHTML = '请求错误: '+err.message;
-          statusEl.textContent = '请求出错';
-        });
-    }
-    window.onload = () => { getDeviceIP(); refreshImage(); };
-  </script>
-</body>
-</html>
-"""
-            await writer.awrite(html.encode('utf-8'))
-            print(f"Served homepage to {client_ip}")
+    print(f"Streaming analysis for {req.client_ip}... Size: {len(buf)} bytes")
+    
+    async def relay(text):
+        await writer.awrite(("data: " + json.dumps({"delta": text}) + "\n\n").encode('utf-8'))
+    
+    mode = roi_mode(req)
+    
+    # 流式分析同样占用一个任务队列的执行名额
+    job = jobs.submit(None, lambda: stream_job(buf, seq, prompt, params, mode, relay))
+    if job is None:
+        await send_busy(resp)
+        return
+    
+    # 先发送响应头，浏览器无需等待整个生成过程
+    await resp.start_stream("text/event-stream; charset=utf-8", headers={"Cache-Control": "no-cache"})
+    
+    await job.wait()
+    
+    # 结束事件
+    done_data = stream_result(job, buf, seq, prompt, params)
+    await writer.awrite(("event: done\ndata: " + json.dumps(done_data) + "\n\n").encode('utf-8'))
+    print(f"Streamed analysis to {req.client_ip}")
+
+# WebSocket: 帧、分析和状态共用一条连接（消息格式见上方 WebSocket 一节）
+async def ws_send_frame(ws, frame):
+    """推送一帧（等待流量控制窗口），帧数据不复制，序号与帧头一起写出"""
+    await ws.wait_window()
+    seq, _, buf = frame
+    await ws.send(buf, True, struct.pack("!I", seq))
+    ws_stats["frames"] += 1
+
+async def ws_capture(ws, req):
+    frame = await get_frame(req)
+    if not frame:
+        ws.post(json.dumps({"type": "error", "message": "Camera capture failed"}))
+        return
+    await ws_send_frame(ws, frame)
+
+async def ws_stream(ws):
+    """连续推送帧直到取消；页面处理不过来时等待窗口，之后直接拿最新帧，中间帧丢弃"""
+    frames.acquire()
+    try:
+        seq = frames.seq
+        while True:
+            await ws.wait_window()
+            frame = await frames.next_frame(seq)
+            seq = frame[0]
+            await ws_send_frame(ws, frame)
+    finally:
+        frames.release()
+
+async def ws_analyze(ws, req, msg):
+    """analyze 命令：流程与 /analyze/stream 相同，结果以 delta / done 消息推送"""
+    request_id = msg.get("id")
+    prompt = msg.get("prompt") or "请描述这张图片的内容"
+    mode = msg.get("roi")
+    if mode not in ROI_MODES:
+        mode = ROI_MODE
+    frame, params = await get_analysis_frame(req)
+    if not frame:
+        await ws.send(json.dumps({"type": "error", "id": request_id, "message": "Camera capture failed"}))
+        return
+    seq, _, buf = frame
+    
+    async def relay(text):
+        await ws.send(json.dumps({"type": "delta", "id": request_id, "delta": text}))
+    
+    job = jobs.submit(None, lambda: stream_job(buf, seq, prompt, params, mode, relay))
+    if job is None:
+        await ws.send(json.dumps({"type": "busy", "id": request_id, "retry_after": jobs.retry_after()}))
+        return
+    await job.wait()
+    # 复制一份再加字段，任务结果仍供 /result 查询
+    done_data = dict(stream_result(job, buf, seq, prompt, params))
+    done_data["type"] = "done"
+    done_data["id"] = request_id
+    await ws.send(json.dumps(done_data))
+
+async def ws_status(ws, host):
+    while not ws.closed:
+        status = device_status(host)
+        status["type"] = "status"
+        status["ws_clients"] = len(ws_clients)
+        status["jobs_pending"] = jobs.stats()["pending"]
+        ws.post(json.dumps(status))
+        await asyncio.sleep_ms(WS_STATUS_MS)
+
+async def ws_task(coro):
+    """命令在独立任务中执行，连接断开时的写出错误在此结束"""
+    try:
+        await coro
+    except OSError:
+        pass
+
+async def handle_ws(req, resp):
+    if len(ws_clients) >= WS_MAX_CLIENTS:
+        ws_stats["rejected"] += 1
+        await resp.send_json({"status": "error", "message": "too many websocket clients"}, 503, {"Retry-After": 5})
+        return
+    ws = await websocket.accept(req, resp, ping_ms=WS_PING_MS, timeout_ms=WS_TIMEOUT_MS, window=WS_FRAME_WINDOW)
+    if ws is None:
+        return
+    ws_clients.append(ws)
+    ws_stats["connections"] += 1
+    print(f"WebSocket client joined: {req.client_ip} ({len(ws_clients)} clients)")
+    tasks = [asyncio.create_task(ws_status(ws, req.header("host", "")))]
+    stream = None
+    try:
+        while True:
+            text = await ws.receive()
+            if text is None:
+                break
+            try:
+                msg = json.loads(text)
+                kind = msg.get("type")
+            except (ValueError, TypeError, AttributeError):
+                kind = msg = None
+            if kind == "ack":
+                ws.ack()
+            elif kind == "capture":
+                tasks.append(asyncio.create_task(ws_task(ws_capture(ws, req))))
+            elif kind == "stream":
+                if msg.get("on") and stream is None:
+                    stream = asyncio.create_task(ws_task(ws_stream(ws)))
+                elif not msg.get("on") and stream is not None:
+                    stream.cancel()
+                    stream = None
+            elif kind == "analyze":
+                tasks.append(asyncio.create_task(ws_task(ws_analyze(ws, req, msg))))
+            else:
+                ws.post(json.dumps({"type": "error", "message": "unknown command"}))
+            tasks = [t for t in tasks if not t.done()]
+    finally:
+        if stream is not None:
+            tasks.append(stream)
+        for t in tasks:
+            t.cancel()
+        ws_clients.remove(ws)
+        ws_stats["dropped"] += ws.dropped
+        await ws.close(websocket.GOING_AWAY)
+        print(f"WebSocket client left: {req.client_ip} ({len(ws_clients)} clients)")
+
+# AI分析图像请求
+async def handle_analyze(req, resp):
+    # 从请求中提取提示词
+    prompt = extract_prompt(req)
+    
+    # 从采集缓冲取图像（frame=next 时等待下一帧；分辨率和画质由自适应策略决定）
+    frame, params = await get_analysis_frame(req)
+    if not frame:
+        await send_capture_failed(resp)
+        return
+    seq, _, buf = frame
     
+    # 入队，队列已满时返回 429
+    job = submit_analysis(buf, seq, prompt, params, roi_mode(req), output_format(req))
+    if job is None:
+        await send_busy(resp)
+        return
+    await send_job(req, resp, job, prompt, {"capture": params})
+
+# 多帧批量分析: /analyze_batch?n=3&interval_ms=1000&prompt=...
+async def handle_analyze_batch(req, resp):
+    prompt = extract_prompt(req, BATCH_PROMPT)
+    try:
+        count = int(req.param("n", "2"))
+        interval_ms = int(req.param("interval_ms", "1000"))
+    except ValueError:
+        count = interval_ms = -1
+    if not 1 <= count <= BATCH_MAX_FRAMES or not 0 <= interval_ms <= BATCH_MAX_INTERVAL_MS:
+        await resp.send_json({
+            "status": "error",
+            "message": f"n must be 1..{BATCH_MAX_FRAMES}, interval_ms 0..{BATCH_MAX_INTERVAL_MS}"
+        }, 400)
+        return
+    
+    # 按间隔采集（请求在采集期间保持等待）
+    try:
+        batch = await capture_batch(count, interval_ms)
+    except OSError as e:
+        print(f"Frame capture error: {e}")
+        await send_capture_failed(resp)
+        return
+    
+    job = jobs.submit(None, lambda: batch_job(batch, prompt))
+    if job is None:
+        await send_busy(resp)
+        return
+    await send_job(req, resp, job, prompt)
+
+# 分析任务结果查询: /result/<id>
+async def handle_result(req, resp):
+    try:
+        job = jobs.get(int(req.path[len("/result/"):]))
+    except ValueError:
+        job = None
+    if job:
+        await resp.send_json(job.info())
+    else:
+        await resp.send_json({"status": "error", "message": "unknown job"}, 404)
+
+# 任务队列统计
+async def handle_jobs(req, resp):
+    await resp.send_json(jobs.stats())
+
+# Prometheus 指标: 各阶段耗时、请求数、堆内存以及各子系统的计数（?reset=1 输出后清零）
+async def handle_metrics(req, resp):
+    queue = jobs.stats()
+    log = history.stats() if history else {"records": 0, "bytes": 0}
+    gauges = {
+        "frames_captured_total": frames.captures,
+        "frame_errors_total": frames.errors,
+        "stream_consumers": frames.consumers,
+        "cache_entries": len(result_cache.entries),
+        "cache_hits_total": result_cache.hits,
+        "cache_misses_total": result_cache.misses,
+        "jobs_pending": queue["pending"],
+        "jobs_running": queue["running"],
+        "jobs_completed_total": queue["completed"],
+        "jobs_failed_total": queue["failed"],
+        "jobs_rejected_total": queue["rejected"],
+        "api_connections_opened_total": api_pool.opened,
+        "api_connections_reused_total": api_pool.reused,
+        "api_calls_total": vision_client.calls,
+        "api_failures_total": vision_client.failures,
+        "api_retries_total": vision_client.retried,
+        "api_timeouts_total": vision_client.timeouts_hit,
+        "api_fallbacks_total": vision_client.fallbacks,
+        "api_breaker_open": vision_client.breaker.state != "closed",
+        "api_breaker_rejected_total": vision_client.breaker.rejected,
+        "local_classified_total": local_model.calls if local_model else 0,
+        "local_answered_total": local_model.answered if local_model else 0,
+        "roi_crops_total": roi_stats["crops"],
+        "roi_bytes_total": roi_stats["bytes"],
+        "roi_full_bytes_total": roi_stats["full_bytes"],
+        "structured_parsed_total": structured_stats["parsed"],
+        "structured_invalid_total": structured_stats["invalid"],
+        "history_records": log["records"],
+        "history_bytes": log["bytes"],
+        "mqtt_connected": publisher.connected if publisher else False,
+        "mqtt_queued": len(publisher.queue) if publisher else 0,
+        "mqtt_published_total": publisher.published if publisher else 0,
+        "mqtt_dropped_total": publisher.dropped if publisher else 0,
+        "ws_clients": len(ws_clients),
+        "ws_connections_total": ws_stats["connections"],
+        "ws_rejected_total": ws_stats["rejected"],
+        "ws_frames_total": ws_stats["frames"],
+        "ws_messages_total": ws_stats["messages"],
+        "ws_dropped_total": ws_stats["dropped"] + sum(ws.dropped for ws in ws_clients),
+        "quality_level": quality_ctl.level,
+        "monitor_running": monitor.running,
+        "monitor_triggers_total": monitor.triggers,
+        "lcd_frames_total": preview.drawn,
+        "lcd_rects_total": preview.rects,
+        "lcd_bytes_total": preview.bytes,
+        "boot_ready": boot.is_ready("camera"),
+        "boot_ms": boot.total_ms,
+    }
+    await resp.send(metrics.render(gauges), content_type="text/plain; version=0.0.4; charset=utf-8")
+    if req.param("reset") == "1":
+        # 压测时每轮开始前清零，便于得到该轮的高水位
+        metrics.reset()
+
+# API 客户端状态：调用/重试/超时计数、熔断器状态、最近一次错误，以及备用后端
+async def handle_api(req, resp):
+    await resp.send_json(vision_client.stats())
+
+# 本地分类器状态：类别、阈值、本地回答/交给云端的次数和平均耗时
+async def handle_classifier(req, resp):
+    if local_model is None:
+        await resp.send_json({"status": "disabled", "model": LOCAL_MODEL_FILE}, 404)
+        return
+    await resp.send_json(local_model.stats())
+
+# 识别记录查询: /history?from=&to=&label=&limit=
+# from / to 为 time.time() 的秒数（含两端），响应中的 now 为设备当前时间；
+# 不指定 from 时返回最近的记录（新的在前）。按各段的时间范围和时间索引定位，只读取范围内的记录
+async def handle_history(req, resp):
+    if history is None:
+        await resp.send_json({"status": "disabled"}, 404)
+        return
+    try:
+        start = req.param("from")
+        start = int(start) if start else None
+        end = req.param("to")
+        end = int(end) if end else None
+        limit = int(req.param("limit", str(HISTORY_MAX_RESULTS)))
+    except ValueError:
+        await resp.send_json({"status": "error", "message": "from, to and limit must be integers"}, 400)
+        return
+    limit = max(1, min(limit, HISTORY_MAX_RESULTS))
+    label = req.param("label")
+    t0 = time.ticks_ms()
+    records, scanned = history.query(start, end, detections.normalize_label(label) if label else None, limit)
+    metrics.since("history_query", t0)
+    await resp.send_json({
+        "status": "success",
+        "now": int(time.time()),
+        "count": len(records),
+        "scanned": scanned,
+        "records": records,
+        "clock_valid": clock_valid(),
+        "unsynced_skipped": history_unsynced[0],
+        "log": history.stats()
+    })
+
+# MQTT 推送状态：连接、队列、已发布/确认/丢弃的消息数
+async def handle_mqtt(req, resp):
+    if publisher is None:
+        await resp.send_json({"status": "disabled"}, 404)
+        return
+    await resp.send_json(publisher.stats())
+
+# 自适应画质状态
+async def handle_quality(req, resp):
+    data = quality_ctl.stats()
+    data["current"] = quality_ctl.params(camera_level)
+    await resp.send_json(data)
+
+# --------- 启动状态 / 就绪检查 ----------
+def needs_camera(handler):
+    """摄像头就绪前返回 503 和启动状态，客户端按 Retry-After 重试"""
+    async def wrapper(req, resp):
+        if not boot.is_ready("camera"):
+            data = boot.summary()
+            data["status"] = "starting"
+            await resp.send_json(data, 503, {"Retry-After": 1})
+            return
+        await handler(req, resp)
+    return wrapper
+
+# 启动状态与各阶段耗时，启动过程中也可访问
+async def handle_status(req, resp):
+    data = boot.summary()
+    data["status"] = "ready" if boot.is_ready("camera") else "starting"
+    await resp.send_json(data)
+
+# --------- 主页静态资源 ----------
+# 页面文件在 static/ 目录，预压缩为 .gz（见 build_assets.py）
+assets = StaticAssets("static")
+assets.add("/", "index.html", "text/html; charset=utf-8")
+assets.add("/style.css", "style.css", "text/css; charset=utf-8")
+assets.add("/app.js", "app.js", "application/javascript; charset=utf-8")
+handle_index = assets.handler("/")
+
+# 路由表：未匹配的路径返回主页
+routes = http_server.Router()
+routes.add("/", handle_index)
+routes.add("/style.css", assets.handler("/style.css"))
+routes.add("/app.js", assets.handler("/app.js"))
+routes.add("/capture", needs_camera(handle_capture))
+routes.add("/stream", needs_camera(handle_stream))
+routes.add("/analyze", needs_camera(handle_analyze))
+routes.add("/analyze/stream", needs_camera(handle_analyze_stream))
+routes.add("/analyze_batch", needs_camera(handle_analyze_batch))
+routes.add("/ws", needs_camera(handle_ws))
+routes.add("/result/", handle_result, prefix=True)
+routes.add("/jobs", handle_jobs)
+routes.add("/quality", handle_quality)
+routes.add("/api", handle_api)
+routes.add("/classifier", handle_classifier)
+routes.add("/history", handle_history)
+routes.add("/mqtt", handle_mqtt)
+routes.add("/metrics", handle_metrics)
+routes.add("/cache", handle_cache)
+routes.add("/monitor", needs_camera(handle_monitor))
+routes.add("/events", handle_events)
+routes.add("/status", handle_status)
+routes.fallback = handle_index
+
+# --------- HTTP 服务器 ----------
+async def handle_client(reader, writer):
+    try:
+        # 同一连接上可连续处理多个请求（keep-alive）
+        await http_server.serve(reader, writer, routes)
     except Exception as e:
         print(f"Client handling error: {e}")
         # 打印详细错误信息
@@ -563,50 +1410,78 @@ async def handle_client(reader, writer):
         sys.print_exception(e)
     finally:
         await writer.wait_closed()
-        gc.collect()
+        metrics.gc_collect()
+
+HTTP_PORT = 80
 
 async def start_server():
-    server = await asyncio.start_server(handle_client, "0.0.0.0", 80)
-    print("HTTP server running on port 80")
-    while True:
-        await asyncio.sleep(5)  # 保持服务器运行
+    """启动 HTTP 服务（网络就绪后立即调用，不等摄像头）"""
+    phase = boot.begin("http", "http")
+    assets.load()
+    server = await asyncio.start_server(handle_client, "0.0.0.0", HTTP_PORT)
+    boot.end(phase, "http")
+    print(f"HTTP server running on port {HTTP_PORT}")
+    return server
 
-# --------- 主程序入口 ----------
-def main():
-    # 硬件初始化
-    xl9555, display = hardware_init()
-    if xl9555 is None or display is None:
-        print("Critical hardware failure! Rebooting...")
-        time.sleep(5)
-        reset()
-    
-    # 连接WiFi - 增加重试机制
-    max_wifi_retries = 3
-    ip = None
-    for i in range(max_wifi_retries):
-        ip = connect_wifi("Your_Wifi_Name", "Your_Wifi_Password")  # 使用你的WiFi凭证
-        if ip:
-            break
-        print(f"WiFi connection failed, retry {i+1}/{max_wifi_retries}")
-        time.sleep(5)
+def start_background():
+    """摄像头就绪后启动后台任务"""
+    if not CAPTURE_ON_DEMAND:
+        frames.start()
+    if MONITOR_ENABLED:
+        monitor.start()
+    if PREVIEW_ENABLED:
+        preview.start()
+
+async def run():
+    """
+    启动并运行：WiFi 与硬件上电同时进行，网络就绪即开始服务，摄像头就绪后启动后台任务
+    :return: 启动失败的原因（需要重启）
+    """
+    wlan = wifi_start(WIFI_SSID, WIFI_PASSWORD)
+    hardware = asyncio.create_task(hardware_init())
     
+    ip = await connect_wifi(wlan, WIFI_SSID, WIFI_PASSWORD)
     if not ip:
-        print("WiFi failed after retries! Rebooting...")
-        time.sleep(5)
-        reset()
+        await hardware
+        failed = [name for name in boot.failed() if name != "wifi"]
+        if failed:
+            return f"Critical hardware failure! ({', '.join(failed)})"
+        return "WiFi failed after retries!"
     
+    await start_server()
+    if history is not None and NTP_HOST:
+        asyncio.create_task(sync_clock())
+    if publisher is not None:
+        # 与 HTTP 服务并行，摄像头就绪前也能上报启动状态
+        publisher.status_fn = lambda: device_status(ip)
+        publisher.start()
     print(f"Camera ready at http://{ip}/capture")
     print(f"AI analysis at http://{ip}/analyze")
     print(f"Web interface: http://{ip}")
     
-    # 启动服务器
+    xl9555, display = await hardware
+    if xl9555 is None or display is None:
+        return f"Critical hardware failure! ({', '.join(boot.failed())})"
+    preview.attach(display)
+    preview.set_text(f"http://{ip}")
+    start_background()
+    boot.finish()
+    if publisher is not None:
+        publisher.publish_status()  # 就绪
+    
+    while True:
+        await asyncio.sleep(5)  # 保持服务器运行
+
+# --------- 主程序入口 ----------
+def main():
     try:
-        asyncio.run(start_server())
+        reason = asyncio.run(run())
     except Exception as e:
-        print(f"Server crashed: {e}")
-        print("Rebooting...")
-        time.sleep(5)
-        reset()
+        reason = f"Server crashed: {e}"
+    print(reason)
+    print("Rebooting...")
+    time.sleep(5)
+    reset()
 
 # 运行主程序
 if __name__ == "__main__":
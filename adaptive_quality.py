@@ -0,0 +1,134 @@
+# --------- 自适应分辨率 / JPEG 质量 ----------
+# 根据最近的上传吞吐量和 API 端到端延迟，为每次分析选择摄像头分辨率和 JPEG 质量：
+# 预测延迟 = 服务端基础延迟 + 上传字节数 / 上传吞吐量，
+# 选择预测值不超过目标延迟的最高档位；链路变好时逐档提高画质。
+# 只包含策略本身，不依赖摄像头，可在电脑上用模拟链路测试。
+
+B64_OVERHEAD = 400  # 请求 JSON 中除图片外的大致字节数
+
+
+def default_size(width, height, quality):
+    """
+    没有实测数据时估算 JPEG 大小（OV2640，quality 越小画质越高）
+    :return: 字节数
+    """
+    return width * height * 5 // (3 * (quality + 4))
+
+
+class QualityController:
+    """
+    档位表按画质从低到高排列，每档为 (名称, 宽, 高, JPEG 质量)
+    """
+
+    def __init__(self, levels, target_ms=4000, initial=0, alpha=0.3, alpha_down=0.8, headroom=0.8):
+        """
+        :param levels: 档位列表 [(名称, 宽, 高, quality)]，画质从低到高
+        :param target_ms: 目标端到端延迟
+        :param initial: 初始档位下标
+        :param alpha: 滑动平均系数
+        :param alpha_down: 测量值变差时使用的系数，链路变慢时尽快降档
+        :param headroom: 提高档位时预测延迟须低于 target_ms * headroom，避免来回切换
+        """
+        self.levels = levels
+        self.target_ms = target_ms
+        self.level = initial
+        self.alpha = alpha
+        self.alpha_down = alpha_down
+        self.headroom = headroom
+        self.ms_per_byte = None  # 上传每字节耗时（吞吐量的倒数，对变慢更敏感）
+        self.base_ms = None      # 除上传外的延迟（服务端处理 + 下载）
+        self.sizes = [None] * len(levels)  # 各档位实测 JPEG 大小
+        self.size_scale = 1.0    # 实测大小 / 默认估算，用于尚无实测数据的档位
+        self.requests = 0
+        self.changes = 0
+        self.last_ms = None
+
+    def _ewma(self, old, new, worse=False):
+        if old is None:
+            return new
+        return old + (self.alpha_down if worse else self.alpha) * (new - old)
+
+    def expected_size(self, index):
+        """档位 index 的预计 JPEG 大小"""
+        if self.sizes[index] is not None:
+            return int(self.sizes[index])
+        _, w, h, q = self.levels[index]
+        return int(default_size(w, h, q) * self.size_scale)
+
+    def predict_ms(self, index):
+        """
+        预测档位 index 的端到端延迟
+        :return: 毫秒，尚无测量数据时返回 None
+        """
+        if self.ms_per_byte is None:
+            return None
+        upload = self.expected_size(index) * 4 // 3 + B64_OVERHEAD
+        return int(self.base_ms + upload * self.ms_per_byte)
+
+    def choose(self):
+        """
+        为下一次分析选择档位
+        超出目标时可以一次降多档，提高时每次只升一档
+        :return: 档位下标
+        """
+        if self.ms_per_byte is None:
+            return self.level
+        best = 0
+        for i in range(len(self.levels)):
+            if self.predict_ms(i) <= self.target_ms:
+                best = i
+        if best > self.level:
+            up = self.level + 1
+            if self.predict_ms(up) <= self.target_ms * self.headroom:
+                best = up
+            else:
+                best = self.level
+        if best != self.level:
+            self.changes += 1
+            self.level = best
+        return best
+
+    def observe_frame(self, index, jpeg_size):
+        """记录档位 index 下采集到的 JPEG 大小"""
+        self.sizes[index] = self._ewma(self.sizes[index], jpeg_size)
+        _, w, h, q = self.levels[index]
+        self.size_scale = self._ewma(self.size_scale, jpeg_size / default_size(w, h, q))
+
+    def record(self, sent_bytes, upload_ms, total_ms):
+        """
+        记录一次 API 调用
+        :param sent_bytes: 请求体字节数
+        :param upload_ms: 发送请求体所用时间
+        :param total_ms: 从发送到读完响应的总时间
+        """
+        self.requests += 1
+        self.last_ms = total_ms
+        per_byte = upload_ms / max(1, sent_bytes)
+        base = max(0, total_ms - upload_ms)
+        self.ms_per_byte = self._ewma(self.ms_per_byte, per_byte, self.ms_per_byte is not None and per_byte > self.ms_per_byte)
+        self.base_ms = self._ewma(self.base_ms, base, self.base_ms is not None and base > self.base_ms)
+
+    def params(self, index=None):
+        """档位参数，用于 /analyze 的 JSON 响应"""
+        if index is None:
+            index = self.level
+        name, w, h, q = self.levels[index]
+        return {
+            "level": index,
+            "framesize": name,
+            "width": w,
+            "height": h,
+            "quality": q,
+            "target_ms": self.target_ms,
+            "predicted_ms": self.predict_ms(index)
+        }
+
+    def stats(self):
+        return {
+            "level": self.level,
+            "requests": self.requests,
+            "changes": self.changes,
+            "throughput_kbps": int(8 / self.ms_per_byte) if self.ms_per_byte else None,
+            "base_ms": int(self.base_ms) if self.base_ms is not None else None,
+            "last_ms": self.last_ms
+        }
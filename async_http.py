@@ -0,0 +1,425 @@
+import time
+import uasyncio as asyncio
+import ubinascii
+import metrics
+
+# --------- 异步 HTTP/1.1 客户端 ----------
+# 基于 asyncio.open_connection 的流实现，等待网络时会让出事件循环，
+# 不会像 urequests 那样阻塞整个 HTTP 服务器。
+
+_tls_ctx = None
+
+def _tls_context():
+    """
+    创建（并缓存）TLS 客户端上下文
+    与 urequests 行为一致，不校验服务器证书
+    """
+    global _tls_ctx
+    if _tls_ctx is None:
+        import ssl
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        if hasattr(ctx, "check_hostname"):  # CPython 需要先关闭主机名校验
+            ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+        _tls_ctx = ctx
+    return _tls_ctx
+
+
+class HTTPTimeout(OSError):
+    """某个阶段超时，phase 为 "connect"、"send"、"ttfb" 或 "read" """
+
+    def __init__(self, phase, ms):
+        super().__init__(f"{phase} timeout after {ms} ms")
+        self.phase = phase
+        self.ms = ms
+
+
+class Timeouts:
+    """
+    请求各阶段的超时（毫秒），0 表示不限
+    """
+
+    def __init__(self, connect_ms=8000, ttfb_ms=20000, read_ms=10000):
+        """
+        :param connect_ms: 建立连接（DNS、TCP、TLS 握手）
+        :param ttfb_ms: 从开始发送请求到收到响应状态行（含上传请求体和服务端处理）
+        :param read_ms: 读取响应头和响应体时，两次收到数据之间的最长间隔
+        """
+        self.connect_ms = connect_ms
+        self.ttfb_ms = ttfb_ms
+        self.read_ms = read_ms
+
+
+async def _timed(coro, ms, phase):
+    """在 ms 毫秒内完成 coro，否则抛出 HTTPTimeout"""
+    if not ms:
+        return await coro
+    try:
+        return await asyncio.wait_for(coro, ms / 1000)
+    except asyncio.TimeoutError:
+        raise HTTPTimeout(phase, ms)
+
+
+def parse_url(url):
+    """
+    拆分 URL
+    :param url: 形如 https://host[:port]/path 的地址
+    :return: (scheme, host, port, path)
+    """
+    scheme, _, rest = url.partition("://")
+    host, sep, path = rest.partition("/")
+    path = sep + path if sep else "/"
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    else:
+        port = 443 if scheme == "https" else 80
+    return scheme, host, port, path
+
+
+class Base64Body:
+    """
+    流式 base64 请求体片段
+    按固定大小分块编码并直接写入连接，额外内存占用只有一个块的大小
+    """
+
+    def __init__(self, data, chunk_size=1536):
+        """
+        :param data: 原始二进制数据（如 JPEG 帧）
+        :param chunk_size: 每次编码的原始字节数，需为 3 的倍数
+        """
+        self.data = data
+        self.chunk_size = chunk_size - chunk_size % 3
+
+    def __len__(self):
+        # base64 编码后的长度，无换行
+        return (len(self.data) + 2) // 3 * 4
+
+    async def write_to(self, writer):
+        mv = memoryview(self.data)
+        step = self.chunk_size
+        encode_us = 0
+        for i in range(0, len(mv), step):
+            start = time.ticks_us()
+            chunk = ubinascii.b2a_base64(mv[i:i + step], newline=False)
+            encode_us += time.ticks_diff(time.ticks_us(), start)
+            writer.write(chunk)
+            await writer.drain()
+        metrics.observe("encode", encode_us / 1000)
+
+
+def _body_parts(body):
+    """将请求体统一为片段列表：bytes 或带 write_to() 的流式片段"""
+    if body is None:
+        return ()
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return (body,)
+    return body
+
+
+async def _close(writer):
+    """关闭连接（MicroPython 中 wait_closed() 才真正关闭 socket）"""
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+async def _open(scheme, host, port):
+    start = time.ticks_ms()
+    ssl = _tls_context() if scheme == "https" else None
+    conn = await asyncio.open_connection(host, port, ssl=ssl)
+    metrics.since("connect", start)  # 含 DNS、TCP 和 TLS 握手
+    return conn
+
+
+class ConnectionPool:
+    """
+    HTTP/1.1 keep-alive 连接池
+    每个 (scheme, host, port) 最多保留 max_idle 条空闲连接，复用以省去 TCP/TLS 握手；
+    空闲超过 idle_ms 的连接直接关闭，不再复用
+    """
+
+    def __init__(self, max_idle=1, idle_ms=30000):
+        """
+        :param max_idle: 每个主机保留的空闲连接数
+        :param idle_ms: 空闲连接的最长保留时间，应小于服务器的 keep-alive 超时
+        """
+        self.max_idle = max_idle
+        self.idle_ms = idle_ms
+        self._idle = {}  # key -> [(reader, writer, 放回时间)]
+        self.opened = 0
+        self.reused = 0
+
+    async def get(self, key):
+        """
+        取一条可用的空闲连接
+        :return: (reader, writer)，没有时返回 None
+        """
+        conns = self._idle.get(key)
+        now = time.ticks_ms()
+        while conns:
+            reader, writer, since = conns.pop()
+            if time.ticks_diff(now, since) < self.idle_ms:
+                self.reused += 1
+                return reader, writer
+            await _close(writer)
+        return None
+
+    async def put(self, key, reader, writer):
+        """归还连接，超过 max_idle 时直接关闭"""
+        conns = self._idle.setdefault(key, [])
+        if len(conns) >= self.max_idle:
+            await _close(writer)
+            return
+        conns.append((reader, writer, time.ticks_ms()))
+
+    async def close_all(self):
+        for conns in self._idle.values():
+            for _, writer, _ in conns:
+                await _close(writer)
+        self._idle = {}
+
+    def stats(self):
+        return {
+            "opened": self.opened,
+            "reused": self.reused,
+            "idle": sum(len(c) for c in self._idle.values())
+        }
+
+
+class HTTPResponse:
+    """
+    HTTP 响应：状态行和响应头已读取，响应体按需读取
+    支持 Content-Length、chunked 以及读到连接关闭三种方式
+    """
+
+    def __init__(self, reader, writer, status, headers, pool=None, key=None, keep_alive=False):
+        self.reader = reader
+        self.writer = writer
+        self.status = status
+        self.headers = headers
+        self._chunked = "chunked" in headers.get("transfer-encoding", "")
+        length = headers.get("content-length")
+        self._remaining = int(length) if length is not None else -1
+        self._done = False
+        self._buf = b""
+        # 只有长度明确的响应才能在读完后复用连接
+        self._pool = pool if keep_alive and (self._chunked or length is not None) else None
+        self._key = key
+        self.read_timeout_ms = 0  # 每次读取的超时，由 request() 设置
+        # 由 request() 填写的计时信息
+        self.started = None   # 开始发送请求的时刻（ticks_ms）
+        self.sent_bytes = 0   # 请求体字节数
+        self.upload_ms = 0    # 发送请求所用时间
+        self._headers_at = time.ticks_ms()  # 响应头读完的时刻，用于统计下载耗时
+
+    async def read_chunk(self, size=1024):
+        """
+        读取下一段响应体
+        :param size: 非 chunked 模式下单次读取的最大字节数
+        :return: 数据块，读完时返回 b""
+        """
+        if self._done:
+            return b""
+        data = await _timed(self._read_chunk(size), self.read_timeout_ms, "read")
+        if self._done:
+            metrics.since("download", self._headers_at)
+        return data
+
+    async def _read_chunk(self, size):
+        if self._done:
+            return b""
+        if self._chunked:
+            line = await self.reader.readline()
+            chunk_len = int(line.split(b";")[0].strip() or b"0", 16)
+            if chunk_len == 0:
+                # 跳过 trailer，直到空行
+                while True:
+                    line = await self.reader.readline()
+                    if not line or line == b"\r\n":
+                        break
+                self._done = True
+                return b""
+            data = await self.reader.readexactly(chunk_len)
+            await self.reader.readline()  # 块末尾的 \r\n
+            return data
+        if self._remaining == 0:
+            self._done = True
+            return b""
+        if self._remaining > 0:
+            size = min(size, self._remaining)
+        data = await self.reader.read(size)
+        if not data:
+            self._done = True
+            return b""
+        if self._remaining > 0:
+            self._remaining -= len(data)
+        return data
+
+    async def read(self):
+        """读取完整响应体"""
+        parts = [self._buf]
+        self._buf = b""
+        while True:
+            data = await self.read_chunk()
+            if not data:
+                break
+            parts.append(data)
+        return b"".join(parts)
+
+    async def text(self):
+        return (await self.read()).decode("utf-8")
+
+    async def readline(self):
+        """
+        读取响应体中的一行（含换行符）
+        :return: 一行数据，读完时返回 b""
+        """
+        while b"\n" not in self._buf:
+            data = await self.read_chunk()
+            if not data:
+                line, self._buf = self._buf, b""
+                return line
+            self._buf += data
+        i = self._buf.index(b"\n") + 1
+        line, self._buf = self._buf[:i], self._buf[i:]
+        return line
+
+    async def read_event(self):
+        """
+        增量解析 server-sent events，读取下一条事件的 data 字段
+        每次只在内存中保留一行，不会缓存整个响应
+        :return: data 字符串（多行 data 以换行连接），流结束时返回 None
+        """
+        data = None
+        while True:
+            line = await self.readline()
+            if not line:
+                return data
+            line = line.rstrip(b"\r\n")
+            if not line:
+                # 空行表示一条事件结束
+                if data is not None:
+                    return data
+                continue
+            if line.startswith(b"data:"):
+                value = line[5:]
+                if value.startswith(b" "):
+                    value = value[1:]
+                value = value.decode("utf-8")
+                data = value if data is None else data + "\n" + value
+
+    async def aclose(self):
+        """释放连接：响应体已完整读取且可复用时归还连接池，否则关闭"""
+        pool, self._pool = self._pool, None
+        if pool is not None and self._done and not self._buf:
+            await pool.put(self._key, self.reader, self.writer)
+        else:
+            await _close(self.writer)
+
+
+async def _send(writer, method, path, host, headers, parts, keep_alive):
+    head = "{} {} HTTP/1.1\r\nHost: {}\r\nConnection: {}\r\n".format(
+        method, path, host, "keep-alive" if keep_alive else "close")
+    raw_headers = None
+    if isinstance(headers, (bytes, bytearray)):
+        raw_headers = headers  # 预先编码好的请求头行
+    elif headers:
+        for name, value in headers.items():
+            head += "{}: {}\r\n".format(name, value)
+    writer.write(head.encode("utf-8"))
+    if raw_headers:
+        writer.write(raw_headers)
+    if parts:
+        # 先算出总长度，请求体可以边编码边发送
+        writer.write(b"Content-Length: %d\r\n\r\n" % sum(len(p) for p in parts))
+    else:
+        writer.write(b"\r\n")
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            writer.write(part)
+        else:
+            await part.write_to(writer)
+    await writer.drain()
+
+
+async def request(method, url, headers=None, body=None, pool=None, timeouts=None):
+    """
+    发送 HTTP 请求并读取响应头
+    :param method: 请求方法，如 "POST"
+    :param url: 请求地址（http 或 https）
+    :param headers: 额外的请求头字典，或预先编码好的请求头字节（每行以 \r\n 结尾）
+    :param body: 请求体：bytes，或由 bytes / Base64Body 组成的片段列表，可为 None
+    :param pool: ConnectionPool，提供时使用 keep-alive 并复用连接
+    :param timeouts: Timeouts，默认不限时
+    :return: HTTPResponse，使用完毕后需调用 aclose()
+    :raises HTTPTimeout: 某个阶段超时
+    """
+    scheme, host, port, path = parse_url(url)
+    parts = _body_parts(body)
+    key = (scheme, host, port)
+    t = timeouts or _NO_TIMEOUTS
+    conn = await pool.get(key) if pool is not None else None
+    while True:
+        reused = conn is not None
+        if conn is None:
+            conn = await _timed(_open(scheme, host, port), t.connect_ms, "connect")
+            if pool is not None:
+                pool.opened += 1
+        reader, writer = conn
+        try:
+            started = time.ticks_ms()
+            await _timed(_send(writer, method, path, host, headers, parts, pool is not None), t.ttfb_ms, "send")
+            upload_ms = time.ticks_diff(time.ticks_ms(), started)
+            # 状态行: HTTP/1.1 200 OK（首字节超时从开始发送算起）
+            wait_ms = max(1, t.ttfb_ms - upload_ms) if t.ttfb_ms else 0
+            line = await _timed(reader.readline(), wait_ms, "ttfb")
+            metrics.since("ttfb", time.ticks_add(started, upload_ms))
+            if not line:
+                raise OSError("connection closed before response")
+            break
+        except OSError as e:
+            await _close(writer)
+            if not reused or isinstance(e, HTTPTimeout):
+                raise
+            # 复用的连接已被服务器关闭：重新建立连接后重发
+            conn = None
+        except BaseException:
+            # 被取消（如调用方的总时限到了）时也要关闭连接
+            await _close(writer)
+            raise
+
+    try:
+        status = int(line.split(None, 2)[1])
+        keep_alive = line.startswith(b"HTTP/1.1")
+
+        # 响应头
+        resp_headers = {}
+        while True:
+            line = await _timed(reader.readline(), t.read_ms, "read")
+            if not line or line == b"\r\n":
+                break
+            name, _, value = line.decode("utf-8").partition(":")
+            resp_headers[name.strip().lower()] = value.strip()
+        if resp_headers.get("connection", "").lower() == "close":
+            keep_alive = False
+        response = HTTPResponse(reader, writer, status, resp_headers, pool, key, keep_alive)
+        response.read_timeout_ms = t.read_ms
+        response.started = started
+        response.sent_bytes = sum(len(p) for p in parts)
+        response.upload_ms = upload_ms
+        metrics.observe("upload", upload_ms)  # 含请求体的 base64 编码
+        return response
+    except BaseException:
+        await _close(writer)
+        raise
+
+
+_NO_TIMEOUTS = Timeouts(0, 0, 0)
+
+
+async def post(url, data=None, headers=None, pool=None, timeouts=None):
+    """等价于 urequests.post 的异步版本"""
+    return await request("POST", url, headers=headers, body=data, pool=pool, timeouts=timeouts)
@@ -0,0 +1,39 @@
+# --------- 静态资源打包（在电脑上运行） ----------
+# 用法: python build_assets.py
+# 把 static/ 下的 html/css/js 用 gzip -9 压缩为同名 .gz 文件，然后与 static/ 一起上传到设备。
+# 修改页面后需要重新运行；设备固件启用了 deflate 压缩时，缺少的 .gz 也会在启动时自动生成。
+
+import gzip
+import os
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+EXTENSIONS = (".html", ".css", ".js")
+
+
+def build(static_dir=STATIC_DIR):
+    """
+    压缩 static 目录下的页面文件
+    :return: [(文件名, 原大小, 压缩后大小)]
+    """
+    results = []
+    for name in sorted(os.listdir(static_dir)):
+        if not name.endswith(EXTENSIONS):
+            continue
+        path = os.path.join(static_dir, name)
+        with open(path, "rb") as f:
+            data = f.read()
+        # mtime=0：内容不变时输出完全相同，ETag 也就不变
+        packed = gzip.compress(data, compresslevel=9, mtime=0)
+        with open(path + ".gz", "wb") as f:
+            f.write(packed)
+        results.append((name, len(data), len(packed)))
+    return results
+
+
+if __name__ == "__main__":
+    total_raw = total_gz = 0
+    for name, raw, packed in build():
+        total_raw += raw
+        total_gz += packed
+        print(f"{name}: {raw} -> {packed} bytes")
+    print(f"total: {total_raw} -> {total_gz} bytes")
@@ -0,0 +1,80 @@
+import time
+
+# --------- 熔断器 ----------
+# 连续失败达到阈值后"断开"：冷却期内的调用直接失败，不再每次等到超时；
+# 冷却结束后放行一次试探调用（半开），成功则恢复，失败则再次断开且冷却时间加倍。
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    调用前 allow()，调用后 success() 或 failure()
+    """
+
+    def __init__(self, failure_threshold=3, reset_ms=30000, max_reset_ms=300000):
+        """
+        :param failure_threshold: 连续失败多少次后断开
+        :param reset_ms: 断开后的冷却时间
+        :param max_reset_ms: 试探连续失败时冷却时间加倍的上限
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_ms = reset_ms
+        self.max_reset_ms = max_reset_ms
+        self.state = CLOSED
+        self.failures = 0          # 连续失败次数
+        self.cooldown_ms = reset_ms
+        self.opened_at = 0
+        self.opened = 0            # 断开次数
+        self.rejected = 0          # 被拒绝的调用次数
+
+    def retry_in_ms(self):
+        """断开状态下距离允许试探还有多久"""
+        if self.state != OPEN:
+            return 0
+        return max(0, self.cooldown_ms - time.ticks_diff(time.ticks_ms(), self.opened_at))
+
+    def allow(self):
+        """
+        是否允许发起调用
+        冷却结束后只放行一次试探，试探结束前的其他调用都被拒绝
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.retry_in_ms() == 0:
+            self.state = HALF_OPEN
+            return True
+        self.rejected += 1
+        return False
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown_ms = self.reset_ms
+
+    def failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # 试探失败：再次断开，冷却时间加倍
+            self.cooldown_ms = min(self.cooldown_ms * 2, self.max_reset_ms)
+            self._open()
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.ticks_ms()
+        self.opened += 1
+        print(f"Circuit breaker open for {self.cooldown_ms} ms after {self.failures} failures")
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_in_ms": self.retry_in_ms(),
+            "opened": self.opened,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,299 @@
+import os
+import struct
+
+# --------- 识别记录日志 ----------
+# 每次识别写一条 32 字节的定长记录，追加到 flash 上的分段文件中（只追加，不改写）：
+#   0  uint32 时间（time.time() 秒）    4  uint16 帧序号        6  uint8 来源    7  uint8 类别数
+#   8  8 组 (类别编号 uint8, 数量 uint8)                          24 第一个坐标框 x1 y1 x2 y2（按画面宽高缩放到 0..255）
+#   28 uint8 画面宽/8  29 uint8 画面高/8  30 uint16 校验和
+# 类别名在 labels.txt 中按行编号（只追加）。每段写满 records_per_segment 条后换新段，
+# 超过 max_segments 段时删除最旧的一段，flash 占用有上限。
+# 每段有一个 .idx 时间索引：每 index_every 条记录一项 (时间, 记录号)，
+# 按时间查询时二分查找索引后只读取范围内的记录，不扫描、不载入整个日志。
+# 时间倒退时换新段，所以只有段内时间有序，段与段之间不保证；
+# 时间应为校准过的时钟，未校时的 RTC 每次上电都从同一时刻开始，记录会混在一起。
+
+RECORD = 32
+MAX_ITEMS = 8
+SOURCES = ("cloud", "local", "cache")
+OTHER = 255  # 类别表满后新类别的编号
+_CHUNK = 32  # 查询时每次读取的记录数
+
+
+def _checksum(rec):
+    s = 0
+    for i in range(RECORD - 2):
+        s += rec[i]
+    return s & 0xFFFF
+
+
+class _Segment:
+    def __init__(self, number, count=0, first=None, last=None, sealed=False):
+        self.number = number
+        self.count = count
+        self.first = first
+        self.last = last
+        self.sealed = sealed  # 末尾有写了一半的记录，不再追加
+
+
+class DetectionLog:
+    """
+    分段的追加日志
+    """
+
+    def __init__(self, root="history", records_per_segment=4096, max_segments=10, index_every=64):
+        """
+        :param root: 日志目录
+        :param records_per_segment: 每段记录数（每段 records_per_segment * 32 字节）
+        :param max_segments: 最多保留的段数
+        :param index_every: 每多少条记录写一项时间索引
+        """
+        self.root = root
+        self.records_per_segment = records_per_segment
+        self.max_segments = max_segments
+        self.index_every = index_every
+        self.segments = []
+        self.labels = []
+        self._ids = {}
+        self._file = None
+        self._index = None
+        self.appended = 0
+        self.dropped = 0  # 被删除的旧记录数
+        self._buf = bytearray(RECORD * _CHUNK)
+
+    def _path(self, number, ext):
+        return f"{self.root}/{number:08d}.{ext}"
+
+    def open(self):
+        """载入类别表和各段的记录数、时间范围（每段只读首尾两条记录）"""
+        try:
+            os.mkdir(self.root)
+        except OSError:
+            pass  # 已存在
+        try:
+            with open(self.root + "/labels.txt") as f:
+                for line in f:
+                    self._add_label(line.rstrip("\r\n"))
+        except OSError:
+            pass
+        numbers = sorted(int(name[:-4]) for name in os.listdir(self.root) if name.endswith(".log"))
+        for number in numbers:
+            size = os.stat(self._path(number, "log"))[6]
+            seg = _Segment(number, size // RECORD, sealed=size % RECORD != 0)
+            if seg.count:
+                with open(self._path(number, "log"), "rb") as f:
+                    seg.first = struct.unpack("<I", f.read(4))[0]
+                    f.seek((seg.count - 1) * RECORD)
+                    seg.last = struct.unpack("<I", f.read(4))[0]
+            self.segments.append(seg)
+        return self
+
+    def close(self):
+        for f in (self._file, self._index):
+            if f is not None:
+                f.close()
+        self._file = self._index = None
+
+    def _add_label(self, label):
+        self.labels.append(label)
+        self._ids[label] = len(self.labels)
+
+    def label_id(self, label, create=False):
+        """类别编号（从 1 开始），不存在时返回 None 或新建"""
+        i = self._ids.get(label)
+        if i is None and create:
+            if len(self.labels) >= OTHER - 1:
+                return OTHER
+            with open(self.root + "/labels.txt", "a") as f:
+                f.write(label + "\n")
+            self._add_label(label)
+            i = len(self.labels)
+        return i
+
+    def _label(self, i):
+        return self.labels[i - 1] if 0 < i <= len(self.labels) else "other"
+
+    def _rotate(self):
+        """开始新的一段，必要时删除最旧的段"""
+        self.close()
+        number = self.segments[-1].number + 1 if self.segments else 1
+        self.segments.append(_Segment(number))
+        while len(self.segments) > self.max_segments:
+            old = self.segments.pop(0)
+            self.dropped += old.count
+            for ext in ("log", "idx"):
+                try:
+                    os.remove(self._path(old.number, ext))
+                except OSError:
+                    pass
+
+    def append(self, ts, seq, source, objects, frame_size=None):
+        """
+        追加一条记录
+        :param ts: 时间（秒）
+        :param source: "cloud" / "local" / "cache"
+        :param objects: [{"label", "count", "boxes"}]，最多记录 MAX_ITEMS 个类别、第一个坐标框
+        :param frame_size: (宽, 高)，用于保存坐标框
+        """
+        seg = self.segments[-1] if self.segments else None
+        # 时间倒退（如校时）时换新段，保证每段内时间不减，索引可以二分查找
+        if seg is None or seg.sealed or seg.count >= self.records_per_segment or (seg.last is not None and ts < seg.last):
+            self._rotate()
+            seg = self.segments[-1]
+        if self._file is None:
+            self._file = open(self._path(seg.number, "log"), "ab")
+            self._index = open(self._path(seg.number, "idx"), "ab")
+
+        rec = bytearray(RECORD)
+        struct.pack_into("<IHBB", rec, 0, ts, seq & 0xFFFF, SOURCES.index(source), min(len(objects), MAX_ITEMS))
+        for i, obj in enumerate(objects[:MAX_ITEMS]):
+            rec[8 + 2 * i] = self.label_id(obj["label"], True)
+            rec[9 + 2 * i] = min(255, obj["count"])
+        if frame_size:
+            w, h = frame_size
+            rec[28] = min(255, w // 8)
+            rec[29] = min(255, h // 8)
+            for obj in objects:
+                if obj.get("boxes"):
+                    x1, y1, x2, y2 = obj["boxes"][0]
+                    rec[24] = min(255, x1 * 255 // w)
+                    rec[25] = min(255, y1 * 255 // h)
+                    rec[26] = min(255, x2 * 255 // w)
+                    rec[27] = min(255, y2 * 255 // h)
+                    break
+        struct.pack_into("<H", rec, 30, _checksum(rec))
+
+        pos = seg.count
+        self._file.write(rec)
+        self._file.flush()
+        if pos % self.index_every == 0:
+            self._index.write(struct.pack("<II", ts, pos))
+            self._index.flush()
+        seg.count += 1
+        if seg.first is None:
+            seg.first = ts
+        seg.last = ts
+        self.appended += 1
+
+    def _decode(self, rec):
+        if struct.unpack_from("<H", rec, 30)[0] != _checksum(rec):
+            return None
+        ts, seq, source, n = struct.unpack_from("<IHBB", rec, 0)
+        objects = []
+        for i in range(min(n, MAX_ITEMS)):
+            objects.append({"label": self._label(rec[8 + 2 * i]), "count": rec[9 + 2 * i]})
+        entry = {"time": ts, "frame_seq": seq, "source": SOURCES[source] if source < len(SOURCES) else "?", "objects": objects}
+        if rec[26] > rec[24] and rec[28]:
+            w, h = rec[28] * 8, rec[29] * 8
+            entry["box"] = [rec[24] * w // 255, rec[25] * h // 255, rec[26] * w // 255, rec[27] * h // 255]
+        return entry
+
+    def _start(self, seg, start):
+        """按时间索引找到 seg 中开始读取的记录号（最后一个时间早于 start 的索引项）"""
+        try:
+            with open(self._path(seg.number, "idx"), "rb") as f:
+                data = f.read()
+        except OSError:
+            return 0
+        lo, hi = 0, len(data) // 8
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from("<I", data, mid * 8)[0] < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        return struct.unpack_from("<I", data, (lo - 1) * 8 + 4)[0] if lo else 0
+
+    def query(self, start=None, end=None, label=None, limit=100):
+        """
+        按时间范围和类别查询
+        :param start: 起始时间（秒，含），None 表示返回 end 之前最近的 limit 条（新的在前）
+        :param end: 结束时间（秒，含），None 表示不限
+        :param label: 只返回包含该类别的记录
+        :return: (记录列表, 读取的记录数)
+        """
+        label_id = None
+        if label is not None:
+            label_id = self.label_id(label)
+            if label_id is None:
+                return [], 0
+        if end is None:
+            end = 0xFFFFFFFF
+        if self._file is not None:
+            self._file.flush()
+        results = []
+        scanned = 0
+        latest = start is None
+        segments = reversed(self.segments) if latest else self.segments
+        buf = self._buf
+        mv = memoryview(buf)
+        for seg in segments:
+            if not seg.count:
+                continue
+            if seg.first > end or (not latest and seg.last < start):
+                continue
+            if latest:
+                # 从段尾向前按块读取
+                pos = seg.count
+            else:
+                pos = self._start(seg, start)
+            past = False  # 本段后面的记录都晚于 end（后面的段仍可能在范围内）
+            with open(self._path(seg.number, "log"), "rb") as f:
+                while not past:
+                    if latest:
+                        if pos <= 0:
+                            break
+                        first = max(0, pos - _CHUNK)
+                        n = pos - first
+                        pos = first
+                    else:
+                        if pos >= seg.count:
+                            break
+                        first = pos
+                        n = min(_CHUNK, seg.count - pos)
+                        pos += n
+                    f.seek(first * RECORD)
+                    f.readinto(mv[:n * RECORD])
+                    scanned += n
+                    order = range(n - 1, -1, -1) if latest else range(n)
+                    for i in order:
+                        rec = mv[i * RECORD:(i + 1) * RECORD]
+                        ts = struct.unpack_from("<I", rec, 0)[0]
+                        if latest:
+                            if ts > end:
+                                continue
+                        else:
+                            if ts < start:
+                                continue
+                            if ts > end:
+                                past = True
+                                break
+                        if label_id is not None:
+                            found = False
+                            for j in range(MAX_ITEMS):
+                                if rec[8 + 2 * j] == label_id:
+                                    found = True
+                                    break
+                            if not found:
+                                continue
+                        entry = self._decode(rec)
+                        if entry is None:
+                            continue
+                        results.append(entry)
+                        if len(results) >= limit:
+                            return results, scanned
+        return results, scanned
+
+    def stats(self):
+        records = sum(s.count for s in self.segments)
+        return {
+            "segments": len(self.segments),
+            "records": records,
+            "bytes": records * RECORD,
+            "max_bytes": self.records_per_segment * self.max_segments * RECORD,
+            "labels": len(self.labels),
+            "oldest": self.segments[0].first if self.segments else None,
+            "newest": self.segments[-1].last if self.segments else None,
+            "appended": self.appended,
+            "dropped": self.dropped
+        }
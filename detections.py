@@ -0,0 +1,113 @@
+import json
+from jpeg_crop import Region
+
+# --------- 结构化识别结果 ----------
+# 结构化模式下在提示词后面要求模型只输出 JSON（类别、数量、可选的坐标框），
+# 收到后提取并校验：类别名规范化、数量取整、坐标框限制在 0..1 并映射回原图像素坐标。
+# 不符合格式的回复返回错误，由调用方决定按普通文本处理。
+
+MAX_OBJECTS = 16
+MAX_LABEL = 24
+
+PROMPT_SUFFIX = (
+    "\n请只输出一个 JSON 对象，不要输出其他文字，格式如下：\n"
+    '{"objects": [{"label": "类别（简短的英文小写名词，如 bottle）", "count": 数量, '
+    '"boxes": [[x1, y1, x2, y2]], "image": 图片序号}], "summary": "一句话中文描述"}\n'
+    "坐标为相对图片宽高的 0 到 1 之间的小数；看不清位置时省略 boxes；只有一张图片时省略 image。"
+)
+
+
+def structured_prompt(prompt):
+    """在提示词后附加 JSON 格式要求"""
+    return prompt + PROMPT_SUFFIX
+
+
+def normalize_label(label):
+    """类别名规范化：去空白、小写、限制长度"""
+    return " ".join(str(label).split()).lower()[:MAX_LABEL]
+
+
+def _extract(text):
+    """从回复中取出 JSON 对象（模型常会包上 ```json 代码块或多说几句）"""
+    start = text.find("{")
+    end = text.rfind("}")
+    if start < 0 or end <= start:
+        raise ValueError("no JSON object in reply")
+    return json.loads(text[start:end + 1])
+
+
+def _box(value):
+    """校验坐标框，返回 0..1 的 [x1, y1, x2, y2]，无效时返回 None"""
+    if not isinstance(value, (list, tuple)) or len(value) != 4:
+        return None
+    try:
+        v = [float(c) for c in value]
+    except (TypeError, ValueError):
+        return None
+    # 有的模型输出 0..1000 的整数坐标
+    if max(v) > 1.0:
+        if max(v) > 1000:
+            return None
+        v = [c / 1000 for c in v]
+    v = [0.0 if c < 0 else 1.0 if c > 1 else c for c in v]
+    x1, x2 = min(v[0], v[2]), max(v[0], v[2])
+    y1, y2 = min(v[1], v[3]), max(v[1], v[3])
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return [x1, y1, x2, y2]
+
+
+def parse(text, regions):
+    """
+    解析并校验结构化回复
+    :param text: 模型回复
+    :param regions: 各图片在原图中的区域 [(x, y, w, h)]，整帧上传时为 [(0, 0, 宽, 高)]；
+                    None 表示画面尺寸未知，不返回坐标框
+    :return: {"objects": [{"label", "count", "boxes": [[x1, y1, x2, y2] 原图像素]}], "summary"}
+    :raises ValueError: 回复不是有效的结构化结果
+    """
+    data = _extract(text)
+    if not isinstance(data, dict):
+        raise ValueError("reply is not a JSON object")
+    items = data.get("objects", [])
+    if not isinstance(items, list):
+        raise ValueError("objects is not a list")
+    tiles = [Region(*r) for r in regions] if regions else None
+    objects = []
+    merged = {}
+    for item in items[:MAX_OBJECTS]:
+        if not isinstance(item, dict) or not item.get("label"):
+            continue
+        label = normalize_label(item["label"])
+        boxes = []
+        raw = item.get("boxes") or []
+        if tiles and isinstance(raw, list):
+            tile = tiles[0]
+            image = item.get("image")
+            if isinstance(image, int) and 1 <= image <= len(tiles):
+                tile = tiles[image - 1]
+            for b in raw[:MAX_OBJECTS]:
+                b = _box(b)
+                if b is not None:
+                    boxes.append(list(tile.to_frame(b, True)))
+        try:
+            count = int(item.get("count", len(boxes) or 1))
+        except (TypeError, ValueError):
+            count = len(boxes) or 1
+        count = max(0, min(count, 255))
+        # 分块上传时同一类别可能在多个区域中各出现一次，合并
+        obj = merged.get(label)
+        if obj is None:
+            obj = merged[label] = {"label": label, "count": 0, "boxes": []}
+            objects.append(obj)
+        obj["count"] = min(255, obj["count"] + count)
+        obj["boxes"] += boxes
+    summary = data.get("summary")
+    if not isinstance(summary, str) or not summary:
+        summary = "、".join(f"{o['label']} x{o['count']}" for o in objects) or "未发现物体"
+    return {"objects": objects, "summary": summary}
+
+
+def from_label(label, text):
+    """本地分类器的结果写成同样的结构（一个类别、数量 1、没有坐标）"""
+    return {"objects": [{"label": normalize_label(label), "count": 1, "boxes": []}], "summary": text}
@@ -0,0 +1,137 @@
+import time
+import uasyncio as asyncio
+import metrics
+
+# --------- 后台采集与帧环形缓冲 ----------
+# 后台任务按目标帧率采集，最近几帧连同序号和时间戳保存在预分配的环形缓冲中。
+# /capture、/analyze、/stream 都从这里取帧，不再在请求处理中直接调用 camera.capture()，
+# 同一时刻的多个请求共享同一次采集（single-flight）。
+
+class FrameSource:
+    """
+    后台采集任务 + 帧环形缓冲
+    连续模式：启动后一直采集
+    按需模式：只在有消费者时采集，最后一个消费者离开 linger_ms 后停止，降低功耗
+    """
+
+    def __init__(self, capture, fps=5, depth=3, on_demand=True, linger_ms=2000):
+        """
+        :param capture: 采集函数，返回 JPEG 数据，失败返回 None
+        :param fps: 目标帧率
+        :param depth: 环形缓冲保存的帧数
+        :param on_demand: 是否为按需模式
+        :param linger_ms: 按需模式下最后一个消费者离开后继续采集的时间
+        """
+        self.capture = capture
+        self.interval_ms = 1000 // fps
+        self.on_demand = on_demand
+        self.linger_ms = linger_ms
+        # 预分配的槽位: [序号, 时间戳(ms), JPEG 数据]
+        self.slots = [[0, 0, None] for _ in range(depth)]
+        self.seq = 0
+        self.consumers = 0
+        self.captures = 0
+        self.errors = 0
+        self._last_demand = time.ticks_ms()
+        self._event = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        """启动后台采集任务（连续模式在服务器启动时调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def acquire(self):
+        """登记一个消费者，必要时启动采集任务"""
+        self.consumers += 1
+        self.start()
+
+    def release(self):
+        """注销消费者"""
+        self.consumers -= 1
+        self._last_demand = time.ticks_ms()
+
+    def latest(self):
+        """
+        最新一帧，不等待
+        :return: (序号, 时间戳, JPEG 数据)，尚无帧时返回 None
+        """
+        if self.seq == 0:
+            return None
+        return tuple(self.slots[self.seq % len(self.slots)])
+
+    def get(self, seq):
+        """
+        按序号取缓冲中的帧
+        :return: (序号, 时间戳, JPEG 数据)，已被覆盖时返回 None
+        """
+        slot = self.slots[seq % len(self.slots)]
+        return tuple(slot) if slot[0] == seq and seq else None
+
+    async def next_frame(self, after_seq):
+        """
+        等待比 after_seq 更新的帧（持续消费者使用，忽略单次采集失败）
+        慢消费者直接拿到最新帧，中间帧被丢弃
+        :return: (序号, 时间戳, JPEG 数据)
+        """
+        while self.seq == after_seq:
+            await self._event.wait()
+        return self.latest()
+
+    async def next_after_now(self):
+        """
+        等待调用之后采集的下一帧
+        :return: (序号, 时间戳, JPEG 数据)
+        :raises OSError: 这一次采集失败
+        """
+        self.acquire()
+        try:
+            after_seq, errors = self.seq, self.errors
+            while self.seq == after_seq:
+                if self.errors != errors:
+                    raise OSError("camera capture failed")
+                await self._event.wait()
+            return self.latest()
+        finally:
+            self.release()
+
+    async def newest(self, max_age_ms=None):
+        """
+        最新的一帧：缓冲中的帧足够新时立即返回，否则等待下一帧
+        :param max_age_ms: 可接受的帧龄，默认两个帧周期
+        :return: (序号, 时间戳, JPEG 数据)
+        """
+        if max_age_ms is None:
+            max_age_ms = 2 * self.interval_ms
+        frame = self.latest()
+        if frame and time.ticks_diff(time.ticks_ms(), frame[1]) <= max_age_ms:
+            return frame
+        return await self.next_after_now()
+
+    def _wanted(self):
+        if not self.on_demand or self.consumers > 0:
+            return True
+        return time.ticks_diff(time.ticks_ms(), self._last_demand) < self.linger_ms
+
+    async def _run(self):
+        try:
+            while self._wanted():
+                start = time.ticks_ms()
+                buf = self.capture()
+                metrics.since("capture", start)
+                if buf:
+                    slot = self.slots[(self.seq + 1) % len(self.slots)]
+                    slot[0] = self.seq + 1
+                    slot[1] = start
+                    slot[2] = buf
+                    self.seq += 1
+                    self.captures += 1
+                else:
+                    self.errors += 1
+                # 唤醒所有等待中的消费者
+                self._event.set()
+                self._event.clear()
+                elapsed = time.ticks_diff(time.ticks_ms(), start)
+                await asyncio.sleep_ms(max(0, self.interval_ms - elapsed))
+        finally:
+            self._task = None
@@ -0,0 +1,106 @@
+# --------- 模拟 LCD（电脑上运行） ----------
+# 与正点原子 atk_lcd 的 init() 接口相同。返回的显示对象把绘制结果写入内存中的
+# RGB565 帧缓冲，并统计调用次数、写入的像素和字节数，
+# 用于在电脑上测量预览的刷新次数和每秒推送到 SPI 的字节数；save_ppm() 可导出画面查看。
+
+import time
+
+WIDTH = 320
+HEIGHT = 240
+
+BLACK = 0x0000
+WHITE = 0xFFFF
+RED = 0xF800
+GREEN = 0x07E0
+BLUE = 0x001F
+
+
+class Display:
+    def __init__(self, width=WIDTH, height=HEIGHT):
+        self.width = width
+        self.height = height
+        self.fb = bytearray(width * height * 2)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = {}   # 方法名 -> 调用次数
+        self.pixels = 0   # 写入的像素数
+        self.bytes = 0    # 推送到 LCD 的数据字节数（RGB565，每像素 2 字节）
+        self.since = time.ticks_ms() if hasattr(time, "ticks_ms") else int(time.time() * 1000)
+
+    def _count(self, name, pixels):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.pixels += pixels
+        self.bytes += pixels * 2
+
+    def _rect(self, x0, y0, x1, y1, color):
+        # 坐标含端点，超出屏幕的部分裁掉
+        x0, x1 = max(0, min(x0, x1)), min(self.width - 1, max(x0, x1))
+        y0, y1 = max(0, min(y0, y1)), min(self.height - 1, max(y0, y1))
+        if x0 > x1 or y0 > y1:
+            return 0
+        row = bytes(((color >> 8) & 0xFF, color & 0xFF)) * (x1 - x0 + 1)
+        for y in range(y0, y1 + 1):
+            i = (y * self.width + x0) * 2
+            self.fb[i:i + len(row)] = row
+        return (x1 - x0 + 1) * (y1 - y0 + 1)
+
+    def clear(self, color=WHITE):
+        self._count("clear", self._rect(0, 0, self.width - 1, self.height - 1, color))
+
+    def fill(self, x0, y0, x1, y1, color):
+        self._count("fill", self._rect(x0, y0, x1, y1, color))
+
+    def pixel(self, x, y, color):
+        self._count("pixel", self._rect(x, y, x, y, color))
+
+    def colorfill(self, x0, y0, x1, y1, buf):
+        """按 RGB565 数据填充矩形"""
+        w = x1 - x0 + 1
+        for y in range(y0, y1 + 1):
+            src = (y - y0) * w * 2
+            i = (y * self.width + x0) * 2
+            self.fb[i:i + w * 2] = buf[src:src + w * 2]
+        self._count("colorfill", w * (y1 - y0 + 1))
+
+    def string(self, x, y, width, height, size, text, color):
+        # 不画字形，只按字符格大小计数（ASCII 字符宽为字号一半）
+        chars = sum(1 if ord(c) < 128 else 2 for c in text)
+        self._count("string", min(chars * size // 2, width) * min(size, height))
+
+    def line(self, x0, y0, x1, y1, color):
+        self._count("line", max(abs(x1 - x0), abs(y1 - y0)) + 1)
+
+    def rectangle(self, x0, y0, x1, y1, color):
+        self._count("rectangle", 2 * (abs(x1 - x0) + abs(y1 - y0)))
+
+    def stats(self):
+        now = time.ticks_ms() if hasattr(time, "ticks_ms") else int(time.time() * 1000)
+        seconds = max(1, now - self.since) / 1000
+        return {
+            "calls": dict(self.calls),
+            "updates": sum(self.calls.values()),
+            "pixels": self.pixels,
+            "bytes": self.bytes,
+            "bytes_per_second": int(self.bytes / seconds),
+            "seconds": seconds
+        }
+
+    def save_ppm(self, path):
+        """把帧缓冲保存为 PPM 图片"""
+        with open(path, "wb") as f:
+            f.write(b"P6 %d %d 255\n" % (self.width, self.height))
+            rgb = bytearray(self.width * self.height * 3)
+            for i in range(self.width * self.height):
+                c = (self.fb[2 * i] << 8) | self.fb[2 * i + 1]
+                rgb[3 * i] = (c >> 11) << 3
+                rgb[3 * i + 1] = ((c >> 5) & 0x3F) << 2
+                rgb[3 * i + 2] = (c & 0x1F) << 3
+            f.write(rgb)
+
+
+def init(spi=None, dc=None, cs=None, dir=1, lcd=0, **kwargs):
+    # dir=1 为横屏
+    if dir == 1:
+        return Display(WIDTH, HEIGHT)
+    return Display(HEIGHT, WIDTH)
@@ -0,0 +1,39 @@
+# --------- 模拟 XL9555 IO 扩展芯片（电脑上运行） ----------
+# 与正点原子 atk_xl9555 接口相同，write_bit / read_bit 只读写内存中的状态。
+
+AP_INT = 0
+QMA_INT = 1
+SPK_EN = 2
+BEEP = 3
+OV_PWDN = 4
+OV_RESET = 5
+GBC_LED = 6
+GBC_KEY = 7
+LCD_BL = 8
+CT_RST = 9
+SLCD_RST = 10
+SLCD_PWR = 11
+KEY3 = 12
+KEY2 = 13
+KEY1 = 14
+KEY0 = 15
+
+
+class XL9555:
+    def __init__(self, i2c=None):
+        self.i2c = i2c
+        # 按键为低电平有效，默认全部为高
+        self.bits = 0xF000
+
+    def write_bit(self, bit, value):
+        if value:
+            self.bits |= 1 << bit
+        else:
+            self.bits &= ~(1 << bit)
+
+    def read_bit(self, bit):
+        return (self.bits >> bit) & 1
+
+
+def init(i2c=None):
+    return XL9555(i2c)
@@ -0,0 +1,275 @@
+# --------- 压测 / 延迟基准（电脑上运行） ----------
+# 对运行中的设备程序（真机或 host/run_server.py）并发请求 /、/capture、/analyze，
+# 统计吞吐量、p50/p95/p99 延迟和状态码；每个场景前后读取 /metrics 得到设备堆内存高水位。
+# 结果写入 JSON，可与上一次的结果对比，用于检查优化前后的差异。
+#
+# 用法:
+#   python host/run_server.py --port=8080 --latency-ms=300 &
+#   python host/bench.py --url=http://127.0.0.1:8080 --concurrency=1,4,16 --out=bench.json
+#   python host/bench.py --compare=bench.json --out=bench_new.json
+# 只用 CPython 标准库。
+
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+# (名称, 路径, 每个并发级别的请求数)；路径中的 {i} 替换为请求序号
+SCENARIOS = [
+    ("index", "/", 400),
+    ("capture", "/capture", 200),
+    ("analyze", "/analyze?wait=1", 24),
+    # 每次提示词不同，不命中结果缓存，每个请求都会调用 API
+    ("analyze_fresh", "/analyze?wait=1&prompt=describe+{i}", 24),
+]
+
+
+class Connection:
+    """一个 keep-alive 连接，服务端要求关闭时自动重连"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.connects = 0
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, path, headers=""):
+        """
+        :return: (状态码, 响应体字节数)
+        """
+        for attempt in (0, 1):
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                self.connects += 1
+            try:
+                self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n{headers}\r\n".encode())
+                await self.writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                # 服务端可能正好关闭了空闲连接，在新连接上重试一次
+                await self.close()
+                if not reused or attempt:
+                    raise
+
+    async def _read_response(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed")
+        status = int(line.split()[1])
+        length = None
+        keep_alive = line.startswith(b"HTTP/1.1")
+        while True:
+            h = await self.reader.readline()
+            if not h:
+                raise ConnectionError("connection closed in headers")
+            if h == b"\r\n":
+                break
+            name, _, value = h.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            value = value.strip()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection":
+                keep_alive = value.lower() == "keep-alive" or (keep_alive and value.lower() != "close")
+        if length is None:
+            body = await self.reader.read()
+            keep_alive = False
+        else:
+            body = await self.reader.readexactly(length)
+        if not keep_alive:
+            await self.close()
+        return status, len(body)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def parse_metrics(text):
+    """读取 Prometheus 文本中的无标签数值"""
+    values = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#") or "{" in line:
+            continue
+        name, _, value = line.partition(" ")
+        try:
+            values[name] = float(value)
+        except ValueError:
+            pass
+    return values
+
+
+async def fetch_metrics(host, port, reset=False):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        path = "/metrics?reset=1" if reset else "/metrics"
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        data = await reader.read()
+        writer.close()
+        head, _, body = data.partition(b"\r\n\r\n")
+        if not head.startswith(b"HTTP/1.1 200"):
+            return {}
+        return parse_metrics(body.decode())
+    except OSError:
+        return {}
+
+
+async def run_scenario(host, port, path, concurrency, total, timeout):
+    """
+    concurrency 个连接并发，共发 total 个请求
+    :return: 结果 dict
+    """
+    latencies = []
+    statuses = {}
+    errors = []
+    sent = {"n": 0, "bytes": 0}
+    conns = [Connection(host, port) for _ in range(concurrency)]
+
+    async def worker(conn):
+        while sent["n"] < total:
+            sent["n"] += 1
+            target = path.replace("{i}", str(sent["n"]))
+            start = time.perf_counter()
+            try:
+                status, size = await asyncio.wait_for(conn.get(target), timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                errors.append(type(e).__name__)
+                await conn.close()
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+            sent["bytes"] += size
+
+    await fetch_metrics(host, port, reset=True)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(c) for c in conns))
+    elapsed = time.perf_counter() - start
+    metrics = await fetch_metrics(host, port)
+    for c in conns:
+        await c.close()
+
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    result = {
+        "path": path,
+        "concurrency": concurrency,
+        "requests": total,
+        "completed": len(latencies),
+        "errors": len(errors),
+        "error_types": sorted(set(errors)),
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "ok_rps": round(ok / elapsed, 2) if elapsed else None,
+        "bytes_per_response": sent["bytes"] // max(1, len(latencies)),
+        "connections": sum(c.connects for c in conns),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p50": _round(percentile(latencies, 50)),
+            "p95": _round(percentile(latencies, 95)),
+            "p99": _round(percentile(latencies, 99)),
+            "max": _round(latencies[-1] if latencies else None),
+        },
+        "heap_alloc_max": metrics.get("esp32_heap_alloc_max_bytes"),
+        "heap_free_min": metrics.get("esp32_heap_free_min_bytes"),
+        "gc_collections": metrics.get("esp32_gc_collections_total"),
+    }
+    return result
+
+
+def _round(v):
+    return None if v is None else round(v, 2)
+
+
+def print_result(r, old=None):
+    lat = r["latency_ms"]
+    line = (f"{r['name']:<14} c={r['concurrency']:<3} {r['completed']:>5}/{r['requests']:<5} "
+            f"{r['rps']:>8} req/s  p50 {lat['p50']:>8} p95 {lat['p95']:>8} p99 {lat['p99']:>8} ms  "
+            f"heap max {_kb(r['heap_alloc_max'])}  status {r['status']}")
+    if r["errors"]:
+        line += f"  errors {r['errors']} {r['error_types']}"
+    print(line)
+    if old:
+        print(f"{'':<20}vs old: req/s {_delta(r['rps'], old['rps'])}  p50 {_delta(lat['p50'], old['latency_ms']['p50'])}"
+              f"  p95 {_delta(lat['p95'], old['latency_ms']['p95'])}  p99 {_delta(lat['p99'], old['latency_ms']['p99'])}"
+              f"  heap max {_delta(r['heap_alloc_max'], old['heap_alloc_max'])}")
+
+
+def _kb(v):
+    return "-" if v is None else f"{v / 1024:.0f}KB"
+
+
+def _delta(new, old):
+    if new is None or not old:
+        return "-"
+    return f"{(new - old) * 100 / old:+.1f}%"
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    scenarios = [s for s in SCENARIOS if not args.only or s[0] in args.only.split(",")]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    old = {}
+    if args.compare:
+        with open(args.compare) as f:
+            for r in json.load(f)["results"]:
+                old[(r["name"], r["concurrency"])] = r
+
+    results = []
+    for name, path, count in scenarios:
+        total = args.requests or count
+        # 预热：建立连接、生成静态资源缓存、让自适应画质得到第一次测量
+        await run_scenario(host, port, path, 1, min(args.warmup, total), args.timeout)
+        for c in levels:
+            r = await run_scenario(host, port, path, c, max(total, c), args.timeout)
+            r["name"] = name
+            results.append(r)
+            print_result(r, old.get((name, c)))
+
+    report = {
+        "url": args.url,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "concurrency": levels,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load/latency benchmark for the device server")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="device base URL")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated client counts")
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default per scenario)")
+    parser.add_argument("--only", default="", help="comma separated scenario names: " + ",".join(s[0] for s in SCENARIOS))
+    parser.add_argument("--warmup", type=int, default=3, help="warmup requests per scenario")
+    parser.add_argument("--timeout", type=float, default=60, help="per request timeout in seconds")
+    parser.add_argument("--out", default="bench_results.json", help="JSON output file")
+    parser.add_argument("--compare", default="", help="previous JSON output to compare against")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
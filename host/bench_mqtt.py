@@ -0,0 +1,207 @@
+# --------- MQTT 推送基准（电脑上运行） ----------
+# 测量 mqtt_events.Publisher 的吞吐量（事件/秒）和发布延迟（publish() 调用到订阅者收到），
+# 分别在 QoS 0/1、有无批量的组合下，按最快速度（突发）和按固定速率发布；
+# 最后模拟设备断网：断网期间的事件进入离线队列，恢复后检查补发的条数、顺序和耗时。
+# 默认在同一进程中启动 host/mock_broker.py，也可指定 mosquitto 等 broker（不做断网测试）:
+#   python host/bench_mqtt.py --events=2000 --out=mqtt.json
+#   python host/bench_mqtt.py --broker=127.0.0.1:1883
+# 发布端与设备上运行的是同一份 mqtt_events.py。
+
+import argparse
+import json
+import struct
+import time
+
+import compat
+
+compat.install(False)
+
+import asyncio
+import mock_broker
+import mqtt_events as mq
+
+PREFIX = "bench"
+
+
+class Subscriber:
+    """订阅 bench/event，记录每条消息从 publish() 到收到的延迟"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.latencies = []
+        self.order = []
+        self._task = None
+
+    async def start(self):
+        reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(mq.connect_packet("sub-bench", 60))
+        topic = (PREFIX + "/event").encode()
+        self.writer.write(mq.packet(mq.SUBSCRIBE, struct.pack("!HH", 1, len(topic)) + topic + b"\x00", 2))
+        await self.writer.drain()
+        while (await mq.read_packet(reader))[0] != mq.SUBACK:
+            pass
+        self._task = asyncio.create_task(self._read(reader))
+
+    async def _read(self, reader):
+        while True:
+            kind, flags, body = await mq.read_packet(reader)
+            if kind != mq.PUBLISH:
+                continue
+            now = time.perf_counter()
+            data = json.loads(bytes(mq.parse_publish(flags, body)[1]))
+            self.latencies.append((now - data["t"]) * 1000)
+            self.order.append(data["i"])
+
+    def reset(self):
+        self.latencies = []
+        self.order = []
+
+    async def wait(self, n, timeout=30):
+        end = time.perf_counter() + timeout
+        while len(self.order) < n and time.perf_counter() < end:
+            await asyncio.sleep(0.002)
+
+    def stop(self):
+        self._task.cancel()
+        self.writer.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p / 100))], 2) if values else None
+
+
+async def connected(pub):
+    pub.start()
+    while not pub.connected:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)  # 上线状态消息已发出
+
+
+async def scenario(name, host, port, sub, events, qos, batch_ms, rate):
+    pub = mq.Publisher(host, port, client_id="pub-" + name, prefix=PREFIX, qos=qos,
+                       batch_ms=batch_ms, status_ms=0)
+    await connected(pub)
+    sub.reset()
+    call_us = 0
+    start = time.perf_counter()
+    for i in range(events):
+        if rate:
+            await asyncio.sleep(1 / rate)
+        else:
+            # 突发：队列接近上限时等待（设备上由事件产生速度决定，不会这样连续发布）
+            while len(pub.queue) >= pub.max_queue - 2:
+                await asyncio.sleep(0.0005)
+        t = time.perf_counter()
+        pub.publish("event", {"i": i, "t": t, "label": "bottle", "count": 1, "source": "cloud"})
+        call_us += (time.perf_counter() - t) * 1e6
+        if not rate and i % 16 == 15:
+            await asyncio.sleep(0)
+    await sub.wait(events)
+    elapsed = time.perf_counter() - start
+    pub.stop()
+    await asyncio.sleep(0.05)
+    got = len(sub.order)
+    return {
+        "name": name,
+        "qos": qos,
+        "batch_ms": batch_ms,
+        "rate": rate or "burst",
+        "events": events,
+        "received": got,
+        "events_per_s": round(got / elapsed, 1),
+        "latency_p50_ms": percentile(sub.latencies, 50),
+        "latency_p95_ms": percentile(sub.latencies, 95),
+        "latency_p99_ms": percentile(sub.latencies, 99),
+        "publish_call_us": round(call_us / events, 1),
+        "writes": pub.batches,
+        "events_per_write": round(pub.published / max(1, pub.batches), 1),
+        "bytes_per_event": round(pub.bytes / max(1, pub.published), 1),
+        "dropped": pub.dropped,
+        "in_order": sub.order == sorted(sub.order)
+    }
+
+
+async def outage(host, port, sub, events, rate, offline_s):
+    """断网 offline_s 秒，期间按 rate 发布 events 条事件"""
+    pub = mq.Publisher(host, port, client_id="pub-outage", prefix=PREFIX, qos=1, status_ms=0,
+                       reconnect_ms=500, max_reconnect_ms=2000)
+    await connected(pub)
+    sub.reset()
+    mock_broker.block("pub-outage")
+    down = time.perf_counter()
+    for i in range(events):
+        pub.publish("event", {"i": i, "t": time.perf_counter()})
+        await asyncio.sleep(1 / rate)
+    await asyncio.sleep(max(0, offline_s - (time.perf_counter() - down)))
+    queued = len(pub.queue)
+    mock_broker.unblock()
+    up = time.perf_counter()
+    await sub.wait(events - pub.dropped)
+    flushed = time.perf_counter()
+    pub.stop()
+    got = sorted(set(sub.order))
+    return {
+        "name": "outage",
+        "offline_s": round(up - down, 1),
+        "events": events,
+        "queued_at_reconnect": queued,
+        "dropped_oldest": pub.dropped,
+        "received": len(sub.order),
+        "duplicates": len(sub.order) - len(got),
+        "in_order": sub.order == sorted(sub.order),
+        "first_received": got[0] if got else None,
+        "reconnect_to_flushed_ms": round((flushed - up) * 1000),
+        "reconnect_failures": pub.failures
+    }
+
+
+async def main(args):
+    server = None
+    if args.broker:
+        host, _, port = args.broker.partition(":")
+        port = int(port or 1883)
+    else:
+        host, port = "127.0.0.1", args.port
+        server = await mock_broker.serve(port, host)
+    sub = Subscriber(host, port)
+    await sub.start()
+    results = []
+    for qos in (0, 1):
+        for batch_ms in (0, 20):
+            name = f"q{qos}_b{batch_ms}"
+            results.append(await scenario(name + "_burst", host, port, sub, args.events, qos, batch_ms, 0))
+            results.append(await scenario(name + "_paced", host, port, sub, args.paced, qos, batch_ms, args.rate))
+    if server is not None:
+        results.append(await outage(host, port, sub, 100, 20, args.offline_s))
+    sub.stop()
+    if server is not None:
+        mock_broker.block()
+        server.close()
+        await asyncio.sleep(0.1)
+
+    cols = ("name", "received", "events_per_s", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms",
+            "events_per_write", "bytes_per_event", "publish_call_us", "dropped")
+    print(" ".join(f"{c:>15s}" for c in cols))
+    for r in results:
+        if r["name"] != "outage":
+            print(" ".join(f"{str(r[c]):>15s}" for c in cols))
+    for r in results:
+        if r["name"] == "outage":
+            print("outage:", json.dumps(r))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MQTT publisher benchmark")
+    parser.add_argument("--broker", default="", help="host:port of an external broker (default: in-process mock)")
+    parser.add_argument("--port", type=int, default=18830, help="port for the in-process mock broker")
+    parser.add_argument("--events", type=int, default=2000, help="events per burst scenario")
+    parser.add_argument("--paced", type=int, default=200, help="events per paced scenario")
+    parser.add_argument("--rate", type=float, default=50, help="events/s in paced scenarios")
+    parser.add_argument("--offline-s", type=float, default=5, help="simulated outage length")
+    parser.add_argument("--out", default="", help="write results as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,140 @@
+# --------- HTTPS 连接复用基准（电脑上运行） ----------
+# 在本机启动一个最小的 TLS 服务（模仿视觉 API：读完请求体后返回一段 JSON），
+# 用 async_http 分别以每次新建连接和 ConnectionPool 复用连接各发 --requests 个请求，
+# 比较单次请求的延迟（p50 / p95 / 平均）和建立的连接数。设备上一次 TLS 握手要数百毫秒，差距比本机更大。
+# 服务端每条连接处理 --close-every 个请求后关闭：默认带 Connection: close，
+# --silent-close=1 时不通知直接断开，检查连接池能在断开的连接上重新建立连接并重发。
+# 证书用 openssl 命令行临时生成；没有 openssl 时用 --tls=0 以明文 HTTP 运行。
+#
+# 用法:
+#   python host/bench_pool.py --requests=200 --out=pool.json
+#   python host/bench_pool.py --close-every=5 --silent-close=1
+
+import os
+import json
+import ssl
+import subprocess
+import tempfile
+import time
+
+import testing
+import mock_api
+import uasyncio as asyncio
+import async_http
+
+OPTIONS = {"requests": 100, "close_every": 0, "silent_close": False, "tls": True, "out": ""}
+REPLY = json.dumps({"choices": [{"message": {"content": "ok"}}]}).encode()
+
+
+def make_cert(directory):
+    """生成自签名证书，返回 (证书, 私钥) 路径"""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-keyout", key, "-out", cert],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+class Stub:
+    """模拟 API 服务端，统计连接数和请求数"""
+
+    def __init__(self, close_every=0, silent_close=False):
+        self.close_every = close_every
+        self.silent_close = silent_close
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        served = 0
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+                served += 1
+                self.requests += 1
+                close = self.close_every and served >= self.close_every
+                extra = b"Connection: close\r\n" if close and not self.silent_close else b""
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n"
+                             % (len(REPLY), extra) + REPLY)
+                await writer.drain()
+                if close:
+                    break
+        finally:
+            writer.close()
+
+
+async def timed_requests(url, count, pool):
+    """
+    依次发 count 个请求
+    :return: 每个请求的耗时（毫秒，已排序）
+    """
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        resp = await async_http.request("POST", url, {"Content-Type": "application/json"}, b'{"n": %d}' % i, pool)
+        body = await resp.read()
+        await resp.aclose()
+        latencies.append((time.perf_counter() - start) * 1000)
+        if resp.status != 200 or body != REPLY:
+            raise RuntimeError(f"unexpected response {resp.status} {body[:80]}")
+    return sorted(latencies)
+
+
+def summary(name, latencies, stub, pool=None):
+    data = {
+        "name": name,
+        "requests": len(latencies),
+        "connections": stub.connections,
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, len(latencies) * 95 // 100)], 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+    }
+    if pool is not None:
+        data.update(pool.stats())
+    return data
+
+
+async def main(opts, cert=None):
+    ctx = None
+    if cert is not None:
+        ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ctx.load_cert_chain(*cert)
+    port = testing.free_port()
+    url = f"{'https' if ctx else 'http'}://127.0.0.1:{port}/v1/chat/completions"
+    results = []
+    for name in ("fresh", "pooled"):
+        stub = Stub(opts["close_every"], opts["silent_close"])
+        server = await asyncio.start_server(stub.handle, "127.0.0.1", port, ssl=ctx)
+        pool = async_http.ConnectionPool() if name == "pooled" else None
+        try:
+            latencies = await timed_requests(url, opts["requests"], pool)
+        finally:
+            if pool is not None:
+                await pool.close_all()
+            server.close()
+            await server.wait_closed()
+        results.append(summary(name, latencies, stub, pool))
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    opts = mock_api.parse_args(sys.argv[1:], OPTIONS)
+    with tempfile.TemporaryDirectory() as directory:
+        results = asyncio.run(main(opts, make_cert(directory) if opts["tls"] else None))
+    cols = ("name", "requests", "connections", "p50_ms", "p95_ms", "mean_ms", "opened", "reused")
+    print(" ".join(f"{c:>12s}" for c in cols))
+    for r in results:
+        print(" ".join(f"{str(r.get(c, '')):>12s}" for c in cols))
+    if opts["out"]:
+        with open(opts["out"], "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {opts['out']}")
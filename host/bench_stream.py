@@ -0,0 +1,111 @@
+# --------- /stream 多观看者基准（电脑上运行） ----------
+# 对运行中的设备程序（真机或 host/run_server.py）同时打开 N 个 /stream（MJPEG）连接，
+# 统计每个观看者收到的帧率（最低 / 平均 / 最高）和设备每秒采集的帧数（/metrics 的 esp32_frames_captured_total）。
+# 所有观看者共用同一次采集时，采集帧率与观看者数量无关，约等于 CAPTURE_FPS；
+# --slow 个观看者每收到一帧后等待 --slow-ms，检查慢客户端只会丢帧，不会拖慢其他观看者和采集。
+#
+# 用法:
+#   python host/run_server.py --port=8080 --capture-ms=30 &
+#   python host/bench_stream.py --url=http://127.0.0.1:8080 --viewers=1,4,16 --slow=1 --out=stream.json
+# 只用 CPython 标准库。
+
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+
+async def fetch_captures(host, port):
+    """设备累计采集的帧数（/metrics 的 esp32_frames_captured_total）"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /metrics HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    for line in data.partition(b"\r\n\r\n")[2].decode().splitlines():
+        if line.startswith("esp32_frames_captured_total "):
+            return float(line.split()[1])
+    return None
+
+
+async def viewer(host, port, stop, slow_ms=0):
+    """
+    一个 /stream 观看者，stop 置位后断开
+    :return: (帧数, 字节数, 秒数)
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /stream HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    count = size = 0
+    start = time.perf_counter()
+    try:
+        while not stop.is_set():
+            head = (await reader.readuntil(b"\r\n\r\n")).decode()
+            length = int(head.lower().split("content-length:")[1].split("\r\n")[0])
+            await reader.readexactly(length + 2)
+            count += 1
+            size += length
+            if slow_ms:
+                await asyncio.sleep(slow_ms / 1000)
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        print(f"viewer disconnected: {type(e).__name__}")
+    finally:
+        writer.close()
+    return count, size, time.perf_counter() - start
+
+
+async def run_level(host, port, n, slow, slow_ms, seconds):
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(viewer(host, port, stop, slow_ms if i < slow else 0)) for i in range(n)]
+    # 等所有连接收到第一帧后开始计数
+    await asyncio.sleep(1)
+    before = await fetch_captures(host, port)
+    start = time.perf_counter()
+    await asyncio.sleep(seconds)
+    after = await fetch_captures(host, port)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    results = await asyncio.gather(*tasks)
+    normal = [c / t for c, _, t in results[slow:]]
+    slowest = [c / t for c, _, t in results[:slow]]
+    return {
+        "viewers": n,
+        "slow_viewers": slow,
+        "captures_per_s": round((after - before) / elapsed, 2) if before is not None and after is not None else None,
+        "fps_min": round(min(normal), 2) if normal else None,
+        "fps_mean": round(sum(normal) / len(normal), 2) if normal else None,
+        "fps_max": round(max(normal), 2) if normal else None,
+        "slow_fps": round(sum(slowest) / len(slowest), 2) if slowest else None,
+        "kbytes_per_s": round(sum(s for _, s, _ in results) / elapsed / 1024, 1),
+    }
+
+
+async def main(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    results = []
+    cols = ("viewers", "slow_viewers", "captures_per_s", "fps_min", "fps_mean", "fps_max", "slow_fps", "kbytes_per_s")
+    print(" ".join(f"{c:>14s}" for c in cols))
+    for n in (int(v) for v in args.viewers.split(",")):
+        r = await run_level(host, port, n, min(args.slow, n - 1), args.slow_ms, args.seconds)
+        results.append(r)
+        print(" ".join(f"{str(r[c]):>14s}" for c in cols))
+        # 连接断开后采集停止，下一级从空闲状态开始
+        await asyncio.sleep(1)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"url": args.url, "time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MJPEG /stream benchmark with several viewers")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="device base URL")
+    parser.add_argument("--viewers", default="1,4,16", help="comma separated viewer counts")
+    parser.add_argument("--slow", type=int, default=1, help="slow viewers per level (never all of them)")
+    parser.add_argument("--slow-ms", type=int, default=300, help="pause after each frame for slow viewers")
+    parser.add_argument("--seconds", type=float, default=5, help="measurement time per level")
+    parser.add_argument("--out", default="", help="write results as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,339 @@
+# --------- WebSocket 与 HTTP 轮询对比（电脑上运行） ----------
+# 对运行中的设备程序（真机或 host/run_server.py）比较主页的两种工作方式：
+#   图像刷新   每次新建连接 GET /capture、keep-alive 连接上 GET /capture、/ws 上发送 capture 命令
+#   实时视频   /stream（MJPEG）与 /ws 的 stream 命令（每帧回 ack）
+#   分析       /analyze/stream（SSE）与 /ws 的 analyze 命令，首段结果和完成的耗时
+#   识别结果   另一个客户端触发分析后，按间隔轮询 /history 与 /ws 推送的 detection 消息各晚多久看到
+# 统计打开的 TCP 连接数、每次更新的延迟（p50/p95）和帧率。
+#
+# 用法:
+#   python host/run_server.py --port=8080 --latency-ms=300 &
+#   python host/bench_ws.py --url=http://127.0.0.1:8080 --updates=200 --out=ws.json
+# 只用 CPython 标准库。
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+from urllib.parse import quote, urlsplit
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class WsClient:
+    """最小的 WebSocket 客户端（发送的帧带掩码，自动回复 ping）"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.frames = 0
+
+    async def connect(self, path="/ws"):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.writer.write((
+            f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nUpgrade: websocket\r\n"
+            f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        await self.writer.drain()
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode()
+        expected = base64.b64encode(hashlib.sha1(key.encode() + GUID).digest()).decode()
+        if not head.startswith("HTTP/1.1 101") or expected not in head:
+            raise ConnectionError("handshake failed: " + head.split("\r\n")[0])
+
+    async def _send(self, opcode, data):
+        mask = os.urandom(4)
+        n = len(data)
+        if n < 126:
+            head = struct.pack("!BB", 0x80 | opcode, 0x80 | n)
+        else:
+            head = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, n)
+        self.writer.write(head + mask + bytes(b ^ mask[i & 3] for i, b in enumerate(data)))
+        await self.writer.drain()
+
+    async def send(self, msg):
+        await self._send(0x1, json.dumps(msg).encode())
+
+    async def receive(self):
+        """:return: dict（text 消息）或 (帧序号, JPEG 字节数)（binary 消息），连接关闭时返回 None"""
+        while True:
+            b0, b1 = await self.reader.readexactly(2)
+            n = b1 & 0x7F
+            if n == 126:
+                n = struct.unpack("!H", await self.reader.readexactly(2))[0]
+            elif n == 127:
+                n = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+            data = await self.reader.readexactly(n)
+            opcode = b0 & 0x0F
+            if opcode == 0x9:
+                await self._send(0xA, data)
+            elif opcode == 0x8:
+                return None
+            elif opcode == 0x1:
+                return json.loads(data)
+            elif opcode == 0x2:
+                self.frames += 1
+                return struct.unpack_from("!I", data)[0], len(data) - 4
+
+    async def receive_type(self, *types):
+        """跳过其他消息（状态、其他客户端的分析结果），直到收到指定类型的消息或帧（"frame"）"""
+        while True:
+            msg = await self.receive()
+            if msg is None:
+                raise ConnectionError("websocket closed")
+            if isinstance(msg, tuple):
+                if "frame" in types:
+                    return msg
+            elif msg.get("type") in types:
+                return msg
+
+    async def close(self):
+        try:
+            await self._send(0x8, struct.pack("!H", 1000))
+        except ConnectionError:
+            pass
+        self.writer.close()
+
+
+async def http_get(host, port, path, conn=None):
+    """
+    :param conn: (reader, writer) 复用的 keep-alive 连接，None 时新建并在响应后关闭
+    :return: (状态码, 响应体)
+    """
+    reader, writer = conn or await asyncio.open_connection(host, port)
+    close = "" if conn else "Connection: close\r\n"
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n{close}\r\n".encode())
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode()
+    length = 0
+    for line in head.split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    body = await reader.readexactly(length)
+    if conn is None:
+        writer.close()
+    return int(head.split(" ")[1]), body
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p / 100))], 1) if values else None
+
+
+def summary(name, latencies, connections, extra=None):
+    data = {
+        "name": name,
+        "updates": len(latencies),
+        "connections": connections,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else None
+    }
+    data.update(extra or {})
+    return data
+
+
+async def poll_capture(host, port, n, keep_alive):
+    """页面刷新图像：每次新建连接，或在 keep-alive 连接上依次请求（服务端关闭时重连）"""
+    latencies = []
+    conn = None
+    connections = 0
+    for _ in range(n):
+        t = time.perf_counter()
+        if keep_alive and conn is None:
+            conn = await asyncio.open_connection(host, port)
+            connections += 1
+        elif not keep_alive:
+            connections += 1
+        try:
+            await http_get(host, port, "/capture?ts=%d" % (t * 1000), conn)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            conn = None
+            continue
+        latencies.append((time.perf_counter() - t) * 1000)
+    if conn is not None:
+        conn[1].close()
+    return summary("capture_keepalive" if keep_alive else "capture_new_conn", latencies, connections)
+
+
+async def ws_capture(host, port, n):
+    ws = WsClient(host, port)
+    await ws.connect()
+    latencies = []
+    for _ in range(n):
+        t = time.perf_counter()
+        await ws.send({"type": "capture"})
+        await ws.receive_type("frame")
+        latencies.append((time.perf_counter() - t) * 1000)
+        await ws.send({"type": "ack"})
+    await ws.close()
+    return summary("capture_ws", latencies, 1)
+
+
+async def mjpeg_stream(host, port, seconds):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /stream HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    gaps = []
+    count = 0
+    start = last = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        head = (await reader.readuntil(b"\r\n\r\n")).decode()
+        length = int(head.lower().split("content-length:")[1].split("\r\n")[0])
+        await reader.readexactly(length + 2)
+        now = time.perf_counter()
+        if count:
+            gaps.append((now - last) * 1000)
+        last = now
+        count += 1
+    writer.close()
+    return summary("stream_mjpeg", gaps, 1, {"fps": round(count / (last - start), 1)})
+
+
+async def ws_stream(host, port, seconds):
+    ws = WsClient(host, port)
+    await ws.connect()
+    await ws.send({"type": "stream", "on": True})
+    gaps = []
+    count = 0
+    start = last = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        await ws.receive_type("frame")
+        await ws.send({"type": "ack"})
+        now = time.perf_counter()
+        if count:
+            gaps.append((now - last) * 1000)
+        last = now
+        count += 1
+    await ws.send({"type": "stream", "on": False})
+    await ws.close()
+    return summary("stream_ws", gaps, 1, {"fps": round(count / (last - start), 1)})
+
+
+async def sse_analyze(host, port, n):
+    first, done = [], []
+    for i in range(n):
+        t = time.perf_counter()
+        reader, writer = await asyncio.open_connection(host, port)
+        path = "/analyze/stream?prompt=" + quote(f"bench ws {i} {t}")
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        await reader.readuntil(b"\r\n\r\n")
+        got_first = False
+        while True:
+            event = (await reader.readuntil(b"\n\n")).decode()
+            if not got_first:
+                first.append((time.perf_counter() - t) * 1000)
+                got_first = True
+            if event.startswith("event: done"):
+                break
+        done.append((time.perf_counter() - t) * 1000)
+        writer.close()
+    return summary("analyze_sse", done, n, {"first_delta_p50_ms": percentile(first, 50)})
+
+
+async def ws_analyze(host, port, n):
+    ws = WsClient(host, port)
+    await ws.connect()
+    first, done = [], []
+    for i in range(n):
+        t = time.perf_counter()
+        await ws.send({"type": "analyze", "id": i, "prompt": f"bench ws {i} {t}"})
+        msg = await ws.receive_type("delta", "done", "busy", "error")
+        first.append((time.perf_counter() - t) * 1000)
+        while msg.get("type") == "delta":
+            msg = await ws.receive_type("delta", "done", "busy", "error")
+        done.append((time.perf_counter() - t) * 1000)
+    await ws.close()
+    return summary("analyze_ws", done, 1, {"first_delta_p50_ms": percentile(first, 50)})
+
+
+async def detection_updates(host, port, n, poll_ms):
+    """
+    触发 n 次分析（/analyze?wait=1），以响应返回的时刻为结果产生的时间，
+    同时有一个客户端每 poll_ms 轮询 /history?limit=1、一个客户端在 /ws 上等待 detection 消息
+    """
+    produced = {}  # 帧序号 -> 分析完成的时刻
+    seen = {"poll": {}, "ws": {}}
+    polls = [0, 0]  # 请求数、连接数
+    ws = WsClient(host, port)
+    await ws.connect()
+
+    async def listen():
+        while True:
+            msg = await ws.receive_type("detection")
+            seen["ws"].setdefault(msg["frame_seq"], time.perf_counter())
+
+    async def poll():
+        conn = None
+        while True:
+            if conn is None:
+                conn = await asyncio.open_connection(host, port)
+                polls[1] += 1
+            try:
+                _, body = await http_get(host, port, "/history?limit=1", conn)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn = None
+                continue
+            polls[0] += 1
+            for record in json.loads(body)["records"]:
+                seen["poll"].setdefault(record["frame_seq"], time.perf_counter())
+            await asyncio.sleep(poll_ms / 1000)
+
+    tasks = [asyncio.create_task(listen()), asyncio.create_task(poll())]
+    for i in range(n):
+        _, body = await http_get(host, port, "/analyze?wait=1&format=json&frame=next&prompt=" + quote(f"bench push {i} {time.time()}"))
+        produced[json.loads(body)["frame_seq"]] = time.perf_counter()
+        await asyncio.sleep(0.3 + (i % 7) * 0.1)
+    await asyncio.sleep(poll_ms / 1000 + 0.5)
+    for t in tasks:
+        t.cancel()
+    await ws.close()
+    results = []
+    for name, connections in (("detection_poll_%dms" % poll_ms, polls[1]), ("detection_ws", 1)):
+        kind = "ws" if name == "detection_ws" else "poll"
+        delays = [(seen[kind][seq] - t) * 1000 for seq, t in produced.items() if seq in seen[kind]]
+        extra = {"requests": polls[0]} if kind == "poll" else {}
+        results.append(summary(name, delays, connections, extra))
+    return results
+
+
+async def main(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    results = [
+        await poll_capture(host, port, args.updates, False),
+        await poll_capture(host, port, args.updates, True),
+        await ws_capture(host, port, args.updates),
+        await mjpeg_stream(host, port, args.seconds),
+        await ws_stream(host, port, args.seconds),
+    ]
+    if args.analyses:
+        results.append(await sse_analyze(host, port, args.analyses))
+        results.append(await ws_analyze(host, port, args.analyses))
+        results += await detection_updates(host, port, args.analyses * 4, args.poll_ms)
+
+    cols = ("name", "updates", "connections", "p50_ms", "p95_ms", "mean_ms", "fps", "first_delta_p50_ms")
+    print(" ".join(f"{c:>18s}" for c in cols))
+    for r in results:
+        print(" ".join(f"{str(r.get(c, '')):>18s}" for c in cols))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WebSocket vs HTTP polling benchmark")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="device base URL")
+    parser.add_argument("--updates", type=int, default=200, help="image refreshes per capture scenario")
+    parser.add_argument("--seconds", type=float, default=5, help="length of each stream scenario")
+    parser.add_argument("--analyses", type=int, default=5, help="analyses per transport (0 to skip)")
+    parser.add_argument("--poll-ms", type=int, default=1000, help="polling interval for /history")
+    parser.add_argument("--out", default="", help="write results as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,220 @@
+# --------- 模拟摄像头（电脑上运行） ----------
+# 与固件 camera 模块接口相同：init / deinit / capture / framesize / quality 以及 FRAME_* 常量。
+# capture() 返回真正可解码的基线 JPEG（灰度，只含 DC 系数，即 8x8 块的马赛克画面），
+# 画面为渐变背景上移动的方块，帧与帧之间有变化；
+# 文件用 COM 段补齐到与 OV2640 相近的大小，使上传、base64 编码等耗时接近真实情况。
+# 纯 Python 实现，CPython 和 unix 版 MicroPython 都能用。
+
+import time
+
+JPEG = 4
+GRAYSCALE = 2
+RGB565 = 1
+PSRAM = 1
+DRAM = 0
+
+FRAME_96X96 = 0
+FRAME_QQVGA = 1
+FRAME_QCIF = 2
+FRAME_HQVGA = 3
+FRAME_240X240 = 4
+FRAME_QVGA = 5
+FRAME_CIF = 6
+FRAME_HVGA = 7
+FRAME_VGA = 8
+FRAME_SVGA = 9
+FRAME_XGA = 10
+FRAME_HD = 11
+FRAME_SXGA = 12
+FRAME_UXGA = 13
+
+_DIMS = {
+    FRAME_96X96: (96, 96),
+    FRAME_QQVGA: (160, 120),
+    FRAME_QCIF: (176, 144),
+    FRAME_HQVGA: (240, 176),
+    FRAME_240X240: (240, 240),
+    FRAME_QVGA: (320, 240),
+    FRAME_CIF: (400, 296),
+    FRAME_HVGA: (480, 320),
+    FRAME_VGA: (640, 480),
+    FRAME_SVGA: (800, 600),
+    FRAME_XGA: (1024, 768),
+    FRAME_HD: (1280, 720),
+    FRAME_SXGA: (1280, 1024),
+    FRAME_UXGA: (1600, 1200),
+}
+
+# 可在测试中修改的行为
+CAPTURE_MS = 0       # 每次采集阻塞的毫秒数（OV2640 QVGA 约 30~60ms）
+FAIL_EVERY = 0       # 每 N 次采集返回一次 None，0 表示从不失败
+MOTION_PX = 4        # 每帧方块移动的像素数，0 为静止画面
+SIZE_SCALE = 1.0     # 输出大小相对 OV2640 估算值的倍数
+INIT_FAILS = 0       # 上电后前 N 次 init() 失败（模拟传感器尚未就绪）
+
+_state = {"init": False, "framesize": FRAME_QQVGA, "quality": 12, "frame": 0, "init_calls": 0}
+
+
+def init(id=0, format=JPEG, fb_location=PSRAM, framesize=FRAME_QQVGA, quality=12, **kwargs):
+    _state["init_calls"] += 1
+    if _state["init_calls"] <= INIT_FAILS:
+        raise OSError("Sensor not detected")
+    _state["init"] = True
+    _state["framesize"] = framesize
+    _state["quality"] = quality
+    return True
+
+
+def deinit():
+    _state["init"] = False
+
+
+def framesize(size):
+    _state["framesize"] = size
+
+
+def quality(q):
+    _state["quality"] = q
+
+
+def capture():
+    """
+    采集一帧
+    :return: JPEG 数据（bytes），未初始化或模拟失败时返回 None
+    """
+    if not _state["init"]:
+        return None
+    _state["frame"] += 1
+    if FAIL_EVERY and _state["frame"] % FAIL_EVERY == 0:
+        return None
+    if CAPTURE_MS:
+        time.sleep_ms(CAPTURE_MS) if hasattr(time, "sleep_ms") else time.sleep(CAPTURE_MS / 1000)
+    w, h = _DIMS[_state["framesize"]]
+    q = _state["quality"]
+    target = int(w * h * 5 // (3 * (q + 4)) * SIZE_SCALE)
+    return encode(w, h, q, scene(w, h, _state["frame"]), target)
+
+
+def scene(width, height, frame):
+    """
+    画面：每个 8x8 块的平均亮度
+    :return: 按行排列的亮度列表（0~255），共 ceil(w/8) * ceil(h/8) 个
+    """
+    bw = (width + 7) // 8
+    bh = (height + 7) // 8
+    side = max(2, bh // 3)
+    span = max(1, bw - side)
+    step = frame * MOTION_PX // 8
+    x0 = step % (2 * span)
+    if x0 >= span:
+        x0 = 2 * span - x0  # 左右往返
+    y0 = (bh - side) // 2
+    out = []
+    for by in range(bh):
+        inside_y = y0 <= by < y0 + side
+        for bx in range(bw):
+            if inside_y and x0 <= bx < x0 + side:
+                out.append(235)
+            else:
+                out.append(40 + 120 * bx // bw + 60 * by // bh)
+    return out
+
+
+# --------- 基线 JPEG 编码（单分量、只有 DC 系数） ----------
+# DC 使用 JPEG 标准附录 K 的亮度 DC 哈夫曼表；AC 表只需要 EOB 一个码字
+_DC_BITS = (0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0)
+_DC_VALUES = bytes(range(12))
+_AC_BITS = (1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+_AC_VALUES = bytes((0x00, 0xF0))  # EOB, ZRL
+
+
+def _huffman_codes(bits, values):
+    """按 JPEG 规范生成规范哈夫曼码 {符号: (码字, 长度)}"""
+    codes = {}
+    code = 0
+    k = 0
+    for length in range(1, 17):
+        for _ in range(bits[length - 1]):
+            codes[values[k]] = (code, length)
+            code += 1
+            k += 1
+        code <<= 1
+    return codes
+
+
+_DC_CODES = _huffman_codes(_DC_BITS, _DC_VALUES)
+_EOB = _huffman_codes(_AC_BITS, _AC_VALUES)[0x00]
+
+
+class _BitWriter:
+    def __init__(self):
+        self.out = bytearray()
+        self.acc = 0
+        self.n = 0
+
+    def put(self, code, length):
+        self.acc = (self.acc << length) | code
+        self.n += length
+        while self.n >= 8:
+            self.n -= 8
+            b = (self.acc >> self.n) & 0xFF
+            self.out.append(b)
+            if b == 0xFF:
+                self.out.append(0)  # 字节填充
+        self.acc &= (1 << self.n) - 1
+
+    def flush(self):
+        if self.n:
+            pad = 8 - self.n
+            self.put((1 << pad) - 1, pad)
+        return self.out
+
+
+def _segment(marker, payload):
+    n = len(payload) + 2
+    return bytes((0xFF, marker, n >> 8, n & 0xFF)) + payload
+
+
+def _qstep(q):
+    """OV2640 的 quality（越小越好）对应的量化步长"""
+    return max(1, min(255, 2 + q))
+
+
+def encode(width, height, q, blocks, target_size=0):
+    """
+    把块亮度编码为 JPEG
+    :param blocks: scene() 的输出
+    :param target_size: 不足此大小时用 COM 段补齐
+    :return: bytes
+    """
+    step = _qstep(q)
+    bits = _BitWriter()
+    pred = 0
+    for mean in blocks:
+        # DCT 后 DC 系数 = 8 * (均值 - 128)
+        dc = (8 * (mean - 128) + (step // 2 if mean >= 128 else -(step // 2))) // step
+        diff = dc - pred
+        pred = dc
+        mag = diff if diff >= 0 else -diff
+        size = 0
+        while mag >> size:
+            size += 1
+        code, length = _DC_CODES[size]
+        bits.put(code, length)
+        if size:
+            bits.put(diff if diff >= 0 else diff + (1 << size) - 1, size)
+        bits.put(_EOB[0], _EOB[1])
+    scan = bits.flush()
+
+    head = bytearray(b"\xff\xd8")
+    head += _segment(0xDB, b"\x00" + bytes((step,)) * 64)
+    head += _segment(0xC0, bytes((8, height >> 8, height & 0xFF, width >> 8, width & 0xFF, 1, 1, 0x11, 0)))
+    head += _segment(0xC4, b"\x00" + bytes(_DC_BITS) + _DC_VALUES + b"\x10" + bytes(_AC_BITS) + _AC_VALUES)
+    sos = _segment(0xDA, b"\x01\x01\x00\x00\x3f\x00")
+
+    pad = target_size - (len(head) + len(sos) + len(scan) + 2)
+    while pad > 4:
+        n = min(pad - 4, 65533)
+        head += _segment(0xFE, b"\x00" * n)
+        pad -= n + 4
+    return bytes(head + sos + scan + b"\xff\xd9")
@@ -0,0 +1,114 @@
+# --------- CPython 兼容层 ----------
+# 让设备代码在电脑上的 CPython 中运行：补上 MicroPython 特有的
+# time.ticks_* / sleep_ms、gc.mem_free / mem_alloc、sys.print_exception，
+# 并注册 uasyncio、ubinascii 两个模块。
+# 在 unix 版 MicroPython 中这些本来就有，install() 什么也不做。
+
+import sys
+import time
+import gc
+
+# 模拟的堆大小（ESP32-S3 + 8MB PSRAM 上 MicroPython 的可用堆约 8MB）
+HEAP_BYTES = 8 * 1024 * 1024
+
+
+def is_micropython():
+    return sys.implementation.name == "micropython"
+
+
+def _ticks_ms():
+    return int(time.monotonic() * 1000)
+
+
+def _ticks_us():
+    return int(time.monotonic() * 1000000)
+
+
+def _ticks_diff(a, b):
+    return a - b
+
+
+def _ticks_add(a, b):
+    return a + b
+
+
+def _sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+
+def _mem_alloc():
+    # 开启 tracemalloc 时返回 Python 对象实际占用，否则为 0
+    import tracemalloc
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return 0
+
+
+def _mem_free():
+    return max(0, HEAP_BYTES - _mem_alloc())
+
+
+def _print_exception(e, file=None):
+    import traceback
+    traceback.print_exception(type(e), e, e.__traceback__, file=file)
+
+
+def _uasyncio():
+    """在 asyncio 的基础上补上 uasyncio 的 sleep_ms、StreamWriter.awrite，并让 wait_closed 关闭连接"""
+    import asyncio
+
+    async def sleep_ms(ms):
+        await asyncio.sleep(ms / 1000)
+
+    copy_views = sys.version_info >= (3, 12)
+
+    async def awrite(self, buf, off=0, sz=-1):
+        if off or sz >= 0:
+            buf = memoryview(buf)[off:off + sz if sz >= 0 else None]
+        if copy_views and isinstance(buf, (memoryview, bytearray)):
+            # uasyncio 在 awrite 返回前已发送或复制了数据，调用方随即复用缓冲（如 http_server 的响应头缓冲）；
+            # asyncio 3.12 起未发完的数据只保存引用，这里先复制
+            buf = bytes(buf)
+        self.write(buf)
+        await self.drain()
+
+    wait_closed = asyncio.StreamWriter.wait_closed
+
+    async def close_and_wait(self):
+        # uasyncio 中 wait_closed() 即关闭连接；asyncio 需要先 close()
+        self.close()
+        try:
+            await wait_closed(self)
+        except (ConnectionError, OSError):
+            pass
+
+    asyncio.sleep_ms = sleep_ms
+    asyncio.StreamWriter.awrite = awrite
+    asyncio.StreamWriter.wait_closed = close_and_wait
+    return asyncio
+
+
+def install(trace_memory=True):
+    """
+    安装兼容层，须在导入设备代码之前调用
+    :param trace_memory: 用 tracemalloc 统计内存，使 /metrics 的堆内存高水位有意义（约慢 2 倍）
+    """
+    if is_micropython():
+        return
+    time.ticks_ms = _ticks_ms
+    time.ticks_us = _ticks_us
+    time.ticks_diff = _ticks_diff
+    time.ticks_add = _ticks_add
+    time.sleep_ms = _sleep_ms
+    gc.mem_free = _mem_free
+    gc.mem_alloc = _mem_alloc
+    sys.print_exception = _print_exception
+    if "uasyncio" not in sys.modules:
+        sys.modules["uasyncio"] = _uasyncio()
+    if "ubinascii" not in sys.modules:
+        import binascii
+        sys.modules["ubinascii"] = binascii
+    if trace_memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
@@ -0,0 +1,147 @@
+# --------- 本地分类器的训练与评估（电脑上运行） ----------
+# 读取按类别分目录存放的 JPEG（数据目录/类别/*.jpg），用 k 折交叉验证评估 local_classifier：
+# 准确率、本地回答的比例（即省下的云端调用）、本地回答的准确率、每张图的解码和分类耗时，
+# 以及不同置信度阈值下的取舍；最后用全部图片训练并导出模型（设备上放在 classifier.json）。
+#
+# 用法（在仓库根目录）:
+#   python host/eval_classifier.py --data=samples --out=classifier.json
+#   python host/eval_classifier.py --data=samples --threshold=0.5 --prototypes=3 --texts=texts.json
+#   python host/eval_classifier.py --data=test_samples --model=classifier.json   # 评估已有模型
+# 也可用 unix 版 MicroPython 运行，耗时更接近设备（设备上的 CPU 还要再慢数倍）。
+
+import sys
+import os
+import json
+
+sys.path.insert(0, ".")
+sys.path.insert(0, "host")
+
+import compat
+from mock_api import parse_args
+
+OPTIONS = {
+    "data": "samples",      # 数据目录，每个子目录是一个类别
+    "model": "",            # 评估已有模型（不训练、不交叉验证）
+    "out": "",              # 用全部图片训练后导出的模型文件
+    "texts": "",            # {类别: 本地回答的描述} JSON 文件，写入导出的模型
+    "threshold": 0.3,       # 本地回答的置信度阈值
+    "prototypes": 3,        # 每个类别的原型数
+    "folds": 4,             # 交叉验证折数
+}
+
+THRESHOLDS = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7)
+
+
+def load_samples(root):
+    """
+    :return: [(类别, 文件名, DC 解码结果, 解码毫秒)]
+    """
+    import time
+    import jpeg_features
+    samples = []
+    for label in sorted(os.listdir(root)):
+        folder = root + "/" + label
+        try:
+            names = sorted(os.listdir(folder))
+        except OSError:
+            continue  # 不是目录
+        for name in names:
+            lower = name.lower()
+            if not (lower.endswith(".jpg") or lower.endswith(".jpeg")):
+                continue
+            with open(folder + "/" + name, "rb") as f:
+                data = f.read()
+            start = time.ticks_us()
+            try:
+                dc = jpeg_features.decode_dc(data)
+            except ValueError as e:
+                print(f"skip {label}/{name}: {e}")
+                continue
+            samples.append((label, name, dc, time.ticks_diff(time.ticks_us(), start) / 1000))
+    return samples
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(results, decode_ms, threshold):
+    """
+    :param results: [(真实类别, 分类结果)]
+    """
+    n = len(results)
+    correct = sum(1 for label, r in results if r["label"] == label)
+    print(f"\n{n} images, top-1 accuracy {correct / n:.1%} (if every frame were answered locally)")
+    print("threshold  local(avoided)  local accuracy  overall accuracy*")
+    for t in THRESHOLDS + ((threshold,) if threshold not in THRESHOLDS else ()):
+        local = [(label, r) for label, r in results if r["confidence"] >= t]
+        ok = sum(1 for label, r in local if r["label"] == label)
+        # 交给云端的帧按云端全部正确计算
+        overall = (ok + n - len(local)) / n
+        mark = "  <-" if t == threshold else ""
+        acc = f"{ok / len(local):.1%}" if local else "-"
+        print(f"  {t:4.2f}     {len(local) / n:6.1%}          {acc:>6}          {overall:.1%}{mark}")
+    print("  * frames escalated to the cloud counted as correct")
+    ms = [r["ms"] for _, r in results]
+    print(f"decode  ms: mean {sum(decode_ms) / len(decode_ms):.2f}  p95 {percentile(decode_ms, 0.95):.2f}")
+    print(f"classify ms: mean {sum(ms) / len(ms):.2f}  p95 {percentile(ms, 0.95):.2f}")
+    labels = sorted(set(label for label, _ in results))
+    print("per label (local answers / total, local accuracy):")
+    for label in labels:
+        rows = [r for l, r in results if l == label]
+        local = [r for r in rows if r["confidence"] >= threshold]
+        ok = sum(1 for r in local if r["label"] == label)
+        wrong = {}
+        for r in local:
+            if r["label"] != label:
+                wrong[r["label"]] = wrong.get(r["label"], 0) + 1
+        acc = f"{ok / len(local):.0%}" if local else "-"
+        print(f"  {label:16s} {len(local):4d}/{len(rows):<4d} {acc:>5}  {wrong if wrong else ''}")
+
+
+def main(opts):
+    compat.install(False)
+    import local_classifier
+
+    samples = load_samples(opts["data"])
+    if not samples:
+        print(f"no JPEG files under {opts['data']}/<label>/")
+        return
+    decode_ms = [s[3] for s in samples]
+    feats = [(s[0], local_classifier.features(s[2])) for s in samples]
+
+    if opts["model"]:
+        clf = local_classifier.load(opts["model"], opts["threshold"])
+        if clf is None:
+            return
+        results = [(s[0], clf.classify_dc(s[2])) for s in samples]
+        report(results, decode_ms, opts["threshold"])
+        return
+
+    # k 折交叉验证：每张图都由没见过它的模型分类
+    k = max(2, opts["folds"])
+    results = []
+    for fold in range(k):
+        train_set = [f for i, f in enumerate(feats) if i % k != fold]
+        model = local_classifier.train(train_set, opts["prototypes"])
+        clf = local_classifier.Classifier(model, opts["threshold"])
+        for i in range(fold, len(samples), k):
+            results.append((samples[i][0], clf.classify_dc(samples[i][2])))
+    print(f"{k}-fold cross-validation, {opts['prototypes']} prototype(s) per label")
+    report(results, decode_ms, opts["threshold"])
+
+    if opts["out"]:
+        texts = None
+        if opts["texts"]:
+            with open(opts["texts"]) as f:
+                texts = json.load(f)
+        model = local_classifier.train(feats, opts["prototypes"], texts)
+        local_classifier.save(model, opts["out"])
+        size = len(json.dumps(model))
+        print(f"\nmodel trained on all {len(feats)} images -> {opts['out']} "
+              f"({len(model['labels'])} labels, {len(model['prototypes'])} prototypes, {size} bytes)")
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:], OPTIONS))
@@ -0,0 +1,76 @@
+# --------- 模拟 machine 模块（电脑上运行） ----------
+# 只实现设备代码用到的 Pin、SPI、I2C、reset 等，引脚和总线不做任何事。
+
+import sys
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 2
+    IRQ_RISING = 1
+
+    def __init__(self, id, mode=-1, pull=-1, value=None, **kwargs):
+        self.id = id
+        self._value = value or 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def irq(self, handler=None, trigger=None):
+        pass
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+
+class SPI:
+    def __init__(self, id, baudrate=1000000, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+
+    def write(self, buf):
+        pass
+
+    def deinit(self):
+        pass
+
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+
+    def scan(self):
+        return [0x20]
+
+    def writeto_mem(self, addr, memaddr, buf):
+        pass
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        return bytes(nbytes)
+
+
+def reset():
+    # 设备上会重启，电脑上直接退出
+    print("machine.reset()")
+    sys.exit(1)
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def unique_id():
+    return b"host00"
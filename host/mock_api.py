@@ -0,0 +1,261 @@
+# --------- 模拟大模型 API（电脑上运行） ----------
+# OpenAI 兼容的 POST /v1/chat/completions，可代替 Moonshot / DeepSeek 做离线测试和压测。
+# 支持普通和流式（SSE，chunked）两种响应、keep-alive，可设置延迟、抖动和错误率，
+# 以及故障注入（不响应、响应头后卡住、直接断开），用于测试超时、重试和熔断。
+# 用法: python host/mock_api.py --port=8082 --latency-ms=1500 --jitter-ms=300 --error-rate=0.05
+# 运行中修改配置: GET /mock/config?error_rate=1&error_status=503，返回当前配置和统计
+# 也可在设备代码的事件循环中启动: asyncio.create_task(mock_api.serve(port))
+# 只用到 uasyncio 也有的流接口，unix 版 MicroPython 同样可以运行。
+
+import sys
+import json
+import random
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+CONFIG = {
+    "latency_ms": 1500,   # 读完请求到开始响应的时间（模拟模型推理）
+    "jitter_ms": 0,       # 延迟在 ±jitter_ms 内随机浮动
+    "error_rate": 0.0,    # 返回错误的概率
+    "error_status": 500,  # 错误状态码，如 500、429、503
+    "token_ms": 40,       # 流式模式每段增量之间的间隔
+    "tokens": 12,         # 流式模式的增量段数
+    "retry_after": 0,     # 错误响应带上 Retry-After 头（秒），0 表示不带
+    "fault": "",          # 故障类型: stall（不响应）、stall_body（发出响应头后卡住）、drop（直接断开）
+    "fault_rate": 0.0,    # 发生故障的概率
+    "stall_ms": 120000,   # stall 类故障卡住的时间
+}
+
+stats = {"requests": 0, "errors": 0, "faults": 0, "streams": 0, "images": 0, "bytes_in": 0, "connections": 0}
+
+MAX_LINE = 1024
+_READ = 4096
+_IMAGE_MARK = b"data:image/"
+_STREAM_MARK = b'"stream": true'
+_JSON_MARK = b'\\"objects\\"'  # 提示词要求输出结构化结果（见 detections.PROMPT_SUFFIX）
+
+
+def reply_text(images, structured=False):
+    if structured:
+        objects = [{"label": "square", "count": 1, "boxes": [[0.3, 0.35, 0.5, 0.65]], "image": i + 1}
+                   for i in range(max(1, images))]
+        return "```json\n" + json.dumps({"objects": objects, "summary": "模拟回复：画面中有一个白色方块"}) + "\n```"
+    if images > 1:
+        return f"模拟回复：共 {images} 张图片，画面中都有一个白色方块在渐变背景上移动。"
+    if images == 1:
+        return "模拟回复：画面是从左上到右下变亮的灰色渐变背景，中间偏左有一个白色方块。"
+    return "模拟回复：你好，这是用于测试的模拟大模型服务。"
+
+
+async def _read_body(reader, length):
+    """读取并丢弃请求体，只统计图片数量、是否为流式请求和是否要求结构化结果"""
+    images = 0
+    structured = False
+    tail = b""
+    remaining = length
+    while remaining > 0:
+        chunk = await reader.read(min(_READ, remaining))
+        if not chunk:
+            raise OSError("connection closed in body")
+        remaining -= len(chunk)
+        window = tail + chunk
+        images += window.count(_IMAGE_MARK) - tail.count(_IMAGE_MARK)
+        structured = structured or _JSON_MARK in window
+        tail = window[-32:]
+    stream = _STREAM_MARK in tail or _STREAM_MARK.replace(b" ", b"") in tail
+    return images, stream, structured
+
+
+async def _write(writer, data):
+    writer.write(data)
+    await writer.drain()
+
+
+async def _send(writer, status, body, keep_alive, extra=""):
+    head = "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n{}\r\n".format(
+        status, "OK" if status == 200 else "Error", len(body), "keep-alive" if keep_alive else "close", extra)
+    await _write(writer, head.encode() + body)
+
+
+def _set_config(query):
+    """按 key=value&... 修改 CONFIG，值按原类型转换"""
+    for pair in query.split("&"):
+        key, _, value = pair.partition("=")
+        if key not in CONFIG:
+            continue
+        default = CONFIG[key]
+        if isinstance(default, int):
+            CONFIG[key] = int(value)
+        elif isinstance(default, float):
+            CONFIG[key] = float(value)
+        else:
+            CONFIG[key] = value
+
+
+async def _fault(writer):
+    """
+    按 CONFIG["fault"] 模拟故障
+    :return: 是否发生了故障（发生时连接不再使用）
+    """
+    fault = CONFIG["fault"]
+    if not fault or random.random() >= CONFIG["fault_rate"]:
+        return False
+    stats["faults"] += 1
+    if fault == "stall_body":
+        await _write(writer, b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 1000\r\n\r\n{")
+    if fault in ("stall", "stall_body"):
+        await asyncio.sleep(CONFIG["stall_ms"] / 1000)
+    return True
+
+
+async def _send_stream(writer, text, keep_alive):
+    head = "HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\nConnection: {}\r\n\r\n".format(
+        "keep-alive" if keep_alive else "close")
+    await _write(writer, head.encode())
+    n = max(1, CONFIG["tokens"])
+    step = (len(text) + n - 1) // n
+    for i in range(0, len(text), step):
+        if CONFIG["token_ms"]:
+            await asyncio.sleep(CONFIG["token_ms"] / 1000)
+        event = {"choices": [{"index": 0, "delta": {"content": text[i:i + step]}}]}
+        data = ("data: " + json.dumps(event) + "\n\n").encode()
+        await _write(writer, b"%x\r\n" % len(data) + data + b"\r\n")
+    data = b"data: [DONE]\n\n"
+    await _write(writer, b"%x\r\n" % len(data) + data + b"\r\n0\r\n\r\n")
+
+
+async def _handle_one(reader, writer):
+    """处理一个请求，返回是否保持连接"""
+    line = await reader.readline()
+    if not line:
+        return False
+    parts = line.split()
+    if len(parts) < 3:
+        return False
+    method, path, version = parts[0], parts[1], parts[2]
+    length = 0
+    keep_alive = version == b"HTTP/1.1"
+    while True:
+        h = await reader.readline()
+        if not h or h == b"\r\n":
+            break
+        name, _, value = h.partition(b":")
+        name = name.strip().lower()
+        value = value.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"connection":
+            keep_alive = value == b"keep-alive" or (keep_alive and value != b"close")
+
+    images, stream, structured = await _read_body(reader, length)
+    if path.startswith(b"/mock/"):
+        path, _, query = path.decode().partition("?")
+        if path == "/mock/config" and query:
+            _set_config(query)
+        await _send(writer, 200, json.dumps({"config": CONFIG, "stats": stats}).encode(), keep_alive)
+        return keep_alive
+
+    stats["requests"] += 1
+    stats["bytes_in"] += length
+    stats["images"] += images
+
+    if method != b"POST" or not path.rstrip(b"/").endswith(b"/chat/completions"):
+        await _send(writer, 404, b'{"error": {"message": "not found"}}', keep_alive)
+        return keep_alive
+
+    delay = CONFIG["latency_ms"]
+    if CONFIG["jitter_ms"]:
+        delay += random.randint(-CONFIG["jitter_ms"], CONFIG["jitter_ms"])
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+
+    if await _fault(writer):
+        return False
+
+    if CONFIG["error_rate"] and random.random() < CONFIG["error_rate"]:
+        stats["errors"] += 1
+        status = CONFIG["error_status"]
+        body = json.dumps({"error": {"message": "mock error", "type": "server_error", "code": status}})
+        extra = "Retry-After: {}\r\n".format(CONFIG["retry_after"]) if CONFIG["retry_after"] else ""
+        await _send(writer, status, body.encode(), keep_alive, extra)
+        return keep_alive
+
+    text = reply_text(images, structured)
+    if stream:
+        stats["streams"] += 1
+        await _send_stream(writer, text, keep_alive)
+    else:
+        body = {
+            "id": "mock-%d" % stats["requests"],
+            "object": "chat.completion",
+            "model": "mock",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10 + 200 * images, "completion_tokens": len(text), "total_tokens": 10 + 200 * images + len(text)}
+        }
+        await _send(writer, 200, json.dumps(body).encode(), keep_alive)
+    return keep_alive
+
+
+async def handle_client(reader, writer):
+    stats["connections"] += 1
+    try:
+        while await _handle_one(reader, writer):
+            pass
+    except Exception as e:
+        print("mock api:", e)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def serve(port=8082, host="127.0.0.1"):
+    """启动服务并返回 server 对象"""
+    server = await asyncio.start_server(handle_client, host, port)
+    print(f"Mock API on http://{host}:{port}/v1/chat/completions "
+          f"(latency {CONFIG['latency_ms']}ms ±{CONFIG['jitter_ms']}, error rate {CONFIG['error_rate']})")
+    return server
+
+
+def parse_args(argv, options):
+    """
+    解析 --name=value 形式的参数（MicroPython 没有 argparse）
+    :param options: {名称: 默认值}，按默认值的类型转换
+    :return: 新的 dict
+    """
+    result = dict(options)
+    for arg in argv:
+        if not arg.startswith("--"):
+            raise ValueError(f"unknown argument: {arg}")
+        name, _, value = arg[2:].partition("=")
+        key = name.replace("-", "_")
+        if key not in result:
+            raise ValueError(f"unknown option: --{name}")
+        default = result[key]
+        if isinstance(default, bool):
+            result[key] = value.lower() not in ("0", "false", "no") if value else True
+        elif isinstance(default, int):
+            result[key] = int(value)
+        elif isinstance(default, float):
+            result[key] = float(value)
+        else:
+            result[key] = value
+    return result
+
+
+async def _main(port, host):
+    await serve(port, host)
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == "__main__":
+    opts = parse_args(sys.argv[1:], dict(CONFIG, port=8082, host="127.0.0.1"))
+    for key in CONFIG:
+        CONFIG[key] = opts[key]
+    asyncio.run(_main(opts["port"], opts["host"]))
@@ -0,0 +1,179 @@
+# --------- 模拟 MQTT broker（电脑上运行） ----------
+# MQTT 3.1.1 的最小实现，离线测试 mqtt_events 和压测时代替 mosquitto：
+# CONNECT（含遗嘱）、PUBLISH（QoS 0/1，回 PUBACK）、SUBSCRIBE（支持 + 和 # 通配符）、
+# retained 消息、PINGREQ、DISCONNECT。转发给订阅者时一律使用 QoS 0。
+# 用法: python host/mock_broker.py --port=1883 --verbose=1
+# 也可在同一事件循环中启动: await mock_broker.serve(port)；
+# block(前缀) 断开并拒绝 client_id 以该前缀开头的客户端（模拟设备断网），unblock() 恢复
+# 只用到 uasyncio 也有的流接口，unix 版 MicroPython 同样可以运行。
+
+import sys
+import struct
+import compat
+import mock_api
+
+compat.install(False)
+# mqtt_events 在仓库根目录
+sys.path.append((__file__.replace("\\", "/").rpartition("/")[0] or ".") + "/..")
+
+import uasyncio as asyncio
+import mqtt_events as mq
+
+OPTIONS = {"port": 1883, "host": "127.0.0.1", "verbose": False}
+
+stats = {"connections": 0, "published": 0, "delivered": 0, "bytes_in": 0, "wills": 0}
+retained = {}   # 主题 -> 负载
+sessions = []   # [writer, 订阅的主题过滤器列表, client_id]
+blocked = []    # 拒绝连接的 client_id 前缀
+verbose = False
+
+
+def matches(pattern, topic):
+    """主题过滤器匹配（+ 匹配一级，# 匹配剩余所有级）"""
+    p = pattern.split("/")
+    t = topic.split("/")
+    for i in range(len(p)):
+        if p[i] == "#":
+            return True
+        if i >= len(t) or (p[i] != "+" and p[i] != t[i]):
+            return False
+    return len(p) == len(t)
+
+
+async def route(topic, payload, retain):
+    """转发给订阅者（QoS 0），retain 时保存（空负载删除）"""
+    if retain:
+        if payload:
+            retained[topic] = bytes(payload)
+        else:
+            retained.pop(topic, None)
+    data = None
+    for session in sessions:
+        for f in session[1]:
+            if matches(f, topic):
+                if data is None:
+                    data = mq.publish_packet(topic, payload)
+                try:
+                    await session[0].awrite(data)
+                    stats["delivered"] += 1
+                except OSError:
+                    pass
+                break
+
+
+def _parse_connect(body):
+    """:return: (client_id, 遗嘱 (主题, 负载, retain) 或 None)"""
+    pos = 2 + struct.unpack_from("!H", body, 0)[0]
+    flags = body[pos + 1]
+    pos += 4
+
+    def field():
+        nonlocal pos
+        n = struct.unpack_from("!H", body, pos)[0]
+        value = bytes(body[pos + 2:pos + 2 + n])
+        pos += 2 + n
+        return value
+
+    client_id = field().decode()
+    will = None
+    if flags & 0x04:
+        topic = field().decode()
+        will = (topic, field(), bool(flags & 0x20))
+    return client_id, will
+
+
+async def handle_client(reader, writer):
+    session = [writer, [], None]
+    will = None
+    client_id = "?"
+    stats["connections"] += 1
+    try:
+        kind, _, body = await mq.read_packet(reader)
+        if kind != mq.CONNECT:
+            return
+        client_id, will = _parse_connect(body)
+        if any(client_id.startswith(b) for b in blocked):
+            will = None
+            await writer.awrite(mq.packet(mq.CONNACK, b"\x00\x03"))  # 服务不可用
+            return
+        session[2] = client_id
+        await writer.awrite(mq.packet(mq.CONNACK, b"\x00\x00"))
+        sessions.append(session)
+        if verbose:
+            print(f"broker: {client_id} connected")
+        while True:
+            kind, flags, body = await mq.read_packet(reader)
+            stats["bytes_in"] += len(body)
+            if kind == mq.PUBLISH:
+                topic, payload, qos, pid, retain = mq.parse_publish(flags, body)
+                stats["published"] += 1
+                if qos:
+                    await writer.awrite(mq.packet(mq.PUBACK, bytes([pid >> 8, pid & 0xFF])))
+                await route(topic, payload, retain)
+            elif kind == mq.SUBSCRIBE:
+                pid = body[:2]
+                pos = 2
+                granted = bytearray()
+                new = []
+                while pos < len(body):
+                    n = (body[pos] << 8) | body[pos + 1]
+                    new.append(bytes(body[pos + 2:pos + 2 + n]).decode())
+                    pos += 3 + n
+                    granted.append(0)
+                session[1] += new
+                await writer.awrite(mq.packet(mq.SUBACK, bytes(pid) + bytes(granted)))
+                for topic in list(retained):
+                    if any(matches(f, topic) for f in new):
+                        await writer.awrite(mq.publish_packet(topic, retained[topic], retain=True))
+            elif kind == mq.PINGREQ:
+                await writer.awrite(mq.packet(mq.PINGRESP))
+            elif kind == mq.DISCONNECT:
+                will = None  # 正常断开不发布遗嘱
+                break
+    except (OSError, EOFError, ValueError):
+        pass
+    finally:
+        if session in sessions:
+            sessions.remove(session)
+        try:
+            writer.close()
+        except OSError:
+            pass
+        if will is not None:
+            stats["wills"] += 1
+            await route(*will)
+        if verbose:
+            print(f"broker: {client_id} disconnected")
+
+
+def block(prefix=""):
+    """断开并拒绝 client_id 以 prefix 开头的客户端（空前缀为所有客户端），被断开的客户端的遗嘱照常发布"""
+    blocked.append(prefix)
+    for session in list(sessions):
+        if session[2].startswith(prefix):
+            try:
+                session[0].close()
+            except OSError:
+                pass
+
+
+def unblock():
+    del blocked[:]
+
+
+async def serve(port=1883, host="127.0.0.1"):
+    server = await asyncio.start_server(handle_client, host, port)
+    print(f"Mock MQTT broker on {host}:{port}")
+    return server
+
+
+async def _main(port, host):
+    await serve(port, host)
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == "__main__":
+    opts = mock_api.parse_args(sys.argv[1:], OPTIONS)
+    verbose = opts["verbose"]
+    asyncio.run(_main(opts["port"], opts["host"]))
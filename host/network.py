@@ -0,0 +1,58 @@
+# --------- 模拟 network 模块（电脑上运行） ----------
+# WLAN.connect() 后经过 CONNECT_MS 毫秒连接成功，ifconfig() 返回本机地址。
+
+import time
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+STAT_NO_AP_FOUND = 201
+STAT_WRONG_PASSWORD = 202
+STAT_CONNECT_FAIL = 203
+
+IP = "127.0.0.1"
+CONNECT_MS = 0        # 模拟关联 + DHCP 所需时间
+FAIL_STATUS = None    # 设为 STAT_WRONG_PASSWORD 等值时连接总是失败
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self._connected = False
+        self._since = None
+
+    def active(self, state=None):
+        if state is None:
+            return self._active
+        self._active = bool(state)
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        if not self._active:
+            raise OSError("WLAN not active")
+        self._since = _now()
+
+    def disconnect(self):
+        self._since = None
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -50
+        if self._since is None:
+            return STAT_IDLE
+        if _now() - self._since < CONNECT_MS:
+            return STAT_CONNECTING
+        return FAIL_STATUS or STAT_GOT_IP
+
+    def ifconfig(self):
+        return (IP, "255.255.255.0", "127.0.0.1", "8.8.8.8")
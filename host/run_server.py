@@ -0,0 +1,115 @@
+# --------- 在电脑上运行设备程序 ----------
+# 用 host/ 下的模拟硬件模块（camera、atk_lcd、atk_xl9555、machine、network）代替固件模块，
+# 原样调用主程序的 main()：硬件初始化、连接 WiFi、start_server() 都走设备上的同一套代码。
+# 默认在同一个事件循环里启动模拟大模型 API（host/mock_api.py），并把视觉 API 地址指向它。
+#
+# 用法（在仓库根目录）:
+#   python host/run_server.py --port=8080 --latency-ms=1500 --error-rate=0.05
+#   micropython host/run_server.py --port=8080
+# 使用单独启动的模拟 API 或真实 API:
+#   python host/run_server.py --mock=0 --api-url=http://127.0.0.1:8082/v1/chat/completions
+# 推送 MQTT 事件（mock 在同一进程中启动 host/mock_broker.py，也可指定 mosquitto 等 broker 的地址）:
+#   python host/run_server.py --mqtt=mock
+#   python host/run_server.py --mqtt=127.0.0.1:1883
+
+import sys
+import os
+
+
+def _dirname(path):
+    # MicroPython 没有 os.path
+    i = path.replace("\\", "/").rfind("/")
+    if i < 0:
+        return "."
+    return path[:i] or "/"
+
+
+HOST_DIR = _dirname(__file__)
+ROOT = _dirname(HOST_DIR) if HOST_DIR != "." else ".."
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HOST_DIR)  # 模拟模块优先
+
+import compat
+import mock_api
+
+APP = "AI物体识别3.0.py"
+
+OPTIONS = {
+    "app": APP,
+    "port": 8080,            # 设备程序的 HTTP 端口（设备上为 80）
+    "mock": True,            # 在同一进程中启动模拟 API
+    "api_port": 8082,
+    "api_url": "",           # 视觉 API 地址，为空时使用模拟 API
+    "latency_ms": mock_api.CONFIG["latency_ms"],
+    "jitter_ms": mock_api.CONFIG["jitter_ms"],
+    "error_rate": mock_api.CONFIG["error_rate"],
+    "error_status": mock_api.CONFIG["error_status"],
+    "token_ms": mock_api.CONFIG["token_ms"],
+    "capture_ms": 0,         # 模拟每次采集的耗时
+    "camera_init_fails": 0,  # 模拟摄像头上电后前几次初始化失败
+    "wifi_ms": 0,            # 模拟 WiFi 连接耗时
+    "mqtt": "",              # MQTT broker 地址 host:port，"mock" 表示在同一进程中启动模拟 broker
+    "trace_memory": True,    # CPython 下用 tracemalloc 统计堆内存
+}
+
+
+def load_app(path):
+    """
+    执行主程序文件（文件名含 "." 和中文，不能直接 import），__name__ 不是 "__main__"，不会自动运行 main()
+    :return: 模块的全局变量 dict
+    """
+    with open(path) as f:
+        source = f.read()
+    ns = {"__name__": "app", "__file__": path}
+    exec(compile(source, path, "exec"), ns)
+    return ns
+
+
+def run(opts):
+    compat.install(opts["trace_memory"])
+    os.chdir(ROOT)  # static/ 使用相对路径
+
+    import camera
+    camera.CAPTURE_MS = opts["capture_ms"]
+    camera.INIT_FAILS = opts["camera_init_fails"]
+    import network
+    network.CONNECT_MS = opts["wifi_ms"]
+    for key in mock_api.CONFIG:
+        if key in opts:
+            mock_api.CONFIG[key] = opts[key]
+
+    app = load_app(opts["app"])
+    app["HTTP_PORT"] = opts["port"]
+    api_url = opts["api_url"] or f"http://127.0.0.1:{opts['api_port']}/v1/chat/completions"
+    for name in ("vision_client", "client"):
+        client = app.get(name)
+        if client is not None:
+            client.backend.url = api_url
+
+    mock_broker = None
+    if opts["mqtt"]:
+        host, _, port = opts["mqtt"].partition(":")
+        if host == "mock":
+            import mock_broker
+            host = "127.0.0.1"
+        app["publisher"] = app["make_publisher"](host, int(port or 1883))
+
+    if opts["mock"] or mock_broker is not None:
+        start_server = app["start_server"]
+
+        async def start_with_mock():
+            if opts["mock"]:
+                await mock_api.serve(opts["api_port"])
+            if mock_broker is not None:
+                await mock_broker.serve(app["publisher"].port)
+            return await start_server()
+
+        # 启动流程在调用时才查找 start_server，替换全局变量即可
+        app["start_server"] = start_with_mock
+
+    print(f"Device app on http://127.0.0.1:{opts['port']}/, vision API {api_url}")
+    app["main"]()
+
+
+if __name__ == "__main__":
+    run(mock_api.parse_args(sys.argv[1:], OPTIONS))
@@ -0,0 +1,86 @@
+# --------- 自适应分辨率 / JPEG 质量 ----------
+# 用模拟链路（上传吞吐量 kbps + 服务端基础延迟）驱动 QualityController：每次分析前 choose() 选档位，
+# 按该档位的 JPEG 大小算出上传耗时和总耗时，再交给 observe_frame() / record()，检查选出的档位序列：
+# 链路好时每次只升一档直到最高档；链路变慢时一次降多档；预测延迟在目标和留出的余量之间时保持不变。
+# 档位表与 AI物体识别3.0.py 的 QUALITY_LEVELS 相同，目标延迟 4 秒。
+# 运行: python host/test_adaptive_quality.py
+
+import unittest
+
+import testing
+from adaptive_quality import QualityController, default_size, B64_OVERHEAD
+
+LEVELS = [
+    ("FRAME_QQVGA", 160, 120, 12),
+    ("FRAME_QVGA", 320, 240, 15),
+    ("FRAME_QVGA", 320, 240, 10),
+    ("FRAME_HVGA", 480, 320, 12),
+    ("FRAME_VGA", 640, 480, 12),
+    ("FRAME_VGA", 640, 480, 10),
+]
+TARGET_MS = 4000
+BASE_MS = 800
+
+
+def simulate(ctl, kbps, count, base_ms=BASE_MS):
+    """
+    按给定链路进行 count 次分析
+    :return: 每次 choose() 选出的档位
+    """
+    chosen = []
+    for _ in range(count):
+        index = ctl.choose()
+        chosen.append(index)
+        _, w, h, q = LEVELS[index]
+        size = default_size(w, h, q)
+        sent = size * 4 // 3 + B64_OVERHEAD
+        upload_ms = int(sent * 8 / kbps)
+        ctl.observe_frame(index, size)
+        ctl.record(sent, upload_ms, base_ms + upload_ms)
+    return chosen
+
+
+class AdaptiveQualityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ctl = QualityController(LEVELS, target_ms=TARGET_MS, initial=1)
+
+    def test_initial_level_without_measurements(self):
+        self.assertEqual(self.ctl.choose(), 1)
+        self.assertIsNone(self.ctl.params()["predicted_ms"])
+
+    def test_fast_link_steps_up_one_level_at_a_time(self):
+        self.assertEqual(simulate(self.ctl, 2000, 8), [1, 2, 3, 4, 5, 5, 5, 5])
+        self.assertEqual(self.ctl.params()["framesize"], "FRAME_VGA")
+        self.assertEqual(self.ctl.params()["quality"], 10)
+        self.assertEqual(self.ctl.changes, 4)
+
+    def test_slow_link_drops_several_levels(self):
+        simulate(self.ctl, 2000, 8)
+        self.assertEqual(simulate(self.ctl, 50, 6), [5, 3, 2, 2, 2, 2])
+        self.assertLessEqual(self.ctl.predict_ms(2), TARGET_MS)
+        self.assertGreater(self.ctl.predict_ms(3), TARGET_MS)
+        # 链路恢复后逐档回升
+        self.assertEqual(simulate(self.ctl, 2000, 8), [2, 2, 3, 3, 4, 5, 5, 5])
+
+    def test_headroom_prevents_flapping(self):
+        # 150 kbps 时最高档的预测延迟低于目标，但高于目标的 80%，停在第 4 档
+        self.assertEqual(simulate(self.ctl, 150, 10), [1, 2, 3, 4, 4, 4, 4, 4, 4, 4])
+        self.assertLess(self.ctl.predict_ms(5), TARGET_MS)
+        self.assertGreater(self.ctl.predict_ms(5), TARGET_MS * 0.8)
+
+    def test_limited_link_settles_below_target(self):
+        self.assertEqual(simulate(self.ctl, 100, 10), [1, 2, 3, 3, 3, 3, 3, 3, 3, 3])
+        self.assertLessEqual(self.ctl.predict_ms(3), TARGET_MS)
+        self.assertGreater(self.ctl.predict_ms(4), TARGET_MS)
+
+    def test_slow_server_lowers_quality(self):
+        simulate(self.ctl, 2000, 8)
+        # 上传很快，但服务端基础延迟接近目标：滑动平均追上后降到预测不超过目标的档位
+        self.assertEqual(simulate(self.ctl, 2000, 7, base_ms=3900), [5, 5, 5, 3, 3, 3, 3])
+        self.assertLessEqual(self.ctl.predict_ms(3), TARGET_MS)
+        self.assertGreater(self.ctl.predict_ms(4), TARGET_MS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+# --------- API 调用的超时、重试、熔断和备用后端 ----------
+# 在同一个事件循环中启动模拟 API（host/mock_api.py），按用例设置错误率、错误状态码、Retry-After
+# 和故障类型（stall 不响应、stall_body 发出响应头后卡住、drop 直接断开），检查 LLMClient 的行为；
+# 最后用 host/run_server.py 运行设备程序，检查熔断器状态可以通过 /api 查看、失败的流式分析可以通过 /result 查询。
+# 运行: python host/test_api_faults.py
+
+import json
+import time
+import unittest
+
+import testing
+import uasyncio as asyncio
+import async_http
+import llm_client
+import mock_api
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN
+
+DEFAULTS = dict(mock_api.CONFIG)
+
+
+class APIFaultsTest(unittest.TestCase):
+
+    def setUp(self):
+        # 卡住的时间略长于用例中的超时，事件循环结束前模拟 API 的连接都已结束
+        mock_api.CONFIG.update(DEFAULTS, latency_ms=0, token_ms=0, stall_ms=500)
+        for key in mock_api.stats:
+            mock_api.stats[key] = 0
+        self.port = testing.free_port()
+        self.url = f"http://127.0.0.1:{self.port}/v1/chat/completions"
+
+    def client(self, url=None, retries=2, breaker=None, fallback=None, total_ms=10000, **timeouts):
+        limits = {"connect_ms": 1000, "ttfb_ms": 1000, "read_ms": 1000}
+        limits.update(timeouts)
+        return llm_client.LLMClient(llm_client.local(url or self.url), timeouts=async_http.Timeouts(**limits),
+                                    total_ms=total_ms, retries=retries, backoff_ms=50, max_backoff_ms=2000,
+                                    breaker=breaker, fallback=fallback)
+
+    def run_mock(self, fn, settle_ms=0):
+        """
+        启动模拟 API 后执行 await fn()
+        :param settle_ms: 结束后等模拟 API 中卡住的连接结束
+        :return: (结果, 耗时毫秒)
+        """
+        async def main():
+            server = await mock_api.serve(self.port)
+            try:
+                start = time.monotonic()
+                result = await fn()
+                ms = (time.monotonic() - start) * 1000
+                await asyncio.sleep_ms(settle_ms)
+                return result, ms
+            finally:
+                server.close()
+        return asyncio.run(main())
+
+    def test_success(self):
+        client = self.client()
+        result, _ = self.run_mock(lambda: client.ask("hi"))
+        self.assertFalse(llm_client.is_api_failure(result))
+        self.assertEqual((client.calls, client.failures, client.retried), (1, 0, 0))
+
+    def test_retryable_status_is_retried(self):
+        mock_api.CONFIG.update(error_rate=1, error_status=503)
+        client = self.client(retries=2)
+        result, _ = self.run_mock(lambda: client.ask("hi"))
+        self.assertEqual(result.kind, "http")
+        self.assertEqual(result.status, 503)
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(mock_api.stats["requests"], 3)
+        self.assertEqual((client.failures, client.retried), (1, 2))
+        self.assertIs(client.last_error, result)
+
+    def test_retry_recovers(self):
+        mock_api.CONFIG.update(error_rate=1, error_status=502)
+        client = self.client(retries=2)
+
+        async def call():
+            async def heal():
+                while not mock_api.stats["errors"]:
+                    await asyncio.sleep_ms(1)
+                mock_api.CONFIG["error_rate"] = 0
+            asyncio.create_task(heal())
+            return await client.ask("hi")
+
+        result, _ = self.run_mock(call)
+        self.assertFalse(llm_client.is_api_failure(result))
+        self.assertEqual((client.failures, client.retried), (0, 1))
+
+    def test_client_error_is_not_retried(self):
+        mock_api.CONFIG.update(error_rate=1, error_status=401)
+        client = self.client(retries=2)
+        result, _ = self.run_mock(lambda: client.ask("hi"))
+        self.assertEqual(result.status, 401)
+        self.assertFalse(result.retryable)
+        self.assertEqual(mock_api.stats["requests"], 1)
+
+    def test_retry_after_is_honoured(self):
+        mock_api.CONFIG.update(error_rate=1, error_status=429, retry_after=1)
+        client = self.client(retries=1)
+        result, ms = self.run_mock(lambda: client.ask("hi"))
+        self.assertEqual(result.status, 429)
+        self.assertEqual(mock_api.stats["requests"], 2)
+        self.assertGreaterEqual(ms, 1000)
+
+    def test_phase_timeouts(self):
+        for fault, kind, phase in (("stall", "timeout", "ttfb"), ("stall_body", "timeout", "read"),
+                                   ("drop", "network", None)):
+            with self.subTest(fault=fault):
+                mock_api.CONFIG.update(fault=fault, fault_rate=1)
+                client = self.client(retries=1, ttfb_ms=300, read_ms=300)
+                result, ms = self.run_mock(lambda: client.ask("hi"), settle_ms=600)
+                self.assertEqual(result.kind, kind)
+                self.assertEqual(result.phase, phase)
+                self.assertEqual(result.attempts, 2)
+                self.assertLess(ms, 2000)
+
+    def test_total_time_limit(self):
+        mock_api.CONFIG.update(latency_ms=800)
+        client = self.client(retries=2, total_ms=300, ttfb_ms=5000)
+        result, ms = self.run_mock(lambda: client.ask("hi"), settle_ms=600)
+        self.assertEqual((result.kind, result.phase), ("timeout", "total"))
+        self.assertLess(ms, 600)
+
+    def test_circuit_breaker(self):
+        mock_api.CONFIG.update(error_rate=1, error_status=500)
+        breaker = CircuitBreaker(failure_threshold=2, reset_ms=200)
+        client = self.client(retries=0, breaker=breaker)
+
+        async def calls():
+            results = [await client.ask("hi") for _ in range(3)]
+            requests = mock_api.stats["requests"]
+            state = breaker.state
+            # 冷却后放行一次试探，成功后恢复
+            mock_api.CONFIG["error_rate"] = 0
+            await asyncio.sleep_ms(250)
+            results.append(await client.ask("hi"))
+            return results, requests, state
+
+        (results, requests, state), _ = self.run_mock(calls)
+        self.assertEqual([r.kind for r in results[:3]], ["http", "http", "circuit_open"])
+        self.assertEqual(requests, 2)  # 断开期间的调用没有发出请求
+        self.assertEqual(state, OPEN)
+        self.assertFalse(llm_client.is_api_failure(results[3]))
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.stats()["rejected"], 1)
+
+    def test_fallback(self):
+        dead = f"http://127.0.0.1:{testing.free_port()}/v1/chat/completions"  # 没有服务监听
+        backup = self.client()
+        client = self.client(url=dead, retries=1, fallback=backup)
+        result, _ = self.run_mock(lambda: client.ask("hi"))
+        self.assertFalse(llm_client.is_api_failure(result))
+        self.assertEqual(client.fallbacks, 1)
+        self.assertEqual(client.last_error.kind, "network")
+        self.assertEqual(backup.calls, 1)
+
+    def test_no_fallback_after_streamed_output(self):
+        mock_api.CONFIG.update(token_ms=50, tokens=3)
+        backup = self.client()
+        client = self.client(retries=1, fallback=backup, read_ms=200)
+        deltas = []
+
+        async def on_delta(text):
+            deltas.append(text)
+            # 输出开始后服务端卡住
+            mock_api.CONFIG["token_ms"] = 500
+
+        result, _ = self.run_mock(lambda: client.ask("hi", on_delta), settle_ms=600)
+        self.assertEqual((result.kind, result.phase), ("timeout", "read"))
+        self.assertTrue(deltas)
+        self.assertEqual(result.attempts, 1)  # 已经输出过内容，不重试
+        self.assertEqual((client.fallbacks, backup.calls), (0, 0))
+
+    def test_client_disconnect_is_not_a_failure(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_ms=60000)
+        backup = self.client()
+        client = self.client(breaker=breaker, fallback=backup)
+
+        async def on_delta(text):
+            raise OSError(104, "connection reset by peer")  # 浏览器断开
+
+        async def call():
+            with self.assertRaises(llm_client.ClientGone):
+                await client.ask("hi", on_delta)
+
+        self.run_mock(call)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual((client.failures, client.retried, client.fallbacks), (0, 0, 0))
+        self.assertIsNone(client.last_error)
+        self.assertEqual(client.clients_gone, 1)
+        self.assertEqual(backup.calls, 0)
+
+    def test_breaker_state_over_http(self):
+        with testing.DeviceServer(latency_ms=0, error_rate=1, error_status=503) as server:
+            status, body, _ = server.get("/analyze?wait=1&prompt=fault+test")
+            self.assertEqual(status, 200)
+            first = json.loads(body)
+            status, body, _ = server.get("/analyze?wait=1&prompt=fault+test+2")
+            second = json.loads(body)
+            api = json.loads(server.get("/api")[1])
+        self.assertEqual(first["error"]["kind"], "http")
+        self.assertEqual(first["error"]["attempts"], 3)
+        self.assertEqual(second["error"]["kind"], "circuit_open")
+        self.assertEqual(api["breaker"]["state"], OPEN)
+        self.assertEqual(api["breaker"]["opened"], 1)
+        self.assertEqual(api["failures"], 2)
+        self.assertEqual(api["last_error"]["kind"], "circuit_open")
+
+    def test_failed_stream_result_over_http(self):
+        # 流式分析失败后，/result 中的任务结果是 JSON（不含异常对象）
+        with testing.DeviceServer(latency_ms=0, error_rate=1, error_status=400) as server:
+            status, body, _ = server.get("/analyze/stream?prompt=fault+test")
+            self.assertEqual(status, 200)
+            done = json.loads(body.decode("utf-8").split("event: done\ndata: ")[1])
+            status, body, _ = server.get("/result/1")
+        self.assertEqual(status, 200)
+        job = json.loads(body)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["result"], done)
+        self.assertEqual(done["status"], "error")
+        self.assertEqual((done["error"]["kind"], done["error"]["status"]), ("http", 400))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# --------- 分析期间 /capture 不被阻塞 ----------
+# 模拟 API 每次等待 LATENCY_MS 才响应（远长于一次采集），分析进行中反复 GET /capture：
+# API 调用不阻塞事件循环时，/capture 的延迟与空闲时基本相同；
+# 阻塞时 /capture 要等分析结束才返回，延迟接近 LATENCY_MS。
+# 运行: python host/test_capture_latency.py
+
+import json
+import threading
+import time
+import unittest
+
+import testing
+
+LATENCY_MS = 2000
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+class CaptureLatencyTest(unittest.TestCase):
+
+    def test_capture_latency_flat_during_analysis(self):
+        with testing.DeviceServer(latency_ms=LATENCY_MS) as server:
+            self.assertEqual(server.get("/capture")[0], 200)  # 等摄像头就绪
+            idle = [server.get("/capture")[2] for _ in range(10)]
+
+            result = {}
+            # 提示词不是默认值，不会由本地分类器或结果缓存直接回答
+            worker = threading.Thread(target=lambda: result.update(
+                analyze=server.get("/analyze?wait=1&prompt=latency+test")))
+            start = time.monotonic()
+            worker.start()
+            time.sleep(0.2)  # 请求已发往模拟 API
+            busy = []
+            while worker.is_alive():
+                status, _, ms = server.get("/capture")
+                self.assertEqual(status, 200)
+                if worker.is_alive():
+                    busy.append(ms)
+            worker.join()
+            analyze_ms = (time.monotonic() - start) * 1000
+
+        status, body, _ = result["analyze"]
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["status"], "success")
+        self.assertGreaterEqual(analyze_ms, LATENCY_MS)
+        print(f"\n/capture idle p50 {median(idle):.1f} ms, during analysis p50 {median(busy):.1f} ms "
+              f"max {max(busy):.1f} ms ({len(busy)} requests)")
+        self.assertGreaterEqual(len(busy), 5)
+        self.assertLess(median(busy), median(idle) + 100)
+        self.assertLess(max(busy), LATENCY_MS / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# --------- HTTP 服务器压测：与原来的实现对比 ----------
+# 用 host/bench.py 的压测循环，对 /cache（两种实现都有的小 JSON 接口）按不同并发各发 REQUESTS 个请求，
+# 比较每秒请求数和 p99 延迟：
+#   原来的实现   加入 http_server.py 之前的主程序（从 git 历史取出，在子进程中只运行它的 handle_client），
+#                每个请求 read(1024) 后按子串匹配路径，响应后关闭连接
+#   现在的实现   host/run_server.py 运行的设备程序（testing.DeviceServer），keep-alive 连接上连续请求
+# 另外检查分成多个 TCP 段发送的请求能被正常解析。
+# 没有 git 或历史中找不到原来的实现时跳过对比。
+# 运行: python host/test_http_load.py
+
+import os
+import sys
+import socket
+import subprocess
+import tempfile
+import time
+import unittest
+
+import testing
+import uasyncio as asyncio
+import bench
+
+REQUESTS = 300
+LEVELS = (1, 8)
+PATH = "/cache"
+
+
+def baseline_revision():
+    """加入 http_server.py 之前的版本，找不到时返回 None"""
+    try:
+        out = subprocess.run(["git", "log", "--diff-filter=A", "--format=%H", "--", "http_server.py"],
+                             cwd=testing.ROOT, capture_output=True, text=True, check=True).stdout.split()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out[-1] + "^" if out else None
+
+
+def serve_old(revision, port):
+    """在本进程中运行原来实现的 handle_client（由 OldServer 在子进程中调用）"""
+    import run_server
+    source = subprocess.run(["git", "show", f"{revision}:{run_server.APP}"], cwd=testing.ROOT,
+                            capture_output=True, check=True).stdout
+    with tempfile.NamedTemporaryFile("wb", suffix=".py", delete=False) as f:
+        f.write(source)
+    try:
+        app = run_server.load_app(f.name)
+    finally:
+        os.remove(f.name)
+
+    async def main():
+        await asyncio.start_server(app["handle_client"], "127.0.0.1", port)
+        await asyncio.sleep(3600)
+
+    asyncio.run(main())
+
+
+class OldServer:
+    """在子进程中运行原来的实现，with 语句结束时停止"""
+
+    def __init__(self, revision):
+        self.port = testing.free_port()
+        self.args = [sys.executable, os.path.abspath(__file__), f"--serve-old={revision}", f"--port={self.port}"]
+        self.proc = None
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(self.args, cwd=testing.ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and self.proc.poll() is None:
+            try:
+                if testing.get(self.port, PATH, timeout=2)[0] == 200:
+                    return self
+            except OSError:
+                pass
+            time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError("old server did not start")
+
+    def __exit__(self, *exc):
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            self.proc.wait(5)
+
+
+def load(port):
+    """
+    各并发级别的压测结果
+    :return: {并发数: bench.run_scenario 的结果}
+    """
+    async def run():
+        await bench.run_scenario("127.0.0.1", port, PATH, 1, 20, 10)  # 预热
+        return {c: await bench.run_scenario("127.0.0.1", port, PATH, c, REQUESTS, 10) for c in LEVELS}
+    return asyncio.run(run())
+
+
+def send_segmented(port, request, size=7):
+    """把请求分成 size 字节的小段发送，返回响应的状态行"""
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as s:
+        for i in range(0, len(request), size):
+            s.sendall(request[i:i + size])
+            time.sleep(0.002)
+        return s.makefile("rb").readline()
+
+
+class HTTPLoadTest(unittest.TestCase):
+
+    def test_segmented_request(self):
+        request = b"GET /cache?x=%E4%BD%A0 HTTP/1.1\r\nHost: 127.0.0.1\r\nUser-Agent: load-test\r\nConnection: close\r\n\r\n"
+        with testing.DeviceServer() as server:
+            self.assertTrue(send_segmented(server.port, request).startswith(b"HTTP/1.1 200"))
+
+    def test_load_against_old_implementation(self):
+        revision = baseline_revision()
+        if revision is None:
+            self.skipTest("old implementation not found in git history")
+        with OldServer(revision) as old:
+            before = load(old.port)
+        with testing.DeviceServer() as server:
+            after = load(server.port)
+        for c in LEVELS:
+            old_r, new_r = before[c], after[c]
+            print(f"\nc={c}: old {old_r['rps']} req/s p99 {old_r['latency_ms']['p99']} ms "
+                  f"({old_r['connections']} connections), new {new_r['rps']} req/s "
+                  f"p99 {new_r['latency_ms']['p99']} ms ({new_r['connections']} connections)")
+            self.assertEqual(new_r["errors"], 0)
+            self.assertEqual(new_r["status"], {"200": REQUESTS})
+            self.assertGreater(new_r["rps"], 2 * old_r["rps"])
+            self.assertLess(new_r["latency_ms"]["p99"], old_r["latency_ms"]["p99"])
+            # keep-alive 连接每条最多处理 100 个请求
+            self.assertLessEqual(new_r["connections"], c + REQUESTS // 100)
+
+
+if __name__ == "__main__":
+    if any(arg.startswith("--serve-old=") for arg in sys.argv[1:]):
+        import mock_api
+        opts = mock_api.parse_args(sys.argv[1:], {"serve_old": "", "port": 8090})
+        serve_old(opts["serve_old"], opts["port"])
+    else:
+        unittest.main()
@@ -0,0 +1,162 @@
+# --------- 监控模式回放测试 ----------
+# 把 JPEG 序列（一个目录中按文件名排序的 *.jpg）按顺序交给 Monitor，代替实时采集，
+# 检查哪些帧触发了分析、调用了几次 API。结果只取决于录制的帧，可以反复回放。
+# 默认回放合成的录像（host/camera.py 的编码器生成，写入临时目录）：
+#   帧 1-10 空场景（亮度轻微闪烁）、11-15 物体移入、16-26 静止、27-30 移出、31-40 空场景、
+#   41-50 出现一个很小的物体（低于变化阈值）
+# 应只在物体移入并静止 K 帧、移出并静止 K 帧时各触发一次。
+# 回放设备上录制的序列（目录中可放 expected.json: {"triggers": [帧序号, ...]}）:
+#   python host/test_monitor_replay.py --record=http://192.168.1.50 --out=rec1 --frames=120 --interval-ms=500
+#   REPLAY_DIR=rec1 python host/test_monitor_replay.py
+# 运行: python host/test_monitor_replay.py
+
+import os
+import sys
+import json
+import tempfile
+import time
+import unittest
+import urllib.request
+
+import testing
+import camera
+import uasyncio as asyncio
+from monitor import Monitor, ChangeDetector
+
+WIDTH, HEIGHT = 320, 240
+SIDE = 10            # 物体边长（8x8 块）
+EXPECTED = [19, 34]  # 合成录像中应触发分析的帧序号
+# 与 AI物体识别3.0.py 中监控使用的参数相同
+DETECTOR = {"change_threshold": 3.0, "stable_threshold": 1.0, "stable_frames": 3}
+
+
+def synthetic_scene(index):
+    """第 index 帧（从 1 开始）每个 8x8 块的亮度"""
+    bw, bh = WIDTH // 8, HEIGHT // 8
+    flicker = 3 if index % 2 else -3
+    x0, side = None, SIDE
+    if 11 <= index <= 15:
+        x0 = (index - 11) * 4
+    elif 16 <= index <= 26:
+        x0 = 20
+    elif 27 <= index <= 30:
+        x0 = 20 + (index - 26) * 4
+    elif index >= 41:
+        x0, side = 5, 1
+    y0 = (bh - side) // 2
+    out = []
+    for by in range(bh):
+        for bx in range(bw):
+            if x0 is not None and x0 <= bx < x0 + side and y0 <= by < y0 + side:
+                out.append(230)
+            else:
+                out.append(50 + 100 * bx // bw + 40 * by // bh + flicker)
+    return out
+
+
+def write_synthetic(directory, count=50):
+    for i in range(1, count + 1):
+        with open(os.path.join(directory, f"{i:04d}.jpg"), "wb") as f:
+            f.write(camera.encode(WIDTH, HEIGHT, 12, synthetic_scene(i)))
+
+
+def load_sequence(directory):
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(".jpg"))
+    frames = []
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as f:
+            frames.append(f.read())
+    return frames
+
+
+def record(url, directory, count, interval_ms):
+    """从设备（或 host/run_server.py）的 /capture 录制 count 帧"""
+    os.makedirs(directory, exist_ok=True)
+    for i in range(1, count + 1):
+        start = time.monotonic()
+        with urllib.request.urlopen(url.rstrip("/") + "/capture", timeout=10) as resp:
+            data = resp.read()
+        with open(os.path.join(directory, f"{i:04d}.jpg"), "wb") as f:
+            f.write(data)
+        time.sleep(max(0, interval_ms / 1000 - (time.monotonic() - start)))
+    print(f"recorded {count} frames to {directory}")
+
+
+class ReplayFrames:
+    """按顺序给出录制的帧，代替 FrameSource；放完后 done 置位"""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.pos = 0
+        self.done = asyncio.Event()
+
+    async def next_after_now(self):
+        if self.pos >= len(self.frames):
+            self.done.set()
+            await asyncio.sleep(3600)
+        self.pos += 1
+        return self.pos, 0, self.frames[self.pos - 1]
+
+
+async def replay(frames):
+    """
+    用 Monitor 回放一段录像
+    :return: Monitor
+    """
+    source = ReplayFrames(frames)
+
+    async def analyze(image_data):
+        return f"analysis {source.pos}", False
+
+    monitor = Monitor(source, analyze, interval_ms=0, detector=ChangeDetector(**DETECTOR))
+    monitor.start()
+    await source.done.wait()
+    monitor.stop()
+    await asyncio.sleep(0)
+    return monitor
+
+
+class MonitorReplayTest(unittest.TestCase):
+
+    def check(self, frames, expected):
+        monitor = asyncio.run(replay(frames))
+        triggered = [event["frame_seq"] for event in monitor.events]
+        print(f"\n{len(frames)} frames, analysis at {triggered}, {monitor.api_calls} API calls")
+        self.assertEqual(monitor.checked, len(frames))
+        if expected is not None:
+            self.assertEqual(triggered, expected)
+            self.assertEqual(monitor.api_calls, len(expected))
+        for event in monitor.events:
+            self.assertEqual(event["analysis"], f"analysis {event['frame_seq']}")
+
+    def test_synthetic_recording(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_synthetic(directory)
+            self.check(load_sequence(directory), EXPECTED)
+
+    def test_replay_is_deterministic(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_synthetic(directory)
+            frames = load_sequence(directory)
+        first = asyncio.run(replay(frames))
+        second = asyncio.run(replay(frames))
+        self.assertEqual([e["frame_seq"] for e in first.events], [e["frame_seq"] for e in second.events])
+
+    @unittest.skipUnless(os.environ.get("REPLAY_DIR"), "REPLAY_DIR not set")
+    def test_recorded_sequence(self):
+        directory = os.environ["REPLAY_DIR"]
+        expected = None
+        path = os.path.join(directory, "expected.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                expected = json.load(f)["triggers"]
+        self.check(load_sequence(directory), expected)
+
+
+if __name__ == "__main__":
+    if any(arg.startswith("--record=") for arg in sys.argv[1:]):
+        import mock_api
+        opts = mock_api.parse_args(sys.argv[1:], {"record": "", "out": "recording", "frames": 100, "interval_ms": 500})
+        record(opts["record"], opts["out"], opts["frames"], opts["interval_ms"])
+    else:
+        unittest.main()
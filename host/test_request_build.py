@@ -0,0 +1,158 @@
+# --------- 请求体构建的耗时和内存 ----------
+# 比较原来的请求体构建方式与 llm_client 预编译模板在短提示词（8 字）和长提示词（4000 字）下
+# 每次构建的耗时（微秒）和 tracemalloc 测得的额外内存峰值（不含图片本身，图片以 Base64Body 发送时才编码）：
+#   文字请求   原来 本地AI.py 的 ask_llm：逐字符拼接转义后的字符串；现在 Backend.text_body
+#   图文请求   原来 AI物体识别3.0.py 的 build_vision_request：每次构建嵌套 dict 再 json.dumps 后按占位符切开；
+#              现在 Backend.vision_body
+# 同时检查含引号、反斜杠和控制字符的提示词生成的请求体是合法 JSON（原来的逐字符转义会漏掉控制字符）。
+# CPython 的 json.dumps 把中文写成 \uXXXX，长提示词的内存峰值两种方式相近；MicroPython 保留 UTF-8。
+# 运行: python host/test_request_build.py
+
+import json
+import time
+import tracemalloc
+import unittest
+
+import testing
+import async_http
+import llm_client
+from test_upload_memory import SinkWriter, run, peak
+
+SHORT = "这个物体是什么？"
+LONG = ("请详细描述画面中的垃圾种类、数量和位置，并给出分类建议。" * 140)[:4000]
+TRICKY = '引号"反斜杠\\换行\n制表\t回车\r\x01\x1f结束'
+IMAGE = b"\xff\xd8" + bytes(8000)
+IMAGE_SLOT = "@IMAGE_B64@"
+
+
+def old_text_body(prompt):
+    """原来的 ask_llm：请求头逐行拼接，提示词逐字符转义"""
+    headers = {"Authorization": "Bearer sk-test", "Content-Type": "application/json; charset=utf-8"}
+    payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": prompt}],
+               "max_tokens": 100, "temperature": 0.7}
+    json_payload = '{"model":"deepseek-chat","messages":[{"role":"user","content":"'
+    escaped_prompt = ""
+    for char in prompt:
+        if char == '"':
+            escaped_prompt += '\\"'
+        elif char == '\\':
+            escaped_prompt += '\\\\'
+        else:
+            escaped_prompt += char
+    json_payload += escaped_prompt
+    json_payload += '"}],"max_tokens":100,"temperature":0.7}'
+    head = ""
+    for name, value in headers.items():
+        head += "{}: {}\r\n".format(name, value)
+    return head.encode(), json_payload.encode('utf-8')
+
+
+def old_vision_body(image_data, prompt):
+    """原来的 build_vision_request：嵌套 dict 经 json.dumps 后按图片占位符切开"""
+    headers = {"Authorization": "Bearer sk-test", "Content-Type": "application/json"}
+    payload = {
+        "model": "moonshot-v1-8k-vision-preview",
+        "messages": [{"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + IMAGE_SLOT}},
+            {"type": "text", "text": prompt}
+        ]}],
+        "max_tokens": 500
+    }
+    pieces = json.dumps(payload).split(IMAGE_SLOT)
+    parts = [pieces[0].encode('utf-8'), async_http.Base64Body(image_data), pieces[1].encode('utf-8')]
+    head = ""
+    for name, value in headers.items():
+        head += "{}: {}\r\n".format(name, value)
+    return head.encode(), parts
+
+
+TEXT = llm_client.deepseek("sk-test")
+VISION = llm_client.moonshot("sk-test")
+
+
+def new_text_body(prompt):
+    return TEXT.headers, TEXT.text_body(prompt)
+
+
+def new_vision_body(image_data, prompt):
+    return VISION.headers, VISION.vision_body([image_data], prompt)
+
+
+def build_us(fn, *args):
+    """每次构建的平均耗时（微秒），至少运行 0.1 秒"""
+    count, start = 0, time.perf_counter()
+    while True:
+        fn(*args)
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed > 0.1 and count >= 20:
+            return elapsed / count * 1e6
+
+
+def body_bytes(parts):
+    """把请求体片段（bytes 或 Base64Body）写出为完整的字节"""
+    writer = SinkWriter(keep=True)
+
+    async def write():
+        for part in parts:
+            if isinstance(part, (bytes, bytearray, memoryview)):
+                writer.write(part)
+            else:
+                await part.write_to(writer)
+
+    run(write())
+    return bytes(writer.data)
+
+
+class RequestBuildTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracing = tracemalloc.is_tracing()
+        if not self.tracing:
+            tracemalloc.start()
+
+    def tearDown(self):
+        if not self.tracing:
+            tracemalloc.stop()
+
+    def measure(self, name, old, new, *args):
+        """:return: (原来的耗时, 现在的耗时, 原来的峰值, 现在的峰值)"""
+        old_peak, new_peak = peak(lambda: old(*args)), peak(lambda: new(*args))
+        # 测耗时时不开 tracemalloc，它会让每次分配都变慢
+        tracemalloc.stop()
+        try:
+            old_us, new_us = build_us(old, *args), build_us(new, *args)
+        finally:
+            tracemalloc.start()
+        print(f"\n{name}: {old_us:.1f} -> {new_us:.1f} us/build, peak {old_peak} -> {new_peak} B")
+        return old_us, new_us, old_peak, new_peak
+
+    def test_text_body(self):
+        old_us, new_us, old_peak, new_peak = self.measure("text, short prompt", old_text_body, new_text_body, SHORT)
+        self.assertLess(new_us, old_us)
+        self.assertLess(new_peak, old_peak)
+        # 逐字符拼接随提示词长度平方增长
+        old_us, new_us, _, _ = self.measure("text, long prompt", old_text_body, new_text_body, LONG)
+        self.assertLess(new_us * 3, old_us)
+
+    def test_vision_body(self):
+        old_us, new_us, old_peak, new_peak = self.measure(
+            "vision, short prompt", old_vision_body, new_vision_body, IMAGE, SHORT)
+        self.assertLess(new_us, old_us)
+        self.assertLess(new_peak, old_peak)
+        old_us, new_us, _, _ = self.measure("vision, long prompt", old_vision_body, new_vision_body, IMAGE, LONG)
+        self.assertLess(new_us, old_us)
+
+    def test_control_characters(self):
+        with self.assertRaises(ValueError):
+            json.loads(old_text_body(TRICKY)[1])
+        body = json.loads(body_bytes(new_text_body(TRICKY)[1]))
+        self.assertEqual(body["messages"][0]["content"], TRICKY)
+        parts = new_vision_body(IMAGE, TRICKY)[1]
+        data = body_bytes(parts)
+        self.assertEqual(len(data), sum(len(p) for p in parts))
+        self.assertEqual(json.loads(data)["messages"][0]["content"][-1]["text"], TRICKY)
+
+
+if __name__ == "__main__":
+    unittest.main()
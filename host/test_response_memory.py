@@ -0,0 +1,288 @@
+# --------- 发送响应时的内存峰值和吞吐 ----------
+# 模拟 MicroPython 1.22 的 StreamWriter（extmod/asyncio/stream.py 的 write / drain / awrite）：
+# socket.write() 只接收发送缓冲（lwIP TCP_SND_BUF，约 5.7 KB）放得下的部分，其余复制进 out_buf。
+# 在这个写入器上运行设备程序的路由（http_server.serve），用 tracemalloc 测每个请求的额外内存峰值，
+# 并统计每秒响应数 / 帧数和每个响应的 socket 写入次数：
+#   整帧写出   原来的做法：一次 awrite 整帧，发送缓冲放不下的部分整体复制，峰值约为帧大小
+#   /capture   write_body 按 WRITE_CHUNK 分块写出 memoryview，峰值与帧大小无关
+#   /jobs      小 JSON 与响应头在同一次写入中发出
+#   /stream    每个观看者复用一个帧头缓冲，连续推送时峰值不随帧数增长
+# 链路速率为 0 时不限速；限速时（默认 1 MB/s）写入器按速率腾出发送缓冲，帧率受链路限制。
+# 运行: python host/test_response_memory.py
+#       python host/test_response_memory.py --frame=12000 --rate=1000000   （只打印测量结果）
+
+import os
+import sys
+import time
+import tracemalloc
+import unittest
+
+import testing
+import uasyncio as asyncio
+import http_server
+import run_server
+
+SNDBUF = 5744        # lwIP TCP_SND_BUF（4 * MSS）
+FRAME_SIZE = 30000
+SLOW_RATE = 1000000  # 限速测量的链路速率（字节/秒）
+
+
+class Socket:
+    """发送缓冲为 SNDBUF 字节、按 rate 字节/秒发出的套接字，rate 为 0 时立即发出"""
+
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.level = 0
+        self.calls = 0
+        self.sent = 0
+        self._t = time.perf_counter()
+
+    def free(self):
+        now = time.perf_counter()
+        self.level = max(0, self.level - (now - self._t) * self.rate) if self.rate else 0
+        self._t = now
+        return SNDBUF - self.level
+
+    def write(self, buf):
+        """与 MicroPython 的非阻塞 socket.write 相同：返回写入的字节数，缓冲已满时返回 None"""
+        self.calls += 1
+        n = int(min(len(buf), self.free()))
+        if n <= 0:
+            return None
+        self.level += n
+        self.sent += n
+        return n
+
+    async def writable(self):
+        while self.free() < 536:
+            await asyncio.sleep((536 - self.free()) / self.rate)
+
+
+class MPWriter:
+    """MicroPython 1.22 StreamWriter 的 write / drain / awrite"""
+
+    def __init__(self, rate=0):
+        self.s = Socket(rate)
+        self.out_buf = b""
+
+    def write(self, buf):
+        if not self.out_buf:
+            ret = self.s.write(buf)
+            if ret == len(buf):
+                return
+            if ret is not None:
+                buf = buf[ret:]
+        self.out_buf += buf
+
+    async def drain(self):
+        if not self.out_buf:
+            return await asyncio.sleep(0)
+        mv = memoryview(self.out_buf)
+        off = 0
+        while off < len(mv):
+            await asyncio.sleep(0)
+            if self.s.rate:
+                await self.s.writable()
+            ret = self.s.write(mv[off:])
+            if ret is not None:
+                off += ret
+        self.out_buf = b""
+
+    async def awrite(self, buf, off=0, sz=-1):
+        if off != 0 or sz != -1:
+            buf = memoryview(buf)
+            if sz == -1:
+                sz = len(buf)
+            buf = buf[off:off + sz]
+        self.write(buf)
+        await self.drain()
+
+    def get_extra_info(self, name):
+        return ("127.0.0.1", 1)
+
+
+class Reader:
+    """从内存中的请求数据读取的 StreamReader"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    async def readline(self):
+        i = self.data.find(b"\n", self.pos)
+        end = len(self.data) if i < 0 else i + 1
+        line = self.data[self.pos:end]
+        self.pos = end
+        return line
+
+    async def read(self, n=-1):
+        data = self.data[self.pos:self.pos + n] if n >= 0 else self.data[self.pos:]
+        self.pos += len(data)
+        return data
+
+    async def readexactly(self, n):
+        return await self.read(n)
+
+
+class StubFrames:
+    """给出 count 帧后结束 /stream 的 FrameSource"""
+
+    def __init__(self, frame, count):
+        self.frame = frame
+        self.count = count
+        self.seq = 0
+        self.consumers = 0
+
+    def acquire(self):
+        pass
+
+    def release(self):
+        pass
+
+    async def next_frame(self, seq):
+        if self.seq >= self.count:
+            raise OSError("done")
+        self.seq += 1
+        return self.seq, 0, self.frame
+
+
+class StreamRequest:
+    client_ip = "127.0.0.1"
+
+    def param(self, name, default=None):
+        return default
+
+
+_app = []
+
+
+def load_app(frame):
+    """加载设备程序（只加载一次），/capture 固定返回 frame"""
+    if not _app:
+        cwd = os.getcwd()
+        os.chdir(testing.ROOT)
+        try:
+            _app.append(run_server.load_app(run_server.APP))
+        finally:
+            os.chdir(cwd)
+    app = _app[0]
+
+    async def fixed_frame(req, fresh=False):
+        return 7, 0, frame
+
+    app["get_frame"] = fixed_frame
+    app["boot"].is_ready = lambda name: True
+    app["print"] = lambda *args, **kwargs: None  # 处理函数每个请求都会打印
+    return app
+
+
+async def serve(app, path, count=1, rate=0):
+    """在一个 keep-alive 连接上处理 count 个 GET path，返回写入器"""
+    requests = b"GET " + path.encode() + b" HTTP/1.1\r\nHost: x\r\n\r\n"
+    writer = MPWriter(rate)
+    await http_server.serve(Reader(requests * count), writer, app["routes"])
+    return writer
+
+
+async def stream(app, frame, count, rate=0):
+    """/stream 推送 count 帧，返回写入器"""
+    app["frames"] = StubFrames(frame, count)
+    writer = MPWriter(rate)
+    await app["handle_stream"](StreamRequest(), http_server.Response(writer, False))
+    return writer
+
+
+async def peak(coro_fn, runs=9):
+    """await coro_fn() 期间新增内存峰值的中位数（字节），在同一个事件循环中运行，不含创建循环的开销"""
+    peaks = []
+    for _ in range(runs):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await coro_fn()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    return sorted(peaks)[len(peaks) // 2]
+
+
+async def rate_per_s(coro_fn, count):
+    """
+    执行一次 coro_fn()（处理 count 个响应 / 帧）
+    :return: (每秒个数, 写入器)
+    """
+    start = time.perf_counter()
+    writer = await coro_fn()
+    return count / (time.perf_counter() - start), writer
+
+
+async def measure(frame_size=FRAME_SIZE, rate=0):
+    """
+    各路径的测量结果
+    :return: {名称: (峰值字节, 每秒个数, 每个响应的 socket 写入次数)}
+    """
+    frame = os.urandom(frame_size)
+    app = load_app(frame)
+    count = 20 if rate else 90
+    results = {}
+
+    async def whole():
+        writer = MPWriter(rate)
+        await writer.awrite(frame)
+        return writer
+
+    tracing = tracemalloc.is_tracing()
+    for name, fn in (("whole frame", lambda n: whole()),
+                     ("/capture", lambda n: serve(app, "/capture", n, rate)),
+                     ("/jobs", lambda n: serve(app, "/jobs", n, rate)),
+                     ("/stream", lambda n: stream(app, frame, n, rate))):
+        await fn(1)  # 预热：编码缓存、首次分配
+        if not tracing:
+            tracemalloc.start()
+        try:
+            # /stream 测连续推送全部帧期间的峰值，其余测单个响应
+            high = await peak(lambda: fn(count if name == "/stream" else 1))
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        n = 1 if name == "whole frame" else count
+        per_s, writer = await rate_per_s(lambda: fn(n), n)
+        results[name] = (high, per_s, writer.s.calls / n)
+    return results
+
+
+def report(results, frame_size, rate):
+    print(f"\nframe {frame_size} B, link {rate / 1e6:.1f} MB/s" if rate else f"\nframe {frame_size} B, unlimited link")
+    for name, (high, per_s, calls) in results.items():
+        print(f"  {name:<12} peak {high:>7} B  {per_s:>9.0f} /s  socket writes {calls:.1f}")
+
+
+class ResponseMemoryTest(unittest.TestCase):
+
+    def check(self, frame_size, rate):
+        results = asyncio.run(measure(frame_size, rate))
+        report(results, frame_size, rate)
+        return results
+
+    def test_peak_does_not_grow_with_frame(self):
+        small, large = self.check(12000, 0), self.check(FRAME_SIZE, 0)
+        # 整帧写出时发送缓冲放不下的部分整体复制
+        self.assertGreater(large["whole frame"][0], FRAME_SIZE - SNDBUF)
+        for name in ("/capture", "/stream"):
+            self.assertLess(large[name][0], large["whole frame"][0] / 3)
+            self.assertLess(large[name][0] - small[name][0], 1024)
+        self.assertEqual(large["/jobs"][2], 1)
+
+    def test_slow_link(self):
+        results = self.check(FRAME_SIZE, SLOW_RATE)
+        for name in ("/capture", "/stream"):
+            # 最多一个 WRITE_CHUNK 留在 out_buf 中
+            self.assertLess(results[name][0], http_server.WRITE_CHUNK + 8 * 1024)
+        # 帧率受链路限制
+        self.assertLess(results["/stream"][1], SLOW_RATE / FRAME_SIZE * 1.2)
+
+
+if __name__ == "__main__":
+    if any(arg.startswith("--") for arg in sys.argv[1:]):
+        import mock_api
+        opts = mock_api.parse_args(sys.argv[1:], {"frame": FRAME_SIZE, "rate": 0})
+        report(asyncio.run(measure(opts["frame"], opts["rate"])), opts["frame"], opts["rate"])
+    else:
+        unittest.main()
@@ -0,0 +1,94 @@
+# --------- 启动时生成静态资源的 .gz ----------
+# 原文件比 .gz 新时 load() 会调用 gzip_file 重新压缩。用假的 deflate 模块模拟两种固件：
+#   只编译了解压支持   DeflateIO 没有 write()，压缩失败，随固件提供的 .gz 必须保留并继续使用
+#   带压缩支持         压缩结果写入临时文件后替换 .gz，内容与新的原文件一致
+# 运行: python host/test_static_assets.py
+
+import os
+import sys
+import gzip
+import tempfile
+import time
+import unittest
+
+import testing
+from static_assets import StaticAssets
+
+
+class DecompressOnly:
+    """只有解压功能的 deflate.DeflateIO"""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class Compressing(DecompressOnly):
+    """用 CPython 的 gzip 模块实现的 deflate.DeflateIO 压缩"""
+
+    def __init__(self, stream, fmt):
+        super().__init__(stream, fmt)
+        self.data = bytearray()
+
+    def write(self, buf):
+        self.data += buf
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.stream.write(gzip.compress(bytes(self.data)))
+
+
+class FakeDeflate:
+    GZIP = 3
+
+    def __init__(self, io_class):
+        self.DeflateIO = io_class
+
+
+class StaticAssetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.root = self.dir.name
+        self.src = os.path.join(self.root, "index.html")
+        self.gz = self.src + ".gz"
+        self.shipped = gzip.compress(b"<html>shipped</html>")
+        with open(self.gz, "wb") as f:
+            f.write(self.shipped)
+        with open(self.src, "wb") as f:
+            f.write(b"<html>edited</html>")
+        # 原文件比 .gz 新，load() 会尝试重新压缩
+        old = time.time() - 60
+        os.utime(self.gz, (old, old))
+
+    def tearDown(self):
+        sys.modules.pop("deflate", None)
+        self.dir.cleanup()
+
+    def load(self, io_class):
+        sys.modules["deflate"] = FakeDeflate(io_class)
+        assets = StaticAssets(self.root)
+        assets.add("/", "index.html", "text/html")
+        assets.load()
+        return assets.assets["/"]
+
+    def test_failed_compression_keeps_shipped_gz(self):
+        asset = self.load(DecompressOnly)
+        self.assertEqual(asset.gz, self.shipped)
+        with open(self.gz, "rb") as f:
+            self.assertEqual(f.read(), self.shipped)
+        self.assertEqual(sorted(os.listdir(self.root)), ["index.html", "index.html.gz"])
+
+    def test_compression_replaces_gz(self):
+        asset = self.load(Compressing)
+        self.assertEqual(gzip.decompress(asset.gz), b"<html>edited</html>")
+        self.assertEqual(sorted(os.listdir(self.root)), ["index.html", "index.html.gz"])
+
+
+if __name__ == "__main__":
+    unittest.main()
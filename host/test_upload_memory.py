@@ -0,0 +1,117 @@
+# --------- 上传图片时的内存峰值 ----------
+# 用 tracemalloc 比较两种请求体编码在 QVGA / VGA 帧上的额外内存峰值（不含图片本身）：
+#   整体编码   原来的做法：b2a_base64 整帧、拼出 data URL、json.dumps、encode，约为帧大小的数倍
+#   流式编码   llm_client 的请求体片段经 async_http 写出，Base64Body 分块编码，峰值为一个块加上请求头等固定开销，与帧大小无关
+# 同时检查流式写出的请求体与整体编码的 JSON 内容相同、Content-Length 正确。
+# 运行: python host/test_upload_memory.py
+
+import binascii
+import json
+import tracemalloc
+import unittest
+
+import testing
+import camera
+import async_http
+import llm_client
+
+PROMPT = "请描述这张图片的内容"
+MODEL = "moonshot-v1-8k-vision-preview"
+
+
+class SinkWriter:
+    """只统计字节数的 StreamWriter；keep=True 时保存写出的内容"""
+
+    def __init__(self, keep=False):
+        self.size = 0
+        self.data = bytearray() if keep else None
+
+    def write(self, buf):
+        self.size += len(buf)
+        if self.data is not None:
+            self.data += buf
+
+    async def drain(self):
+        pass
+
+
+def frame(size):
+    camera.init(framesize=size, quality=12)
+    return camera.capture()
+
+
+def whole_body(image_data):
+    """原来的做法：整帧 base64、data URL、JSON 字符串和字节各有一份"""
+    image_b64 = binascii.b2a_base64(image_data).decode('utf-8').strip()
+    payload = {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}},
+            {"type": "text", "text": PROMPT}
+        ]}],
+        "max_tokens": 500
+    }
+    return json.dumps(payload).encode('utf-8')
+
+
+def stream_body(writer, image_data):
+    backend = llm_client.moonshot("sk-test", url="http://127.0.0.1/v1/chat/completions", model=MODEL)
+    parts = backend.vision_body([image_data], PROMPT)
+    return async_http._send(writer, "POST", "/v1/chat/completions", "127.0.0.1", backend.headers, parts, True)
+
+
+def run(coro):
+    """执行协程：SinkWriter 从不等待，不需要事件循环，测得的内存只属于请求体的编码和写出"""
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError("coroutine suspended")
+
+
+def peak(fn):
+    """fn() 执行期间新增内存的峰值（字节）"""
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    return tracemalloc.get_traced_memory()[1] - base
+
+
+class UploadMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracing = tracemalloc.is_tracing()
+        if not self.tracing:
+            tracemalloc.start()
+
+    def tearDown(self):
+        if not self.tracing:
+            tracemalloc.stop()
+
+    def test_stream_body_matches_whole_body(self):
+        image_data = frame(camera.FRAME_QVGA)
+        writer = SinkWriter(keep=True)
+        run(stream_body(writer, image_data))
+        head, _, body = bytes(writer.data).partition(b"\r\n\r\n")
+        self.assertIn(b"\r\nContent-Length: %d" % len(body), head + b"\r\n")
+        self.assertEqual(json.loads(body), json.loads(whole_body(image_data)))
+
+    def test_peak_allocation(self):
+        results = {}
+        for name, size in (("QVGA", camera.FRAME_QVGA), ("VGA", camera.FRAME_VGA)):
+            image_data = frame(size)
+            whole = peak(lambda: whole_body(image_data))
+            stream = peak(lambda: run(stream_body(SinkWriter(), image_data)))
+            results[name] = (len(image_data), whole, stream)
+            print(f"\n{name}: frame {len(image_data)} B, whole-body peak {whole} B "
+                  f"({whole / len(image_data):.1f}x), streaming peak {stream} B")
+            self.assertGreater(whole, 4 * len(image_data))
+            self.assertLess(stream, 12 * 1024)
+        # 流式编码的峰值不随帧大小增长
+        qvga, vga = results["QVGA"], results["VGA"]
+        self.assertGreater(vga[0], 2 * qvga[0])
+        self.assertLess(vga[2] - qvga[2], 2048)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# --------- 电脑上运行的测试的公共部分 ----------
+# host/test_*.py 用标准库 unittest 编写，在仓库根目录运行:
+#   python -m unittest discover -s host -v
+#   python host/test_upload_memory.py          （单个文件）
+# 导入本模块时安装兼容层（不开 tracemalloc，需要统计内存的测试自己开启），
+# 并调整 sys.path：host/ 下的模拟模块优先，其次是仓库根目录的设备代码。
+
+import sys
+import os
+import json
+import socket
+import subprocess
+import tempfile
+import time
+import http.client
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HOST_DIR)
+for _path in (ROOT, HOST_DIR):
+    if _path in sys.path:
+        sys.path.remove(_path)
+    sys.path.insert(0, _path)
+
+import compat
+compat.install(False)
+
+
+def free_port():
+    """系统分配的空闲端口"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(port, path, timeout=30):
+    """
+    GET 一次（每次新建连接）
+    :return: (状态码, 响应体, 耗时毫秒)
+    """
+    start = time.monotonic()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        body = resp.read()
+        return resp.status, body, (time.monotonic() - start) * 1000
+    finally:
+        conn.close()
+
+
+class DeviceServer:
+    """
+    在子进程中用 host/run_server.py 运行设备程序（同一进程内带模拟 API），摄像头就绪后返回，with 语句结束时停止
+    端口由系统分配，输出写入临时文件，启动失败时附在异常信息中
+    """
+
+    def __init__(self, **options):
+        """
+        :param options: run_server.py 的选项，如 latency_ms=1500、error_rate=1
+        """
+        self.port = free_port()
+        self.api_port = free_port()
+        self.args = [sys.executable, os.path.join(HOST_DIR, "run_server.py"),
+                     f"--port={self.port}", f"--api-port={self.api_port}", "--trace-memory=0"]
+        for key, value in options.items():
+            self.args.append(f"--{key.replace('_', '-')}={value}")
+        self.proc = None
+        self.log = None
+
+    def __enter__(self):
+        self.log = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(self.args, cwd=ROOT, stdout=self.log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                break
+            try:
+                status, body, _ = get(self.port, "/status", timeout=2)
+                if status == 200 and json.loads(body)["status"] == "ready":
+                    return self
+            except OSError:
+                pass
+            time.sleep(0.2)
+        output = self.output()
+        self.__exit__(None, None, None)
+        raise RuntimeError("device server did not start:\n" + output)
+
+    def __exit__(self, *exc):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def output(self):
+        """子进程的输出（调试用）"""
+        if self.log is None:
+            return ""
+        self.log.seek(0)
+        return self.log.read().decode("utf-8", "replace")
+
+    def get(self, path, timeout=30):
+        return get(self.port, path, timeout)
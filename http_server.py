@@ -0,0 +1,406 @@
+import time
+import json
+import uasyncio as asyncio
+import metrics
+
+# --------- 设备端 HTTP/1.1 服务器 ----------
+# 逐行增量读取请求行和请求头（请求被拆成多个 TCP 分段也能正确处理），
+# 按路由表分发，并支持 keep-alive：浏览器可以用同一条连接依次请求主页、/capture、/analyze。
+# 响应头在预分配的缓冲中填写，不拼接字符串；响应体以 memoryview 切片分块写出，不复制（如摄像头帧）。
+
+MAX_LINE = 2048          # 请求行 / 单个请求头的最大长度
+MAX_HEADERS = 32         # 请求头数量上限
+MAX_BODY = 4096          # 请求体上限
+KEEPALIVE_TIMEOUT = 10   # keep-alive 连接的空闲超时（秒）
+KEEPALIVE_MAX = 100      # 单个连接最多处理的请求数
+HEAD_SIZE = 1024         # 预分配的响应头缓冲；响应体放得下时与响应头一次写出
+WRITE_CHUNK = 4096       # 较大的响应体按块写出，套接字发送缓冲一次收不下时 uasyncio 只需暂存一块
+
+STATUS_TEXT = {
+    101: "Switching Protocols",
+    200: "OK",
+    202: "Accepted",
+    204: "No Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    426: "Upgrade Required",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+class HeadBuffer:
+    """
+    预分配的响应头缓冲
+    填好后直接写出其中的 memoryview，写出后即可复用：awrite 在第一次让出之前就把数据交给套接字
+    或复制到发送缓冲中，所以填写和写出之间没有 await 时，多个连接可以共用同一个缓冲
+    """
+
+    def __init__(self, size=HEAD_SIZE):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.n = 0
+
+    def reset(self):
+        self.n = 0
+
+    def room(self):
+        return len(self.buf) - self.n
+
+    def add(self, data):
+        """追加字节（超出缓冲时抛出 ValueError）"""
+        end = self.n + len(data)
+        if end > len(self.buf):
+            raise ValueError("response head too large")
+        self.buf[self.n:end] = data
+        self.n = end
+
+    def add_int(self, value):
+        """追加非负整数的十进制 ASCII，不生成字符串"""
+        digits = 1
+        rest = value
+        while rest >= 10:
+            rest //= 10
+            digits += 1
+        end = self.n + digits
+        if end > len(self.buf):
+            raise ValueError("response head too large")
+        i = end
+        while i > self.n:
+            i -= 1
+            self.buf[i] = 48 + value % 10
+            value //= 10
+        self.n = end
+
+    def add_header(self, name, value):
+        self.add(_cached(_header_names, name, _header_name))
+        if type(value) is int and value >= 0:
+            self.add_int(value)
+        else:
+            self.add(str(value).encode('utf-8'))
+        self.add(b"\r\n")
+
+    def view(self):
+        return self.mv[:self.n]
+
+
+# 编码后的固定部分：状态行、Content-Type 行、响应头名称（各最多缓存 _CACHE_MAX 项）
+_CACHE_MAX = 24
+_status_lines = {}
+_type_lines = {}
+_header_names = {}
+
+
+def _cached(cache, key, encode):
+    data = cache.get(key)
+    if data is None:
+        data = encode(key)
+        if len(cache) < _CACHE_MAX:
+            cache[key] = data
+    return data
+
+
+def _status_line(status):
+    return "HTTP/1.1 {} {}\r\n".format(status, STATUS_TEXT.get(status, "")).encode('utf-8')
+
+
+def _type_line(content_type):
+    return "Content-Type: {}\r\n".format(content_type).encode('utf-8')
+
+
+def _header_name(name):
+    return (name + ": ").encode('utf-8')
+
+
+_shared_head = HeadBuffer()
+
+
+async def write_body(writer, data):
+    """
+    写出响应体：较大的数据按 WRITE_CHUNK 以 memoryview 切片写出，不复制 data
+    （一次写出整帧时，套接字收不下的部分会被 uasyncio 整块复制到发送缓冲中）
+    """
+    n = len(data)
+    if n <= WRITE_CHUNK:
+        await writer.awrite(data)
+        return
+    mv = memoryview(data)
+    for off in range(0, n, WRITE_CHUNK):
+        await writer.awrite(mv[off:off + WRITE_CHUNK])
+
+
+def unquote(data):
+    """
+    URL 解码，按 % 分段处理而不是逐字节遍历
+    :param data: 编码后的字符串（字节形式）
+    :return: 解码后的字符串（UTF-8）
+    """
+    data = data.replace(b"+", b" ")
+    if b"%" not in data:
+        return data.decode('utf-8', 'ignore')
+    parts = data.split(b"%")
+    out = bytearray(parts[0])
+    for part in parts[1:]:
+        try:
+            if len(part) < 2:
+                raise ValueError
+            out.append(int(part[:2], 16))
+            out.extend(part[2:])
+        except ValueError:
+            # 不是合法的 %XX，保留原字符
+            out.extend(b"%")
+            out.extend(part)
+    return out.decode('utf-8', 'ignore')
+
+
+def parse_query(query):
+    """
+    解析查询字符串
+    :param query: a=1&b=2 形式的字节串
+    :return: 参数字典，同名参数取第一个
+    """
+    params = {}
+    if query:
+        for pair in query.split(b"&"):
+            name, _, value = pair.partition(b"=")
+            name = unquote(name)
+            if name and name not in params:
+                params[name] = unquote(value)
+    return params
+
+
+class Request:
+    """解析后的 HTTP 请求"""
+
+    def __init__(self, method, target, version, headers, client_ip):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.client_ip = client_ip
+        self.body = b""
+        path, _, query = target.partition(b"?")
+        self.path = unquote(path)
+        self.query = parse_query(query)
+
+    def param(self, name, default=None):
+        """查询参数"""
+        return self.query.get(name, default)
+
+    def header(self, name, default=None):
+        """请求头（名称小写）"""
+        return self.headers.get(name, default)
+
+    @property
+    def keep_alive(self):
+        conn = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.1":
+            return conn != "close"
+        return conn == "keep-alive"
+
+
+async def _readline(reader):
+    line = await reader.readline()
+    if len(line) > MAX_LINE:
+        raise BadRequest("line too long")
+    return line
+
+
+async def read_request(reader, client_ip):
+    """
+    增量读取一个请求
+    :return: Request，连接在请求开始前关闭时返回 None
+    :raises BadRequest: 请求格式错误
+    """
+    line = await _readline(reader)
+    while line == b"\r\n":  # 容忍请求之间多余的空行
+        line = await _readline(reader)
+    if not line:
+        return None
+    parts = line.split()
+    if len(parts) != 3:
+        raise BadRequest("bad request line")
+    method, target, version = parts
+
+    headers = {}
+    while True:
+        line = await _readline(reader)
+        if not line:
+            raise BadRequest("connection closed in headers")
+        if line == b"\r\n" or line == b"\n":
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise BadRequest("too many headers")
+        name, _, value = line.decode('utf-8', 'ignore').partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    req = Request(method.decode(), target, version.decode(), headers, client_ip)
+    length = int(headers.get("content-length", 0) or 0)
+    if length > MAX_BODY:
+        raise BadRequest("body too large")
+    if length:
+        req.body = await reader.readexactly(length)
+    return req
+
+
+class Response:
+    """
+    响应写出器
+    send() 发送带 Content-Length 的完整响应，连接可继续复用；
+    start_stream() 用于 SSE / MJPEG 等持续输出，upgrade() 切换到 WebSocket 等协议，之后都会关闭连接
+    """
+
+    def __init__(self, writer, keep_alive, reader=None):
+        self.writer = writer
+        self.reader = reader
+        self.keep_alive = keep_alive
+        self.sent = False
+        self.status = None
+
+    def _head(self, status, content_type, length, headers):
+        """
+        在共用的响应头缓冲中填写响应头
+        :return: HeadBuffer，须在下一次 await 之前写出
+        """
+        head = _shared_head
+        head.reset()
+        head.add(_cached(_status_lines, status, _status_line))
+        if content_type:
+            head.add(_cached(_type_lines, content_type, _type_line))
+        if length is not None:
+            head.add(b"Content-Length: ")
+            head.add_int(length)
+            head.add(b"\r\n")
+        head.add(b"Connection: keep-alive\r\n" if self.keep_alive else b"Connection: close\r\n")
+        if headers:
+            for name, value in headers.items():
+                head.add_header(name, value)
+        head.add(b"\r\n")
+        return head
+
+    async def send(self, body=b"", status=200, content_type="text/plain; charset=utf-8", headers=None):
+        """
+        发送完整响应
+        :param body: 响应体（str 按 UTF-8 编码）
+        :param status: 状态码
+        :param content_type: Content-Type
+        :param headers: 额外的响应头字典
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        start = time.ticks_ms()
+        self.sent = True
+        self.status = status
+        # 204/304 不带 Content-Length
+        head = self._head(status, content_type, None if status in (204, 304) else len(body), headers)
+        if body and len(body) <= head.room():
+            # 小响应（JSON、错误信息）一次写出，不分成两个 TCP 分段
+            head.add(body)
+            body = None
+        await self.writer.awrite(head.view())
+        if body:
+            await write_body(self.writer, body)
+        metrics.since("write", start)
+
+    async def send_head(self, status, content_type, length, headers=None):
+        """只发送响应头，之后由调用方向 self.writer 写入 length 字节的响应体（可用 write_body）"""
+        self.sent = True
+        self.status = status
+        await self.writer.awrite(self._head(status, content_type, length, headers).view())
+
+    async def send_json(self, data, status=200, headers=None):
+        await self.send(json.dumps(data), status, "application/json; charset=utf-8", headers)
+
+    async def start_stream(self, content_type, status=200, headers=None):
+        """发送流式响应头（无 Content-Length），之后直接写 self.writer"""
+        self.keep_alive = False
+        self.sent = True
+        self.status = status
+        await self.writer.awrite(self._head(status, content_type, None, headers).view())
+
+    async def upgrade(self, protocol, headers=None):
+        """发送 101 切换协议，之后由调用方直接读写 self.reader / self.writer"""
+        self.keep_alive = False
+        self.sent = True
+        self.status = 101
+        head = _shared_head
+        head.reset()
+        head.add(_cached(_status_lines, 101, _status_line))
+        head.add_header("Upgrade", protocol)
+        head.add(b"Connection: Upgrade\r\n")
+        if headers:
+            for name, value in headers.items():
+                head.add_header(name, value)
+        head.add(b"\r\n")
+        await self.writer.awrite(head.view())
+
+
+class Router:
+    """
+    路由表：精确路径用字典查找，前缀路由（如 /result/）按注册顺序匹配
+    处理函数签名为 async def handler(req, resp)
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = []
+        self.fallback = None
+
+    def add(self, path, handler, method="GET", prefix=False):
+        if prefix:
+            self.prefixes.append((method, path, handler))
+        else:
+            self.exact[(method, path)] = handler
+
+    def match(self, method, path):
+        """
+        :return: (路由名, 处理函数)，路由名用于统计（前缀路由为注册时的前缀，兜底为 "*"）
+        """
+        handler = self.exact.get((method, path))
+        if handler is not None:
+            return path, handler
+        for m, p, h in self.prefixes:
+            if m == method and path.startswith(p):
+                return p, h
+        return "*", self.fallback
+
+
+async def serve(reader, writer, router):
+    """
+    处理一个连接上的全部请求（keep-alive）
+    连接关闭、超时或出现流式响应后返回
+    """
+    client_ip = writer.get_extra_info('peername')[0]
+    for n in range(KEEPALIVE_MAX):
+        try:
+            req = await asyncio.wait_for(read_request(reader, client_ip), KEEPALIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return
+        except BadRequest as e:
+            await Response(writer, False).send(str(e), 400)
+            return
+        if req is None:
+            return
+        start = time.ticks_ms()
+        resp = Response(writer, req.keep_alive and n < KEEPALIVE_MAX - 1, reader)
+        route, handler = router.match(req.method, req.path)
+        try:
+            if handler is None:
+                await resp.send("Not Found", 404)
+            else:
+                await handler(req, resp)
+                if not resp.sent:
+                    await resp.send(status=204)
+        finally:
+            # 流式响应在客户端断开时以异常结束，同样计入
+            metrics.request_done(route, resp.status, time.ticks_diff(time.ticks_ms(), start))
+        if not resp.keep_alive:
+            return
@@ -0,0 +1,150 @@
+import time
+import uasyncio as asyncio
+
+# --------- 分析任务队列 ----------
+# /analyze 只负责入队并返回任务 id，由固定数量的工作协程执行，
+# 限制同时进行的 API 调用数，避免多个客户端同时请求时耗尽内存。
+# 相同键（同一帧 + 同一提示词）的任务合并为一个。
+
+class Job:
+    """一个分析任务"""
+
+    def __init__(self, job_id, key, runner):
+        self.id = job_id
+        self.key = key
+        self.runner = runner
+        self.state = "pending"  # pending / running / done / failed
+        self.result = None
+        self.error = None
+        self.merged = 0
+        self.created = time.ticks_ms()
+        self.started = None
+        self.finished = None
+        self._event = asyncio.Event()
+
+    async def wait(self):
+        """等待任务完成（成功或失败）"""
+        await self._event.wait()
+
+    def info(self):
+        data = {"job_id": self.id, "status": self.state}
+        if self.state == "done":
+            data["result"] = self.result
+        elif self.state == "failed":
+            data["error"] = self.error
+        if self.started is not None:
+            data["wait_ms"] = time.ticks_diff(self.started, self.created)
+        return data
+
+
+class JobQueue:
+    """
+    有界任务队列 + 固定数量的工作协程
+    """
+
+    def __init__(self, workers=1, max_pending=4, keep_done=16):
+        """
+        :param workers: 并发执行的任务数
+        :param max_pending: 排队任务上限，超过时 submit() 返回 None
+        :param keep_done: 保留供 /result 查询的已完成任务数
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep_done = keep_done
+        self.jobs = {}       # id -> Job（排队、运行中和最近完成的任务）
+        self._pending = []
+        self._done = []      # 已完成任务 id，按完成顺序
+        self._next_id = 1
+        self._wake = asyncio.Event()
+        self._tasks = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.merged = 0
+        self.rejected = 0
+        self.total_wait_ms = 0
+        self.max_wait_ms = 0
+        self.total_run_ms = 0
+
+    def submit(self, key, runner):
+        """
+        提交任务
+        :param key: 去重键，键相同且尚未完成的任务会被合并；None 表示不去重
+        :param runner: 无参协程函数，返回值作为任务结果
+        :return: Job（可能是已有的同键任务），队列已满时返回 None
+        """
+        if key is not None:
+            for job in self.jobs.values():
+                if job.key == key and job.state in ("pending", "running"):
+                    job.merged += 1
+                    self.merged += 1
+                    return job
+        if len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            return None
+        if not self._tasks:
+            for _ in range(self.workers):
+                self._tasks.append(asyncio.create_task(self._worker()))
+        job = Job(self._next_id, key, runner)
+        self._next_id += 1
+        self.jobs[job.id] = job
+        self._pending.append(job)
+        self._wake.set()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def retry_after(self):
+        """估算队列空出位置需要的秒数，用于 429 的 Retry-After"""
+        finished = self.completed + self.failed
+        avg_run_ms = self.total_run_ms // finished if finished else 5000
+        return max(1, (len(self._pending) // self.workers + 1) * avg_run_ms // 1000)
+
+    async def _worker(self):
+        while True:
+            if not self._pending:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            job = self._pending.pop(0)
+            job.state = "running"
+            job.started = time.ticks_ms()
+            wait_ms = time.ticks_diff(job.started, job.created)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.running += 1
+            try:
+                job.result = await job.runner()
+                job.state = "done"
+                self.completed += 1
+            except Exception as e:
+                job.error = str(e)
+                job.state = "failed"
+                self.failed += 1
+            self.running -= 1
+            job.runner = None
+            job.finished = time.ticks_ms()
+            self.total_run_ms += time.ticks_diff(job.finished, job.started)
+            job._event.set()
+            self._retire(job)
+
+    def _retire(self, job):
+        self._done.append(job.id)
+        while len(self._done) > self.keep_done:
+            self.jobs.pop(self._done.pop(0), None)
+
+    def stats(self):
+        """队列深度与等待时间统计"""
+        started = self.completed + self.failed + self.running
+        return {
+            "workers": self.workers,
+            "pending": len(self._pending),
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "merged": self.merged,
+            "rejected": self.rejected,
+            "avg_wait_ms": self.total_wait_ms // started if started else 0,
+            "max_wait_ms": self.max_wait_ms
+        }
@@ -0,0 +1,255 @@
+import jpeg_features
+
+# --------- JPEG 无损裁剪 ----------
+# 按 MCU（8 或 16 像素）对齐裁剪 baseline JPEG，不做 IDCT、不重新压缩：
+# 只 Huffman 解码一遍，把区域内各块的系数按原来的 Huffman 表重新写出。
+# AC 系数原样照抄，只有 DC 系数因为是相对前一个块的差值编码，需要在新的块序列中重新计算差值。
+# 一遍解码可以同时裁出多个区域（分块上传），区域下方的数据不再解码。
+# 画质与原图完全相同，上传字节数与像素数（即视觉模型的图片 token 数）都按裁剪面积减少。
+
+
+class _BitWriter:
+    """熵编码数据的位写入器，0xFF 后补 0x00"""
+
+    def __init__(self):
+        self.out = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value, n):
+        # 每次不超过 16 位，累加器保持在 24 位以内（MicroPython 小整数）
+        self.acc = (self.acc << n) | value
+        self.nbits += n
+        while self.nbits >= 8:
+            self.nbits -= 8
+            b = (self.acc >> self.nbits) & 0xFF
+            self.out.append(b)
+            if b == 0xFF:
+                self.out.append(0)
+        self.acc &= (1 << self.nbits) - 1
+
+    def flush(self):
+        """末尾不足一字节的部分用 1 填充"""
+        if self.nbits:
+            self.write((1 << (8 - self.nbits)) - 1, 8 - self.nbits)
+
+
+def _encoder(table):
+    """由解码用的 Huffman 表生成编码表：符号 -> (码字, 码长)"""
+    codes = {}
+    for length in range(1, 17):
+        if table.maxcode[length] < 0:
+            continue
+        first = table.valptr[length]
+        for j in range(table.maxcode[length] - table.mincode[length] + 1):
+            codes[table.symbols[first + j]] = (table.mincode[length] + j, length)
+    return codes
+
+
+def _segments(data):
+    """
+    扫描段之前需要原样保留的段（DQT、DHT）以及 SOF、SOS 的位置
+    :return: (保留段的字节串列表, SOF 段起始位置, SOS 段起始位置)
+    """
+    keep = []
+    sof = sos = None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        end = pos + 2 + ((data[pos + 2] << 8) | data[pos + 3])
+        if marker in (0xDB, 0xC4):
+            keep.append(data[pos:end])
+        elif marker in (0xC0, 0xC1):
+            sof = pos
+        elif marker == 0xDA:
+            sos = pos
+            break
+        pos = end
+    return keep, sof, sos
+
+
+class Region:
+    """
+    裁剪区域（像素，按 MCU 对齐后的实际范围）
+    x, y, w, h 为在原图中的位置和大小
+    """
+
+    def __init__(self, x, y, w, h):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+
+    def to_frame(self, box, normalized=False):
+        """
+        把区域内的坐标框映射回原图坐标
+        :param box: (x1, y1, x2, y2)，区域内的像素坐标，normalized=True 时为 0..1 的相对坐标
+        :return: 原图中的 (x1, y1, x2, y2) 像素坐标
+        """
+        x1, y1, x2, y2 = box
+        if normalized:
+            x1, x2 = x1 * self.w, x2 * self.w
+            y1, y2 = y1 * self.h, y2 * self.h
+        return (int(x1) + self.x, int(y1) + self.y, int(x2) + self.x, int(y2) + self.y)
+
+    def info(self):
+        return {"x": self.x, "y": self.y, "w": self.w, "h": self.h}
+
+
+def align(width, height, mcu_w, mcu_h, x, y, w, h):
+    """
+    把像素矩形向外扩展到 MCU 边界并限制在图像内
+    :return: (起始 MCU 列, 起始 MCU 行, 结束 MCU 列, 结束 MCU 行)，结束不含；区域为空时返回 None
+    """
+    x0 = max(0, x) // mcu_w
+    y0 = max(0, y) // mcu_h
+    x1 = (min(width, x + w) + mcu_w - 1) // mcu_w
+    y1 = (min(height, y + h) + mcu_h - 1) // mcu_h
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+
+def crop_steps(data, rects):
+    """
+    crop 的分步版本（生成器）：每解码完一行 MCU 产出一次 None，最后产出 crop 的结果
+    :raises ValueError: 不支持的 JPEG
+    """
+    info = jpeg_features.parse_headers(data)
+    comps = info["components"]
+    scan = info["scan"]
+    by_id = {}
+    for c in comps:
+        by_id[c[0]] = c
+    hmax = max(c[1] for c in comps)
+    vmax = max(c[2] for c in comps)
+    width, height = info["width"], info["height"]
+    single = len(scan) == 1
+    if single:
+        # 非交织扫描（灰度图）：每个 MCU 只有一个 8x8 块
+        if len(comps) != 1:
+            raise ValueError("unsupported JPEG (non-interleaved colour)")
+        mcu_w = mcu_h = 8
+    else:
+        mcu_w, mcu_h = 8 * hmax, 8 * vmax
+    mcux = (width + mcu_w - 1) // mcu_w
+    mcuy = (height + mcu_h - 1) // mcu_h
+
+    # 每个扫描分量: [H, V, DC 表, AC 表, 预测值, DC 编码表, AC 编码表]
+    units = []
+    for cid, td, ta in scan:
+        c = by_id[cid]
+        h, v = (1, 1) if single else (c[1], c[2])
+        dc, ac = info["dc"][td], info["ac"][ta]
+        units.append([h, v, dc, ac, 0, _encoder(dc), _encoder(ac)])
+
+    # 每个区域: [MCU 范围, 位写入器, 各分量的 DC 预测值, Region]
+    outs = []
+    last_row = 0
+    for x, y, w, h in rects:
+        box = align(width, height, mcu_w, mcu_h, x, y, w, h)
+        if box is None:
+            raise ValueError("empty crop region")
+        rx, ry = box[0] * mcu_w, box[1] * mcu_h
+        region = Region(rx, ry, min(width, box[2] * mcu_w) - rx, min(height, box[3] * mcu_h) - ry)
+        outs.append([box, _BitWriter(), [0] * len(units), region])
+        last_row = max(last_row, box[3])
+
+    reader = jpeg_features._BitReader(data, info["scan_pos"])
+    restart = info["restart"]
+    todo = restart
+    for my in range(last_row):
+        # 当前 MCU 行涉及的区域
+        row_outs = [o for o in outs if o[0][1] <= my < o[0][3]]
+        for mx in range(mcux):
+            if restart:
+                if todo == 0:
+                    reader.restart()
+                    for u in units:
+                        u[4] = 0
+                    todo = restart
+                todo -= 1
+            targets = [o for o in row_outs if o[0][0] <= mx < o[0][2]]
+            for ui in range(len(units)):
+                u = units[ui]
+                dc_table, ac_table = u[2], u[3]
+                for _ in range(u[0] * u[1]):
+                    s = reader.decode(dc_table)
+                    u[4] += reader.receive_extend(s)
+                    if targets:
+                        # 在新的块序列中重新计算 DC 差值
+                        for o in targets:
+                            diff = u[4] - o[2][ui]
+                            o[2][ui] = u[4]
+                            mag = diff if diff >= 0 else -diff
+                            size = 0
+                            while mag:
+                                size += 1
+                                mag >>= 1
+                            entry = u[5].get(size)
+                            if entry is None:
+                                # 按图片优化过的 Huffman 表可能没有新差值所需的码字
+                                raise ValueError("DC category missing from Huffman table")
+                            o[1].write(entry[0], entry[1])
+                            if size:
+                                o[1].write(diff if diff >= 0 else diff + (1 << size) - 1, size)
+                    k = 1
+                    while k < 64:
+                        rs = reader.decode(ac_table)
+                        s = rs & 15
+                        extra = reader.bits(s)
+                        for o in targets:
+                            code, length = u[6][rs]
+                            o[1].write(code, length)
+                            if s:
+                                o[1].write(extra, s)
+                        if s == 0:
+                            if rs != 0xF0:
+                                break  # EOB
+                            k += 16
+                            continue
+                        k += (rs >> 4) + 1
+        yield None
+
+    keep, sof, sos = _segments(data)
+    sof_seg = data[sof:sof + 2 + ((data[sof + 2] << 8) | data[sof + 3])]
+    sos_seg = data[sos:info["scan_pos"]]
+    results = []
+    for box, writer, _, region in outs:
+        writer.flush()
+        head = bytearray(sof_seg)
+        head[5] = region.h >> 8
+        head[6] = region.h & 0xFF
+        head[7] = region.w >> 8
+        head[8] = region.w & 0xFF
+        parts = [b"\xff\xd8"] + keep + [head, sos_seg, writer.out, b"\xff\xd9"]
+        results.append((b"".join(parts), region))
+    yield results
+
+
+def crop(data, rects):
+    """
+    裁剪出一个或多个区域
+    :param data: baseline JPEG 数据
+    :param rects: [(x, y, w, h)] 像素矩形，向外扩展到 MCU 边界
+    :return: [(JPEG 数据, Region)]，与 rects 顺序相同
+    :raises ValueError: 不支持的 JPEG 或区域为空
+    """
+    for result in crop_steps(data, rects):
+        pass
+    return result
+
+
+def mcu_size(data):
+    """MCU 的像素尺寸 (宽, 高)"""
+    info = jpeg_features.parse_headers(data)
+    comps = info["components"]
+    if len(info["scan"]) == 1:
+        return 8, 8
+    return 8 * max(c[1] for c in comps), 8 * max(c[2] for c in comps)
@@ -0,0 +1,301 @@
+# --------- JPEG 低分辨率特征 ----------
+# 只做 Huffman 解码、取每个 8x8 块的 DC 系数，不做 IDCT。
+# DC 系数就是块的平均亮度/色度，相当于免费得到一张 1/8 分辨率的缩略图，
+# 可以在设备上廉价地计算感知哈希、帧差等。只支持 baseline JPEG（摄像头输出格式）。
+
+class _Huffman:
+    """Huffman 表：8 位以内的码字查表，更长的码字按标准流程逐位比较"""
+
+    def __init__(self, counts, symbols):
+        self.symbols = symbols
+        self.fast = [0] * 256  # (码长 << 8) | 符号，0 表示不在快表中
+        self.maxcode = [-1] * 17
+        self.valptr = [0] * 17
+        self.mincode = [0] * 17
+        code = 0
+        k = 0
+        for length in range(1, 17):
+            n = counts[length - 1]
+            self.valptr[length] = k
+            self.mincode[length] = code
+            for _ in range(n):
+                if length <= 8:
+                    shift = 8 - length
+                    base = code << shift
+                    for i in range(1 << shift):
+                        self.fast[base + i] = (length << 8) | symbols[k]
+                code += 1
+                k += 1
+            self.maxcode[length] = code - 1 if n else -1
+            code <<= 1
+
+
+class _BitReader:
+    """熵编码数据的位读取器，处理 0xFF00 字节填充和 RST 标记"""
+
+    def __init__(self, data, pos):
+        self.data = data
+        self.pos = pos
+        self.acc = 0
+        self.nbits = 0
+
+    def _fill(self):
+        data = self.data
+        # 保持在 24 位以内，避免 MicroPython 上出现大整数分配
+        while self.nbits <= 16:
+            b = 0xFF
+            if self.pos < len(data):
+                b = data[self.pos]
+                if b == 0xFF:
+                    if self.pos + 1 < len(data) and data[self.pos + 1] == 0:
+                        self.pos += 2
+                    else:
+                        b = 0xFF  # 遇到标记：不前进，补 1 位
+                else:
+                    self.pos += 1
+            self.acc = ((self.acc << 8) | b) & 0xFFFFFF
+            self.nbits += 8
+
+    def bits(self, n):
+        if n == 0:
+            return 0
+        if self.nbits < n:
+            self._fill()
+        self.nbits -= n
+        return (self.acc >> self.nbits) & ((1 << n) - 1)
+
+    def decode(self, table):
+        if self.nbits < 16:
+            self._fill()
+        entry = table.fast[(self.acc >> (self.nbits - 8)) & 0xFF]
+        if entry:
+            self.nbits -= entry >> 8
+            return entry & 0xFF
+        length = 9
+        code = (self.acc >> (self.nbits - 9)) & 0x1FF
+        while code > table.maxcode[length]:
+            length += 1
+            if length > 16:
+                raise ValueError("bad huffman code")
+            code = (self.acc >> (self.nbits - length)) & ((1 << length) - 1)
+        self.nbits -= length
+        return table.symbols[table.valptr[length] + code - table.mincode[length]]
+
+    def receive_extend(self, s):
+        v = self.bits(s)
+        if s and v < (1 << (s - 1)):
+            v -= (1 << s) - 1
+        return v
+
+    def restart(self):
+        """丢弃剩余位并跳过 RSTn 标记"""
+        self.acc = 0
+        self.nbits = 0
+        data = self.data
+        while self.pos + 1 < len(data):
+            if data[self.pos] == 0xFF and 0xD0 <= data[self.pos + 1] <= 0xD7:
+                self.pos += 2
+                return
+            self.pos += 1
+
+
+def parse_headers(data):
+    """
+    解析 JPEG 头部
+    :param data: JPEG 数据
+    :return: 头部信息字典：width、height、components、qt、dc/ac 表、restart、scan 位置等
+    :raises ValueError: 不是 baseline JPEG
+    """
+    if data[0] != 0xFF or data[1] != 0xD8:
+        raise ValueError("not a JPEG")
+    info = {"qt": {}, "dc": {}, "ac": {}, "restart": 0}
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        length = (data[pos + 2] << 8) | data[pos + 3]
+        seg = pos + 4
+        end = pos + 2 + length
+        if marker == 0xDB:  # DQT
+            while seg < end:
+                pq, tq = data[seg] >> 4, data[seg] & 15
+                info["qt"][tq] = data[seg + 1] if pq == 0 else (data[seg + 1] << 8) | data[seg + 2]
+                seg += 65 if pq == 0 else 129
+        elif marker == 0xC0 or marker == 0xC1:  # SOF0 / SOF1
+            info["height"] = (data[seg + 1] << 8) | data[seg + 2]
+            info["width"] = (data[seg + 3] << 8) | data[seg + 4]
+            comps = []
+            for i in range(data[seg + 5]):
+                c = seg + 6 + i * 3
+                comps.append([data[c], data[c + 1] >> 4, data[c + 1] & 15, data[c + 2]])
+            info["components"] = comps  # [id, H, V, 量化表]
+        elif 0xC2 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            raise ValueError("unsupported JPEG (progressive/lossless)")
+        elif marker == 0xC4:  # DHT
+            while seg < end:
+                tc, th = data[seg] >> 4, data[seg] & 15
+                counts = data[seg + 1:seg + 17]
+                n = sum(counts)
+                table = _Huffman(counts, data[seg + 17:seg + 17 + n])
+                info["ac" if tc else "dc"][th] = table
+                seg += 17 + n
+        elif marker == 0xDD:  # DRI
+            info["restart"] = (data[seg] << 8) | data[seg + 1]
+        elif marker == 0xDA:  # SOS
+            scan = []
+            for i in range(data[seg]):
+                c = seg + 1 + i * 2
+                scan.append((data[c], data[c + 1] >> 4, data[c + 1] & 15))
+            info["scan"] = scan  # (分量 id, DC 表, AC 表)
+            info["scan_pos"] = end
+            if "components" not in info:
+                raise ValueError("missing SOF")
+            return info
+        pos = end
+    raise ValueError("no scan found")
+
+
+def decode_dc(data):
+    """
+    解码第一个扫描段中各分量每个 8x8 块的 DC 系数
+    :param data: baseline JPEG 数据
+    :return: (width, height, planes)，planes 按 SOF 中分量顺序排列，
+             每项为 (列数, 行数, bytearray)，值为块的平均值 0..255
+    :raises ValueError: 不支持的 JPEG
+    """
+    for result in decode_dc_steps(data):
+        pass
+    return result
+
+
+def decode_dc_steps(data):
+    """
+    decode_dc 的分步版本（生成器）：每解码完一行 MCU 产出一次 None，最后产出 decode_dc 的结果
+    异步任务可以在两行之间让出事件循环，大图解码时不会长时间阻塞
+    :raises ValueError: 不支持的 JPEG
+    """
+    info = parse_headers(data)
+    comps = info["components"]
+    scan = info["scan"]
+    by_id = {}
+    for c in comps:
+        by_id[c[0]] = c
+    hmax = max(c[1] for c in comps)
+    vmax = max(c[2] for c in comps)
+    width, height = info["width"], info["height"]
+
+    single = len(scan) == 1
+    if single:
+        # 非交织扫描：每个 MCU 只有一个块
+        c = by_id[scan[0][0]]
+        mcux = (width * c[1] // hmax + 7) // 8
+        mcuy = (height * c[2] // vmax + 7) // 8
+    else:
+        mcux = (width + 8 * hmax - 1) // (8 * hmax)
+        mcuy = (height + 8 * vmax - 1) // (8 * vmax)
+
+    # 每个扫描分量: [H, V, DC 表, AC 表, 预测值, 列数, 平面, 量化 DC 步长]
+    units = []
+    planes = {}
+    for cid, td, ta in scan:
+        c = by_id[cid]
+        h, v = (1, 1) if single else (c[1], c[2])
+        cols, rows = mcux * h, mcuy * v
+        plane = bytearray(cols * rows)
+        planes[cid] = (cols, rows, plane)
+        units.append([h, v, info["dc"][td], info["ac"][ta], 0, cols, plane, info["qt"].get(c[3], 1)])
+
+    reader = _BitReader(data, info["scan_pos"])
+    restart = info["restart"]
+    todo = restart
+    for my in range(mcuy):
+        for mx in range(mcux):
+            if restart:
+                if todo == 0:
+                    reader.restart()
+                    for u in units:
+                        u[4] = 0
+                    todo = restart
+                todo -= 1
+            for u in units:
+                h, v, dc_table, ac_table = u[0], u[1], u[2], u[3]
+                for by in range(v):
+                    for bx in range(h):
+                        s = reader.decode(dc_table)
+                        u[4] += reader.receive_extend(s)
+                        # 跳过 AC 系数
+                        k = 1
+                        while k < 64:
+                            rs = reader.decode(ac_table)
+                            s = rs & 15
+                            if s == 0:
+                                if rs != 0xF0:
+                                    break  # EOB
+                                k += 16
+                                continue
+                            k += (rs >> 4) + 1
+                            reader.bits(s)
+                        # DC * 量化步长 / 8 即块均值（电平平移 128）
+                        value = (u[4] * u[7] >> 3) + 128
+                        u[6][(my * v + by) * u[5] + mx * h + bx] = 0 if value < 0 else 255 if value > 255 else value
+        yield None
+    yield width, height, [planes[c[0]] for c in comps if c[0] in planes]
+
+
+def luma(data):
+    """
+    亮度缩略图
+    :return: (列数, 行数, bytearray)
+    """
+    return decode_dc(data)[2][0]
+
+
+def resample(cols, rows, plane, out_cols, out_rows):
+    """
+    按区域平均把平面缩放到 out_cols x out_rows
+    :return: 长度为 out_cols * out_rows 的整数列表
+    """
+    out = []
+    for oy in range(out_rows):
+        y0 = oy * rows // out_rows
+        y1 = max(y0 + 1, (oy + 1) * rows // out_rows)
+        for ox in range(out_cols):
+            x0 = ox * cols // out_cols
+            x1 = max(x0 + 1, (ox + 1) * cols // out_cols)
+            total = 0
+            for y in range(y0, y1):
+                row = y * cols
+                for x in range(x0, x1):
+                    total += plane[row + x]
+            out.append(total // ((y1 - y0) * (x1 - x0)))
+    return out
+
+
+def dhash(data):
+    """
+    基于亮度缩略图的 64 位差值哈希（dHash）
+    :param data: JPEG 数据
+    :return: 64 位整数
+    """
+    cols, rows, plane = luma(data)
+    return dhash_plane(cols, rows, plane)
+
+
+def dhash_plane(cols, rows, plane):
+    """已解码亮度平面的 dHash（与 local_classifier 等共用一次 DC 解码）"""
+    cells = resample(cols, rows, plane, 9, 8)
+    h = 0
+    for y in range(8):
+        for x in range(8):
+            h = (h << 1) | (cells[y * 9 + x] > cells[y * 9 + x + 1])
+    return h
+
+
+def hamming(a, b):
+    """两个哈希之间的汉明距离"""
+    return bin(a ^ b).count("1")
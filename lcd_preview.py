@@ -0,0 +1,262 @@
+import time
+import uasyncio as asyncio
+import jpeg_features
+import metrics
+
+# --------- LCD 实时预览 ----------
+# 在板载 SPI LCD 上显示摄像头画面，底部显示最近一次分析结果。
+# 不做完整 JPEG 解码：用 JPEG 的 DC 系数（每个 8x8 块的平均亮度）缩放成灰度马赛克，
+# 与上次显示的内容比较，只重画亮度变化超过阈值的格子，同一行相邻且颜色相同的格子合并成一个矩形；
+# 文字区只在文字变化时重画。
+# 每帧的绘制时间不超过帧周期的一半，绘制过程中定期让出事件循环，SPI 传输不会挡住 HTTP 请求。
+# 启动和文字更新后的 active_ms 内预览自己保持采集，之后只显示其他消费者（视频流、监控等）采集到的帧，
+# 不让摄像头一直工作，按需采集照样省电。
+
+BLACK = 0x0000
+WHITE = 0xFFFF
+
+
+def gray565(v):
+    """0..255 的灰度转 RGB565"""
+    r = v >> 3
+    return (r << 11) | ((v >> 2) << 5) | r
+
+
+def wrap_text(text, width, max_lines):
+    """
+    按显示宽度折行（ASCII 算 1 格，其他字符算 2 格）
+    :param width: 每行格数
+    :return: 行列表，超出 max_lines 的部分截掉，最后一行以 ".." 结尾
+    """
+    lines = []
+    line = ""
+    used = 0
+    for ch in text:
+        if ch == "\n":
+            lines.append(line)
+            line, used = "", 0
+            continue
+        w = 1 if ord(ch) < 128 else 2
+        if used + w > width:
+            lines.append(line)
+            line, used = "", 0
+        line += ch
+        used += w
+    if line:
+        lines.append(line)
+    if len(lines) > max_lines:
+        lines = lines[:max_lines]
+        lines[-1] = lines[-1][:-2] + ".."
+    return lines
+
+
+class Preview:
+    """
+    LCD 预览任务
+    显示对象需要 fill(x0, y0, x1, y1, color)（坐标含端点）和 string(x, y, w, h, size, text, color)
+    """
+
+    def __init__(self, display, frames, fps=4, cell=8, level=12, text_lines=3, font=16, yield_every=16, decode_rows=4,
+                 active_ms=30000):
+        """
+        :param display: atk_lcd.init() 返回的显示对象，可稍后通过 attach() 设置
+        :param frames: FrameSource 采集源
+        :param fps: 最高刷新帧率
+        :param cell: 马赛克格子边长（像素）
+        :param level: 格子亮度变化超过该值（0..255）才重画
+        :param text_lines: 底部文字区行数
+        :param font: 字号（像素高度，ASCII 字符宽为一半）
+        :param yield_every: 每画多少个矩形让出一次事件循环
+        :param decode_rows: 解码 JPEG 时每多少行 MCU 让出一次事件循环
+        :param active_ms: 启动或文字更新后保持采集的时长，None 表示一直采集
+        """
+        self.frames = frames
+        self.active_ms = active_ms
+        self._woken = time.ticks_ms()
+        self.interval_ms = 1000 // fps
+        self.cell = cell
+        self.level = level
+        self.text_lines = text_lines
+        self.font = font
+        self.yield_every = yield_every
+        self.decode_rows = decode_rows
+        self.text = ""
+        self.display = None
+        self.attach(display)
+        # 统计
+        self.drawn = 0       # 刷新的帧数
+        self.skipped = 0     # 画面无变化、没有重画任何格子的帧数
+        self.rects = 0       # fill 调用次数
+        self.cells = 0       # 重画的格子数
+        self.bytes = 0       # 推送到 LCD 的像素字节数（RGB565）
+        self.text_updates = 0
+        self._task = None
+
+    def attach(self, display):
+        """设置显示对象，并按屏幕尺寸计算布局"""
+        self.display = display
+        if display is None:
+            return
+        self.width = getattr(display, "width", 320)
+        self.height = getattr(display, "height", 240)
+        self.text_top = self.height - self.text_lines * self.font
+        self.cols = self.width // self.cell
+        self.rows = self.text_top // self.cell
+        self.shown = bytearray(self.cols * self.rows)
+        self._full = True
+        self._text_dirty = True
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    @property
+    def active(self):
+        """是否在自己保持采集的时段内"""
+        return self.active_ms is None or time.ticks_diff(time.ticks_ms(), self._woken) < self.active_ms
+
+    def wake(self):
+        """从现在起 active_ms 内保持采集，显示实时画面"""
+        self._woken = time.ticks_ms()
+
+    def start(self):
+        if self._task is None and self.display is not None:
+            self.wake()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def set_text(self, text):
+        """更新底部文字，下一帧时重画"""
+        if text != self.text:
+            self.text = text
+            self._text_dirty = True
+            self.wake()
+
+    def redraw(self):
+        """下一帧整屏重画"""
+        self._full = True
+        self._text_dirty = True
+
+    async def _run(self):
+        held = False  # 是否登记为采集消费者
+        try:
+            seq = 0
+            while True:
+                active = self.active
+                if active != held:
+                    if active:
+                        self.frames.acquire()
+                    else:
+                        self.frames.release()
+                    held = active
+                try:
+                    frame = await asyncio.wait_for(self.frames.next_frame(seq), self.interval_ms / 1000)
+                except asyncio.TimeoutError:
+                    frame = None  # 没有人采集，只更新文字
+                start = time.ticks_ms()
+                try:
+                    if frame is not None:
+                        seq, _, buf = frame
+                        await self.render(buf)
+                    await self.draw_text()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Preview error: {e}")
+                if frame is None:
+                    continue
+                elapsed = time.ticks_diff(time.ticks_ms(), start)
+                metrics.observe("lcd", elapsed)
+                # 限制帧率；绘制较慢时至少空出同样长的时间给其他任务
+                await asyncio.sleep_ms(max(self.interval_ms - elapsed, elapsed))
+        finally:
+            if held:
+                self.frames.release()
+
+    async def render(self, image_data):
+        """
+        把一帧画到图像区，只重画变化的格子
+        :param image_data: JPEG 数据
+        :return: 重画的格子数
+        :raises ValueError: JPEG 无法解析
+        """
+        # 分步解码，每 decode_rows 行 MCU 让出一次事件循环
+        n = 0
+        for result in jpeg_features.decode_dc_steps(image_data):
+            n += 1
+            if n % self.decode_rows == 0:
+                await asyncio.sleep_ms(0)
+        cols, rows, plane = result[2][0]
+        grid = jpeg_features.resample(cols, rows, plane, self.cols, self.rows)
+        shown = self.shown
+        full = self._full
+        level = self.level
+        cell = self.cell
+        fill = self.display.fill
+        drawn = 0
+        rects = 0
+        for y in range(self.rows):
+            row = y * self.cols
+            y0 = y * cell
+            run_start = -1
+            run_value = 0
+            for x in range(self.cols + 1):
+                if x < self.cols:
+                    # 量化到 RGB565 能表示的 32 级灰度，平坦区域的格子颜色相同，可以合并
+                    v = grid[row + x] & 0xF8
+                    d = v - shown[row + x]
+                    changed = full or d > level or d < -level
+                else:
+                    changed = False
+                if run_start >= 0 and (not changed or v != run_value):
+                    fill(run_start * cell, y0, x * cell - 1, y0 + cell - 1, gray565(run_value))
+                    rects += 1
+                    drawn += x - run_start
+                    self.bytes += (x - run_start) * cell * cell * 2
+                    run_start = -1
+                    if rects % self.yield_every == 0:
+                        await asyncio.sleep_ms(0)
+                if changed:
+                    shown[row + x] = v
+                    if run_start < 0:
+                        run_start = x
+                        run_value = v
+        self._full = False
+        self.rects += rects
+        self.cells += drawn
+        if drawn:
+            self.drawn += 1
+        else:
+            self.skipped += 1
+        return drawn
+
+    async def draw_text(self):
+        """文字有变化时重画文字区"""
+        if not self._text_dirty:
+            return
+        self._text_dirty = False
+        d = self.display
+        d.fill(0, self.text_top, self.width - 1, self.height - 1, BLACK)
+        self.bytes += self.width * (self.height - self.text_top) * 2
+        lines = wrap_text(self.text, self.width * 2 // self.font, self.text_lines)
+        for i, line in enumerate(lines):
+            await asyncio.sleep_ms(0)
+            d.string(0, self.text_top + i * self.font, self.width, self.font, self.font, line, WHITE)
+            self.bytes += len(line) * self.font * self.font  # 每个字符 font/2 x font 像素
+        self.text_updates += 1
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "active": self.running and self.active,
+            "frames": self.drawn,
+            "skipped": self.skipped,
+            "rects": self.rects,
+            "cells": self.cells,
+            "bytes": self.bytes,
+            "text_updates": self.text_updates
+        }
@@ -0,0 +1,439 @@
+import time
+import json
+import gc
+import random
+import uasyncio as asyncio
+import async_http
+import metrics
+from circuit_breaker import HALF_OPEN
+
+# --------- 大模型 API 客户端 ----------
+# DeepSeek、Moonshot 以及本地 OpenAI 兼容服务共用的请求代码。
+# 每个后端在创建时预先生成请求头字节和请求体模板，发送时只需拼接
+# 模板片段 + 转义后的提示词 + 流式 base64 图片，不再每次 json.dumps 嵌套字典。
+
+CONTENT_SLOT = '"@CONTENT@"'  # 模板中消息内容的位置
+
+
+def json_string(text):
+    """
+    把字符串转成 JSON 字符串字面量（含引号）
+    json.dumps 由固件用 C 实现：线性时间，并正确转义引号、反斜杠、换行和其他控制字符
+    """
+    return json.dumps(text)
+
+
+class Backend:
+    """
+    一个 OpenAI 兼容的聊天补全接口
+    请求头和请求体模板只生成一次
+    """
+
+    def __init__(self, name, url, api_key=None, model="", max_tokens=500, extra=None):
+        """
+        :param name: 后端名称（用于日志）
+        :param url: chat/completions 接口地址
+        :param api_key: API 密钥，本地服务可为 None
+        :param model: 模型名
+        :param max_tokens: 最大生成长度
+        :param extra: 请求体中的其他字段，如 {"temperature": 0.7}
+        """
+        self.name = name
+        self.url = url
+        self.model = model
+        head = "Content-Type: application/json; charset=utf-8\r\n"
+        if api_key:
+            head += f"Authorization: Bearer {api_key}\r\n"
+        self.headers = head.encode('utf-8')
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": "@CONTENT@"}],
+            "max_tokens": max_tokens
+        }
+        if extra:
+            payload.update(extra)
+        # (前缀, 后缀)，下标 0 为普通模式，1 为流式模式
+        self.templates = []
+        for stream in (False, True):
+            if stream:
+                payload["stream"] = True
+            prefix, suffix = json.dumps(payload).split(CONTENT_SLOT, 1)
+            self.templates.append((prefix.encode('utf-8'), suffix.encode('utf-8')))
+
+    def text_body(self, prompt, stream=False):
+        """
+        纯文本请求体
+        :return: 请求体片段列表
+        """
+        prefix, suffix = self.templates[stream]
+        return [prefix, json_string(prompt).encode('utf-8'), suffix]
+
+    def vision_body(self, images, prompt, labels=None, stream=False):
+        """
+        图文请求体：每张图片一个 image_url 片段，最后是共用的文字提示
+        图片以 Base64Body 流式编码，多张图片依次发送，不同时出现在内存中
+        :param images: JPEG 数据列表
+        :param labels: 每张图片前的说明文字，可为 None
+        :return: 请求体片段列表
+        """
+        prefix, suffix = self.templates[stream]
+        parts = [prefix, b"["]
+        for i, image_data in enumerate(images):
+            if labels:
+                parts.append(_TEXT_PART_START + json_string(labels[i]).encode('utf-8') + b"},")
+            parts.append(_IMAGE_PART_START)
+            parts.append(async_http.Base64Body(image_data))
+            parts.append(_IMAGE_PART_END)
+        parts.append(_TEXT_PART_START + json_string(prompt).encode('utf-8') + b"}]")
+        parts.append(suffix)
+        return parts
+
+
+_IMAGE_PART_START = b'{"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,'
+_IMAGE_PART_END = b'"}},'
+_TEXT_PART_START = b'{"type": "text", "text": '
+
+
+# 可以重试的 HTTP 状态码：超时、限流、服务端错误
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class APIError(Exception):
+    """
+    API 调用失败，str() 为错误信息（兼容原来的 "API ..." 字符串）
+    kind: "http"、"timeout"、"network"、"circuit_open"、"invalid_response"、"internal"
+    """
+
+    def __init__(self, message, kind, provider=None, status=None, retryable=False, retry_after_ms=None, phase=None):
+        super().__init__(message)
+        self.message = message
+        self.kind = kind
+        self.provider = provider
+        self.status = status
+        self.retryable = retryable
+        self.retry_after_ms = retry_after_ms
+        self.phase = phase
+        self.attempts = 1
+
+    def __str__(self):
+        return self.message
+
+    def info(self):
+        """结构化的错误信息，用于 JSON 响应"""
+        return {
+            "kind": self.kind,
+            "message": self.message,
+            "provider": self.provider,
+            "status": self.status,
+            "phase": self.phase,
+            "retryable": self.retryable,
+            "attempts": self.attempts
+        }
+
+
+class ClientGone(Exception):
+    """
+    流式调用中 on_delta 写给客户端时出错（浏览器断开等）：结束本次调用，
+    不是服务端的问题，不计入失败和熔断，也不重试、不转到备用后端
+    """
+
+    def __init__(self, error):
+        super().__init__(f"client gone: {error}")
+        self.error = error
+
+
+def _retry_after_ms(headers):
+    """Retry-After 响应头（秒数形式）转为毫秒"""
+    value = headers.get("retry-after")
+    try:
+        return int(value) * 1000 if value else None
+    except ValueError:
+        return None
+
+
+def parse_api_error(status, raw_response, provider=None, headers=None):
+    """
+    从非200响应中提取错误信息
+    :return: APIError，信息形如 "API error 401: ..."
+    """
+    try:
+        error_data = json.loads(raw_response)
+        error_msg = error_data.get("error", {}).get("message", "Unknown error")
+        message = f"API error {status}: {error_msg}"
+    except:
+        message = f"API error {status}: {raw_response[:200]}"
+    return APIError(message, "http", provider, status, status in RETRY_STATUSES,
+                    _retry_after_ms(headers) if headers else None)
+
+
+def is_api_failure(result):
+    """判断结果是否为错误"""
+    return isinstance(result, APIError)
+
+
+class LLMClient:
+    """
+    调用一个后端，返回值约定：
+    普通模式返回回复文本，流式模式成功返回 None，出错时返回 APIError
+    每次尝试受各阶段超时约束，整个调用受 total_ms 约束；
+    可重试的错误（超时、网络错误、429/5xx）按带随机抖动的指数退避重试，
+    连续失败时熔断器断开，直接失败或转到备用后端；
+    流式模式下 on_delta 出错时抛出 ClientGone
+    """
+
+    def __init__(self, backend, pool=None, on_timing=None, timeouts=None, total_ms=45000,
+                 retries=2, backoff_ms=500, max_backoff_ms=4000, breaker=None, fallback=None):
+        """
+        :param backend: Backend
+        :param pool: async_http.ConnectionPool，复用 keep-alive 连接
+        :param on_timing: 每次成功调用后回调 on_timing(请求体字节数, 上传毫秒, 总毫秒)
+        :param timeouts: async_http.Timeouts，各阶段超时
+        :param total_ms: 整个调用（含重试）的时限
+        :param retries: 最多重试次数
+        :param backoff_ms: 第一次重试前的最长等待，之后逐次加倍（实际等待在 0 到该值之间随机）
+        :param max_backoff_ms: 单次等待的上限
+        :param breaker: circuit_breaker.CircuitBreaker，None 表示不熔断
+        :param fallback: 主后端失败或熔断时使用的备用 LLMClient
+        """
+        self.backend = backend
+        self.pool = pool
+        self.on_timing = on_timing
+        self.timeouts = timeouts or async_http.Timeouts()
+        self.total_ms = total_ms
+        self.retries = retries
+        self.backoff_ms = backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.breaker = breaker
+        self.fallback = fallback
+        # 统计
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.timeouts_hit = 0
+        self.fallbacks = 0
+        self.clients_gone = 0
+        self.last_error = None
+
+    async def ask(self, prompt, on_delta=None):
+        """
+        文本提问
+        :param on_delta: 提供时使用流式模式，每段增量文本 await on_delta(text)
+        """
+        print(f"\nSending request to {self.backend.name}...")
+        stream = on_delta is not None
+        return await self._call(lambda backend: backend.text_body(prompt, stream), on_delta)
+
+    async def vision(self, images, prompt, labels=None, on_delta=None):
+        """
+        图片分析
+        :param images: JPEG 数据，或多张图片的列表（放在同一条消息中）
+        :param labels: 多张图片时每张图片的说明文字
+        :param on_delta: 提供时使用流式模式，每段增量文本 await on_delta(text)
+        """
+        if not isinstance(images, list):
+            images = [images]
+        print(f"\nSending {len(images)} image(s), {sum(len(b) for b in images)} bytes to {self.backend.name}...")
+        stream = on_delta is not None
+        return await self._call(lambda backend: backend.vision_body(images, prompt, labels, stream), on_delta)
+
+    async def _call(self, make_body, on_delta):
+        """
+        带重试、熔断和备用后端的调用
+        :param make_body: make_body(backend) -> 请求体片段列表（备用后端用自己的模板重新生成）
+        """
+        self.calls += 1
+        name = self.backend.name
+        if self.breaker is not None and not self.breaker.allow():
+            error = APIError(f"API circuit open for {name}, retry in {self.breaker.retry_in_ms() // 1000 + 1} s",
+                             "circuit_open", name, retryable=True)
+            return await self._give_up(error, make_body, on_delta, False)
+
+        delivered = [False]
+        relay = None
+        if on_delta is not None:
+            # 已经转发过内容的流式调用不能重试，否则客户端会收到重复的文本
+            async def relay(text):
+                delivered[0] = True
+                try:
+                    await on_delta(text)
+                except Exception as e:
+                    raise ClientGone(e)
+
+        body = make_body(self.backend)
+        start = time.ticks_ms()
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = self.total_ms - time.ticks_diff(time.ticks_ms(), start)
+            try:
+                result = await asyncio.wait_for(self._attempt(body, relay), max(1, remaining) / 1000)
+            except asyncio.TimeoutError:
+                result = APIError(f"API request timed out after {self.total_ms} ms", "timeout", name,
+                                  retryable=True, phase="total")
+            except ClientGone:
+                self.clients_gone += 1
+                print(f"{name}: client disconnected, stream abandoned")
+                # 已经收到过回复，服务端是正常的；半开时须结束这次试探，否则熔断器一直拒绝调用
+                if self.breaker is not None and self.breaker.state == HALF_OPEN:
+                    self.breaker.success()
+                raise
+            if not isinstance(result, APIError):
+                if self.breaker is not None:
+                    self.breaker.success()
+                return result
+
+            result.attempts = attempt
+            if result.kind == "timeout":
+                self.timeouts_hit += 1
+            if self.breaker is not None:
+                # 客户端错误（401、400 等）说明服务本身可用，不计入熔断
+                if result.retryable:
+                    self.breaker.failure()
+                else:
+                    self.breaker.success()
+            if (not result.retryable or delivered[0] or attempt > self.retries
+                    or (self.breaker is not None and self.breaker.retry_in_ms() > 0)):
+                break
+            delay = self._backoff(attempt, result)
+            if time.ticks_diff(time.ticks_ms(), start) + delay >= self.total_ms:
+                break
+            self.retried += 1
+            print(f"{name}: {result}, retry {attempt}/{self.retries} in {delay} ms")
+            await asyncio.sleep_ms(delay)
+        return await self._give_up(result, make_body, on_delta, delivered[0])
+
+    def _backoff(self, attempt, error):
+        """第 attempt 次失败后的等待时间：全随机抖动的指数退避，服务端给出 Retry-After 时不早于它"""
+        cap = min(self.max_backoff_ms, self.backoff_ms << (attempt - 1))
+        delay = cap * random.getrandbits(16) >> 16
+        if error.retry_after_ms:
+            delay = max(delay, min(error.retry_after_ms, self.max_backoff_ms))
+        return delay
+
+    async def _give_up(self, error, make_body, on_delta, delivered):
+        """主后端放弃时转到备用后端（可重试的错误、且尚未向客户端输出内容）"""
+        self.failures += 1
+        self.last_error = error
+        if self.fallback is None or delivered or not error.retryable:
+            return error
+        self.fallbacks += 1
+        print(f"{self.backend.name} unavailable ({error}), falling back to {self.fallback.backend.name}")
+        return await self.fallback._call(make_body, on_delta)
+
+    async def _attempt(self, body, on_delta):
+        """一次请求，失败时返回 APIError"""
+        name = self.backend.name
+        response = None
+        try:
+            # 发送请求前检查内存
+            metrics.gc_collect()
+            print(f"Memory: Free={gc.mem_free()}, Allocated={gc.mem_alloc()}")
+
+            response = await async_http.post(
+                self.backend.url,
+                data=body,
+                headers=self.backend.headers,
+                pool=self.pool,
+                timeouts=self.timeouts
+            )
+            status = response.status
+            print(f"API Response Status: {status}")
+            if status != 200:
+                return parse_api_error(status, await response.text(), name, response.headers)
+
+            if on_delta is None:
+                raw_response = await response.text()
+                print("Raw Response:", raw_response[:200])  # 打印前200个字符
+                start = time.ticks_ms()
+                try:
+                    response_data = json.loads(raw_response)
+                except ValueError:
+                    return APIError("API response is not valid JSON", "invalid_response", name, status)
+                metrics.since("parse", start)
+                self._timing(response)
+                # 提取助手的回复内容
+                if "choices" in response_data and len(response_data["choices"]) > 0:
+                    return response_data["choices"][0]["message"]["content"]
+                return APIError("Unexpected API response format", "invalid_response", name, status)
+
+            # 流式模式：逐条读取事件，转发增量内容
+            parse_us = 0
+            while True:
+                data = await response.read_event()
+                if data is None or data == "[DONE]":
+                    break
+                start = time.ticks_us()
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                finally:
+                    parse_us += time.ticks_diff(time.ticks_us(), start)
+                choices = chunk.get("choices")
+                if choices:
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        await on_delta(delta)
+            metrics.observe("parse", parse_us / 1000)
+            self._timing(response)
+            return None
+
+        except ClientGone:
+            raise
+        except async_http.HTTPTimeout as e:
+            print(f"{name} request timed out:", e)
+            return APIError(f"API request timed out: {e}", "timeout", name, retryable=True, phase=e.phase)
+        except OSError as e:
+            print(f"{name} request failed:", e)
+            return APIError(f"API request failed: {e}", "network", name, retryable=True)
+        except Exception as e:
+            print(f"{name} request failed:", e)
+            # 打印详细错误信息
+            import sys
+            sys.print_exception(e)
+            return APIError(f"API request failed: {str(e)}", "internal", name)
+        finally:
+            # 读完的连接归还连接池，否则关闭
+            if response is not None:
+                await response.aclose()
+            metrics.gc_collect()
+
+    def _timing(self, response):
+        if self.on_timing is not None:
+            total_ms = time.ticks_diff(time.ticks_ms(), response.started)
+            self.on_timing(response.sent_bytes, response.upload_ms, total_ms)
+
+    def stats(self):
+        """调用统计和熔断器状态，用于 /api"""
+        data = {
+            "backend": self.backend.name,
+            "model": self.backend.model,
+            "url": self.backend.url,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retried,
+            "timeouts": self.timeouts_hit,
+            "fallbacks": self.fallbacks,
+            "clients_gone": self.clients_gone,
+            "last_error": self.last_error.info() if self.last_error else None,
+            "breaker": self.breaker.stats() if self.breaker else None
+        }
+        if self.fallback is not None:
+            data["fallback"] = self.fallback.stats()
+        return data
+
+
+# --------- 预置后端 ----------
+def deepseek(api_key, url="https://api.deepseek.com/v1/chat/completions",
+             model="deepseek-chat", max_tokens=100, temperature=0.7):
+    return Backend("DeepSeek", url, api_key, model, max_tokens, {"temperature": temperature})
+
+
+def moonshot(api_key, url="https://api.moonshot.cn/v1/chat/completions",
+             model="moonshot-v1-8k-vision-preview", max_tokens=500):
+    return Backend("Moonshot", url, api_key, model, max_tokens)
+
+
+def local(url="http://192.168.1.100:8000/v1/chat/completions", model="local", max_tokens=500):
+    """局域网内的 OpenAI 兼容服务（如 llama.cpp server）或测试用的模拟服务，不需要密钥"""
+    return Backend("Local", url, None, model, max_tokens)
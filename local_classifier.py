@@ -0,0 +1,238 @@
+import time
+import json
+import jpeg_features
+import metrics
+
+# --------- 本地分类器 ----------
+# 在调用云端视觉模型之前，先用 JPEG 的 DC 系数缩略图（与结果缓存共用一次解码）提取
+# 画面中物体（与背景差别明显的块）的大小、颜色、亮度和纹理特征，按最近原型分类。
+# 模型就是每个类别的几个原型向量，特征按训练集均值/标准差归一化后量化为小整数，
+# 设备上只做整数运算（MicroPython 的小整数不分配内存，浮点数每次运算都会分配）。
+# 置信度足够高时直接回答，否则交给云端模型。
+# 模型由 host/eval_classifier.py 在电脑上用标注好的图片训练并导出为 JSON。
+
+QUANT = 16           # 归一化后 1 个标准差对应的量化单位
+LIMIT = 127          # 量化值范围 ±LIMIT
+SALIENT_LUMA = 28    # 亮度与背景相差超过该值的块算作物体
+SALIENT_CHROMA = 14  # 或色度（|Cb| + |Cr|）相差超过该值
+
+
+def _median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def features(dc):
+    """
+    从 DC 缩略图提取特征
+    与背景（各通道中位数）差别明显的块视为物体，特征与物体在画面中的位置无关
+    :param dc: jpeg_features.decode_dc() 的结果 (width, height, planes)
+    :return: 0..255 的整数列表：物体面积占比、物体平均亮度/Cb/Cr、物体亮度标准差、
+             物体与背景的亮度差（+128）、全图纹理强度（灰度图的色度固定为 128）
+    """
+    planes = dc[2]
+    cols, rows, y = planes[0]
+    if len(planes) >= 3:
+        # 4:2:0 采样时色度平面较小，亮度缩放到色度的分辨率后逐块比较
+        ccols, crows, cb = planes[1]
+        cr = planes[2][2]
+        yy = y if (ccols, crows) == (cols, rows) else jpeg_features.resample(cols, rows, y, ccols, crows)
+    else:
+        ccols, crows, yy = cols, rows, y
+        cb = cr = None
+    m = ccols * crows
+    my = _median(yy)
+    mb = _median(cb) if cb else 128
+    mr = _median(cr) if cr else 128
+    n = sy = sb = sr = syy = 0
+    for i in range(m):
+        v = yy[i]
+        b = cb[i] if cb else 128
+        r = cr[i] if cr else 128
+        d = v - my
+        if d > SALIENT_LUMA or d < -SALIENT_LUMA or abs(b - mb) + abs(r - mr) > SALIENT_CHROMA:
+            n += 1
+            sy += v
+            sb += b
+            sr += r
+            syy += v * v
+    if n:
+        ay = sy // n
+        f = [n * 255 // m, ay, sb // n, sr // n, min(255, int(max(0, syy // n - ay * ay) ** 0.5))]
+    else:
+        ay = my
+        f = [0, my, mb, mr, 0]
+    f.append(max(0, min(255, ay - my + 128)))
+
+    # 纹理：相邻块亮度差的平均值
+    edges = 0
+    for r in range(rows):
+        row = r * cols
+        prev = y[row]
+        for x in range(row + 1, row + cols):
+            v = y[x]
+            edges += v - prev if v > prev else prev - v
+            prev = v
+    f.append(min(255, edges * 4 // max(1, rows * (cols - 1))))
+    return f
+
+
+class Classifier:
+    """
+    最近原型分类器
+    置信度 = 与最近的其他类别原型相比的距离余量 (d2 - d1) / (d2 + d1)，
+    与最近原型的距离超出该类别训练时的范围（radius）时按比例降低，画面中出现没见过的东西时交给云端
+    """
+
+    def __init__(self, model, threshold=0.3):
+        """
+        :param model: train() 生成的模型字典
+        :param threshold: 置信度不低于该值时本地直接回答
+        """
+        self.labels = model["labels"]
+        self.texts = model.get("texts", {})
+        self.mean = model["mean"]
+        self.mul = model["mul"]
+        self.prototypes = model["prototypes"]  # [[类别序号, 量化向量]]
+        self.radius = model["radius"]
+        self.threshold = threshold
+        # 统计
+        self.calls = 0
+        self.answered = 0
+        self.total_ms = 0
+
+    def quantize(self, f):
+        """特征归一化并量化为 ±LIMIT 的整数"""
+        out = []
+        for i in range(len(f)):
+            q = ((f[i] - self.mean[i]) * self.mul[i]) >> 8
+            out.append(LIMIT if q > LIMIT else -LIMIT if q < -LIMIT else q)
+        return out
+
+    def classify_dc(self, dc):
+        """
+        :param dc: jpeg_features.decode_dc() 的结果
+        :return: {"label", "confidence", "local"（是否可以本地回答）, "ms"}
+        """
+        start = time.ticks_us()
+        x = self.quantize(features(dc))
+        # 每个类别的最近距离（平方）
+        best = [-1] * len(self.labels)
+        for label, p in self.prototypes:
+            d = 0
+            for i in range(len(x)):
+                t = x[i] - p[i]
+                d += t * t
+            if best[label] < 0 or d < best[label]:
+                best[label] = d
+        first = second = -1
+        for label in range(len(best)):
+            if best[label] < 0:
+                continue
+            if first < 0 or best[label] < best[first]:
+                first, second = label, first
+            elif second < 0 or best[label] < best[second]:
+                second = label
+        d1 = best[first] ** 0.5
+        d2 = best[second] ** 0.5 if second >= 0 else d1 + self.radius[first]
+        confidence = (d2 - d1) / (d2 + d1) if d2 + d1 else 1.0
+        if d1 > self.radius[first]:
+            confidence *= self.radius[first] / d1
+        ms = time.ticks_diff(time.ticks_us(), start) / 1000
+        metrics.observe("classify", ms)
+        self.calls += 1
+        self.total_ms += ms
+        local = confidence >= self.threshold
+        if local:
+            self.answered += 1
+        return {"label": self.labels[first], "confidence": round(confidence, 3), "local": local, "ms": round(ms, 1)}
+
+    def classify(self, data):
+        """直接对 JPEG 数据分类（含 DC 解码）"""
+        return self.classify_dc(jpeg_features.decode_dc(data))
+
+    def text(self, label):
+        """本地回答的文字：模型中配置的描述，没有则为类别名"""
+        return self.texts.get(label, label)
+
+    def stats(self):
+        return {
+            "labels": self.labels,
+            "threshold": self.threshold,
+            "calls": self.calls,
+            "answered": self.answered,
+            "escalated": self.calls - self.answered,
+            "avg_ms": round(self.total_ms / self.calls, 1) if self.calls else None
+        }
+
+
+def _distance(a, b):
+    d = 0
+    for i in range(len(a)):
+        t = a[i] - b[i]
+        d += t * t
+    return d
+
+
+def _kmeans(vectors, k, iterations=10):
+    """简单 k-means，初始中心依次取离已选中心最远的样本（结果确定，不依赖随机数）"""
+    centers = [vectors[0]]
+    while len(centers) < k:
+        far = max(vectors, key=lambda v: min(_distance(v, c) for c in centers))
+        centers.append(far)
+    for _ in range(iterations):
+        groups = [[] for _ in centers]
+        for v in vectors:
+            groups[min(range(len(centers)), key=lambda j: _distance(v, centers[j]))].append(v)
+        centers = [[sum(col) // len(g) for col in zip(*g)] if g else centers[j] for j, g in enumerate(groups)]
+    return centers
+
+
+def train(samples, prototypes=3, texts=None):
+    """
+    训练模型（在电脑上运行，也可在设备上运行）
+    :param samples: [(类别, features() 的结果)]
+    :param prototypes: 每个类别最多几个原型（同一类别外观差别较大时有用）
+    :param texts: {类别: 本地回答时返回的描述}
+    :return: 模型字典，可用 save() 保存
+    """
+    labels = sorted(set(s[0] for s in samples))
+    dims = len(samples[0][1])
+    n = len(samples)
+    mean = []
+    mul = []
+    for i in range(dims):
+        m = sum(s[1][i] for s in samples) / n
+        std = (sum((s[1][i] - m) ** 2 for s in samples) / n) ** 0.5
+        mean.append(int(round(m)))
+        # 几乎不变的特征（标准差很小）不放大噪声
+        mul.append(int(QUANT * 256 / max(std, 4.0)))
+    model = {"version": 1, "labels": labels, "mean": mean, "mul": mul,
+             "prototypes": [], "radius": [], "texts": texts or {}}
+    clf = Classifier(model)
+    for index, label in enumerate(labels):
+        vectors = [clf.quantize(s[1]) for s in samples if s[0] == label]
+        centers = _kmeans(vectors, min(prototypes, len(vectors)))
+        for c in centers:
+            model["prototypes"].append([index, c])
+        # 类别范围：训练样本到最近原型距离的 90 分位，放宽 1.5 倍
+        dist = sorted(min(_distance(v, c) for c in centers) ** 0.5 for v in vectors)
+        model["radius"].append(int(dist[min(len(dist) - 1, len(dist) * 9 // 10)] * 1.5) + 1)
+    return model
+
+
+def save(model, path):
+    with open(path, "w") as f:
+        json.dump(model, f)
+
+
+def load(path, threshold=0.3):
+    """
+    加载模型
+    :return: Classifier，文件不存在或无法解析时返回 None
+    """
+    try:
+        with open(path) as f:
+            return Classifier(json.load(f), threshold)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Local classifier not loaded ({path}): {e}")
+        return None
@@ -0,0 +1,154 @@
+import time
+import gc
+
+# --------- 运行指标 ----------
+# 记录每个请求各阶段耗时（采集、编码、连接/TLS、上传、首字节、下载、解析、写回客户端）、
+# 按路由统计的请求数和耗时，以及堆内存高水位和 GC 次数，
+# 以 Prometheus 文本格式在 /metrics 输出。
+# 只做计数和固定桶直方图累加，开销很小，可以常开；ENABLED = False 时全部跳过。
+
+ENABLED = True
+
+# 直方图的桶上限（毫秒），最后隐含 +Inf
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """固定桶直方图：各桶计数、总和、次数"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        n = len(BUCKETS_MS)
+        while i < n and value > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+phases = {}    # 阶段 -> Histogram
+routes = {}    # 路由 -> Histogram
+responses = {}  # (路由, 状态码) -> 次数
+heap = {"free_min": None, "alloc_max": 0}
+gc_runs = 0
+
+
+def observe(phase, ms):
+    """记录一个阶段的耗时（毫秒，可为小数）"""
+    if not ENABLED:
+        return
+    h = phases.get(phase)
+    if h is None:
+        h = phases[phase] = Histogram()
+    h.observe(ms)
+
+
+def since(phase, start_ms):
+    """记录从 start_ms（ticks_ms）到现在的耗时"""
+    if ENABLED:
+        observe(phase, time.ticks_diff(time.ticks_ms(), start_ms))
+
+
+def request_done(route, status, ms):
+    """记录一个 HTTP 请求：按路由的耗时直方图和按状态码的计数，并采样堆内存"""
+    if not ENABLED:
+        return
+    h = routes.get(route)
+    if h is None:
+        h = routes[route] = Histogram()
+    h.observe(ms)
+    key = (route, status)
+    responses[key] = responses.get(key, 0) + 1
+    sample_heap()
+
+
+def sample_heap():
+    """更新堆内存高水位：最小空闲、最大已分配"""
+    free = gc.mem_free()
+    alloc = gc.mem_alloc()
+    if heap["free_min"] is None or free < heap["free_min"]:
+        heap["free_min"] = free
+    if alloc > heap["alloc_max"]:
+        heap["alloc_max"] = alloc
+
+
+def gc_collect():
+    """gc.collect()，同时统计次数和耗时"""
+    global gc_runs
+    if not ENABLED:
+        gc.collect()
+        return
+    start = time.ticks_ms()
+    sample_heap()  # 回收前的已分配量才是高水位
+    gc.collect()
+    gc_runs += 1
+    since("gc", start)
+
+
+def _histogram_lines(out, name, label, values):
+    for key, h in values.items():
+        cumulative = 0
+        for i, bound in enumerate(BUCKETS_MS):
+            cumulative += h.counts[i]
+            out.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {cumulative}\n')
+        out.append(f'{name}_bucket{{{label}="{key}",le="+Inf"}} {h.count}\n')
+        out.append(f'{name}_sum{{{label}="{key}"}} {h.sum}\n')
+        out.append(f'{name}_count{{{label}="{key}"}} {h.count}\n')
+
+
+def render(gauges=None):
+    """
+    生成 Prometheus 文本格式
+    :param gauges: 额外输出的数值 {指标名: 值}，如队列长度、缓存命中数；
+                   名称以 _total 结尾的是只增不减的计数，按 counter 声明，其余按 gauge 声明
+    :return: 文本（str）
+    """
+    out = []
+    out.append("# HELP esp32_phase_ms Time spent in each request phase\n")
+    out.append("# TYPE esp32_phase_ms histogram\n")
+    _histogram_lines(out, "esp32_phase_ms", "phase", phases)
+    out.append("# HELP esp32_http_request_ms HTTP request duration by route\n")
+    out.append("# TYPE esp32_http_request_ms histogram\n")
+    _histogram_lines(out, "esp32_http_request_ms", "route", routes)
+    out.append("# TYPE esp32_http_responses_total counter\n")
+    for (route, status), n in responses.items():
+        out.append(f'esp32_http_responses_total{{route="{route}",status="{status}"}} {n}\n')
+
+    out.append("# TYPE esp32_heap_free_bytes gauge\n")
+    out.append(f"esp32_heap_free_bytes {gc.mem_free()}\n")
+    out.append("# TYPE esp32_heap_alloc_bytes gauge\n")
+    out.append(f"esp32_heap_alloc_bytes {gc.mem_alloc()}\n")
+    if heap["free_min"] is not None:
+        out.append("# TYPE esp32_heap_free_min_bytes gauge\n")
+        out.append(f"esp32_heap_free_min_bytes {heap['free_min']}\n")
+    out.append("# TYPE esp32_heap_alloc_max_bytes gauge\n")
+    out.append(f"esp32_heap_alloc_max_bytes {heap['alloc_max']}\n")
+    out.append("# TYPE esp32_gc_collections_total counter\n")
+    out.append(f"esp32_gc_collections_total {gc_runs}\n")
+
+    if gauges:
+        for name, value in gauges.items():
+            if value is None:
+                continue
+            if value is True or value is False:
+                value = int(value)
+            kind = "counter" if name.endswith("_total") else "gauge"
+            out.append(f"# TYPE esp32_{name} {kind}\n")
+            out.append(f"esp32_{name} {value}\n")
+    return "".join(out)
+
+
+def reset():
+    """清空所有统计"""
+    global gc_runs
+    phases.clear()
+    routes.clear()
+    responses.clear()
+    heap["free_min"] = None
+    heap["alloc_max"] = 0
+    gc_runs = 0
@@ -0,0 +1,142 @@
+import time
+import uasyncio as asyncio
+import jpeg_features
+
+# --------- 连续监控 ----------
+# 在设备上比较相邻帧的亮度缩略图（JPEG DC 系数），画面变化超过阈值
+# 并稳定 K 帧后才调用视觉模型，结果记录在内存中的最近事件列表里。
+
+def _changed_percent(a, b, level):
+    """两张缩略图中亮度差超过 level 的格子所占百分比"""
+    changed = 0
+    for i in range(len(a)):
+        d = a[i] - b[i]
+        if d > level or d < -level:
+            changed += 1
+    return changed * 100 / len(a)
+
+
+class ChangeDetector:
+    """
+    场景变化检测
+    缩略图中与基准画面（上次分析的画面）明显不同的格子超过 change_threshold%，
+    且相邻帧变化的格子连续 stable_frames 帧不超过 stable_threshold% 时触发
+    """
+
+    def __init__(self, change_threshold=3.0, stable_threshold=1.0, stable_frames=3, level=20, grid=(16, 12)):
+        """
+        :param change_threshold: 判定场景变化的格子百分比
+        :param stable_threshold: 判定画面静止的格子百分比
+        :param stable_frames: 变化后需要保持静止的帧数 K
+        :param level: 单个格子亮度差超过该值（0..255）才算变化
+        :param grid: 比较用缩略图的尺寸 (列, 行)
+        """
+        self.change_threshold = change_threshold
+        self.level = level
+        self.stable_threshold = stable_threshold
+        self.stable_frames = stable_frames
+        self.grid = grid
+        self.baseline = None
+        self.prev = None
+        self.stable = 0
+
+    def feed(self, image_data):
+        """
+        输入一帧
+        :param image_data: JPEG 数据
+        :return: (是否触发分析, 与基准画面相比变化的格子百分比)
+        :raises ValueError: JPEG 无法解析
+        """
+        cols, rows, plane = jpeg_features.luma(image_data)
+        thumb = jpeg_features.resample(cols, rows, plane, self.grid[0], self.grid[1])
+        if self.baseline is None:
+            self.baseline = self.prev = thumb
+            return False, 0
+        change = _changed_percent(thumb, self.baseline, self.level)
+        motion = _changed_percent(thumb, self.prev, self.level)
+        self.prev = thumb
+        if change < self.change_threshold:
+            self.stable = 0
+            return False, change
+        # 画面已变化：等待运动停止，避免分析到半个动作
+        self.stable = self.stable + 1 if motion <= self.stable_threshold else 0
+        if self.stable >= self.stable_frames:
+            self.baseline = thumb
+            self.stable = 0
+            return True, change
+        return False, change
+
+
+class Monitor:
+    """
+    后台监控任务：定时取帧，检测到场景变化时调用分析函数并记录事件
+    """
+
+    def __init__(self, frames, analyze, interval_ms=1000, max_events=20, detector=None):
+        """
+        :param frames: FrameSource 采集源
+        :param analyze: 分析协程函数 analyze(image_data) -> (结果, 是否命中缓存)
+        :param interval_ms: 取帧间隔
+        :param max_events: 保留的最近事件数
+        :param detector: ChangeDetector，默认使用默认参数
+        """
+        self.frames = frames
+        self.analyze = analyze
+        self.interval_ms = interval_ms
+        self.max_events = max_events
+        self.detector = detector or ChangeDetector()
+        self.events = []
+        self.checked = 0
+        self.triggers = 0
+        self.api_calls = 0
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.ticks_ms()
+            try:
+                seq, _, buf = await self.frames.next_after_now()
+                self.checked += 1
+                trigger, change = self.detector.feed(buf)
+                if trigger:
+                    self.triggers += 1
+                    print(f"Scene change detected (frame {seq}, diff {change:.1f})")
+                    result, cached = await self.analyze(buf)
+                    if not cached:
+                        self.api_calls += 1
+                    self.events.append({
+                        "time": time.time(),
+                        "frame_seq": seq,
+                        "change": round(change, 1),
+                        "analysis": result,
+                        "cached": cached
+                    })
+                    if len(self.events) > self.max_events:
+                        self.events.pop(0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Monitor error: {e}")
+            elapsed = time.ticks_diff(time.ticks_ms(), start)
+            await asyncio.sleep_ms(max(0, self.interval_ms - elapsed))
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "frames_checked": self.checked,
+            "triggers": self.triggers,
+            "api_calls": self.api_calls
+        }
@@ -0,0 +1,396 @@
+import time
+import json
+import struct
+import random
+import uasyncio as asyncio
+import metrics
+
+# --------- MQTT 事件推送 ----------
+# 与 HTTP 服务并行运行，保持一条到 MQTT broker 的长连接（MQTT 3.1.1），把识别结果和设备状态推送出去，
+# 看板订阅即可，不必轮询每台设备的 /analyze（省去每次轮询的 TCP 连接、请求解析和 WiFi 占用）。
+# - QoS 0（最多一次，写出即完成）或 QoS 1（至少一次，等待 PUBACK；断线时未确认的消息放回队首，重连后重发）
+# - 批量：batch_ms 内产生的事件合并为一次写出（多个 PUBLISH 报文，一次 awrite）
+# - 离线队列：断线期间事件暂存在内存中，条数和字节数有上限，满了丢弃最旧的；重连后按顺序发出
+# - <前缀>/status 为 retained 消息：连接后发布 online，并登记遗嘱（Last Will），设备掉线时由 broker 发布 offline
+# 只用到 uasyncio 的流接口（open_connection、awrite、readexactly），不依赖 umqtt（其 socket 调用会阻塞事件循环）。
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def _length(n):
+    """剩余长度字段（变长编码，每字节 7 位）"""
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return out
+
+
+def _str(s):
+    """带 2 字节长度前缀的字符串"""
+    if isinstance(s, str):
+        s = s.encode()
+    return struct.pack("!H", len(s)) + s
+
+
+def packet(kind, body=b"", flags=0):
+    """固定报头 + 报文体"""
+    out = bytearray([(kind << 4) | flags])
+    out += _length(len(body))
+    out += body
+    return out
+
+
+def connect_packet(client_id, keepalive_s, will=None, user=None, password=None):
+    """
+    CONNECT 报文（clean session）
+    :param will: 遗嘱 (主题, 消息, qos, retain)
+    """
+    flags = 0x02
+    tail = bytearray(_str(client_id))
+    if will is not None:
+        flags |= 0x04 | (will[2] << 3) | (0x20 if will[3] else 0)
+        tail += _str(will[0])
+        tail += _str(will[1])
+    if user is not None:
+        flags |= 0x80
+        tail += _str(user)
+    if password is not None:
+        flags |= 0x40
+        tail += _str(password)
+    body = bytearray(_str("MQTT"))
+    body += bytes([4, flags])
+    body += struct.pack("!H", keepalive_s)
+    body += tail
+    return packet(CONNECT, body)
+
+
+def publish_packet(topic, payload, qos=0, pid=0, retain=False):
+    body = bytearray(_str(topic))
+    if qos:
+        body += struct.pack("!H", pid)
+    body += payload
+    return packet(PUBLISH, body, (qos << 1) | (1 if retain else 0))
+
+
+def parse_publish(flags, body):
+    """
+    :return: (主题, 负载, qos, 报文标识, retain)
+    """
+    n = struct.unpack_from("!H", body, 0)[0]
+    topic = bytes(body[2:2 + n]).decode()
+    pos = 2 + n
+    qos = (flags >> 1) & 3
+    pid = 0
+    if qos:
+        pid = struct.unpack_from("!H", body, pos)[0]
+        pos += 2
+    return topic, body[pos:], qos, pid, bool(flags & 1)
+
+
+async def read_packet(reader):
+    """
+    读取一个报文
+    :return: (类型, 标志, 报文体)
+    :raises EOFError: 连接已关闭
+    """
+    head = (await reader.readexactly(1))[0]
+    n = shift = 0
+    while True:
+        b = (await reader.readexactly(1))[0]
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            break
+        shift += 7
+        if shift > 21:
+            raise ValueError("malformed remaining length")
+    body = await reader.readexactly(n) if n else b""
+    return head >> 4, head & 0x0F, body
+
+
+class Publisher:
+    """
+    事件发布器
+    publish() 只把消息放入队列（不等待网络），由后台任务连接 broker 并发送
+    """
+
+    def __init__(self, host, port=1883, client_id="esp32", prefix=None, qos=1, keepalive_s=60,
+                 batch_ms=20, max_batch=16, max_inflight=8, max_queue=64, max_queue_bytes=16384,
+                 user=None, password=None, connect_ms=8000, ack_ms=10000,
+                 reconnect_ms=1000, max_reconnect_ms=60000, status_ms=60000):
+        """
+        :param prefix: 主题前缀，消息发布到 <prefix>/<topic>
+        :param qos: 默认 QoS（0 或 1）
+        :param batch_ms: 第一条消息入队后最多等待多久再写出，让同时产生的事件一起发送
+        :param max_batch: 一次写出的最多消息数
+        :param max_inflight: 已发出未确认的 QoS 1 消息上限，达到后等待 PUBACK
+        :param max_queue: 队列（含离线期间）的消息条数上限
+        :param max_queue_bytes: 队列中负载的字节数上限
+        :param ack_ms: PUBACK / PINGRESP 的等待时限，超时视为连接已断开
+        :param reconnect_ms: 重连间隔（失败后加倍，带随机抖动，不超过 max_reconnect_ms）
+        :param status_ms: 定时发布状态的间隔，0 表示只在连接时发布
+        """
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.prefix = prefix or "esp32/" + client_id
+        self.qos = qos
+        self.keepalive_s = keepalive_s
+        self.batch_ms = batch_ms
+        self.max_batch = max_batch
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_queue_bytes = max_queue_bytes
+        self.user = user
+        self.password = password
+        self.connect_ms = connect_ms
+        self.ack_ms = ack_ms
+        self.reconnect_ms = reconnect_ms
+        self.max_reconnect_ms = max_reconnect_ms
+        self.status_ms = status_ms
+        self.status_fn = None  # 返回状态字典的函数，内容附加到 status 消息中
+
+        self.queue = []     # [主题, 负载, qos, retain, 入队时间, 是否为重发]
+        self.queued_bytes = 0
+        self.inflight = []  # [报文标识, 消息, 发出时间]
+        self.connected = False
+        self._pid = 0
+        self._reader = None
+        self._writer = None
+        self._error = None
+        self._wake = asyncio.Event()
+        self._task = None
+        self._last_write = 0
+        self._last_status = 0
+        self._ping_sent = None
+        # 统计
+        self.published = 0  # 已写出的消息数
+        self.acked = 0
+        self.dropped = 0    # 队列满被丢弃的消息数
+        self.connects = 0
+        self.failures = 0   # 连接失败或断开的次数
+        self.batches = 0
+        self.bytes = 0
+        self.last_error = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, topic, payload, qos=None, retain=False):
+        """
+        发布消息（放入队列后立即返回）
+        :param topic: 相对前缀的主题
+        :param payload: dict（编码为 JSON）、str 或 bytes
+        :param qos: None 使用默认 QoS
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        elif not isinstance(payload, (bytes, bytearray)):
+            payload = json.dumps(payload).encode()
+        self._enqueue([self.prefix + "/" + topic, payload, self.qos if qos is None else qos, retain, time.ticks_ms(), False])
+
+    def _enqueue(self, msg, front=False):
+        if front:
+            self.queue.insert(0, msg)
+        else:
+            self.queue.append(msg)
+        self.queued_bytes += len(msg[1])
+        while len(self.queue) > self.max_queue or self.queued_bytes > self.max_queue_bytes:
+            # 丢弃最旧的未发出过的消息；等待重发的消息已交给 broker 一次，最后才丢
+            i = 0
+            while i < len(self.queue) and self.queue[i][5]:
+                i += 1
+            old = self.queue.pop(i if i < len(self.queue) else 0)
+            self.queued_bytes -= len(old[1])
+            self.dropped += 1
+        self._wake.set()
+
+    def _status(self, state):
+        data = {"state": state, "time": int(time.time())}
+        if state == "online" and self.status_fn is not None:
+            data.update(self.status_fn())
+        return json.dumps(data).encode()
+
+    def publish_status(self, front=False):
+        """发布 retained 状态消息（连接后、定时以及状态变化时）"""
+        self._last_status = time.ticks_ms()
+        self._enqueue([self.prefix + "/status", self._status("online"), self.qos, True, self._last_status, False], front)
+
+    async def _run(self):
+        delay = self.reconnect_ms
+        while True:
+            try:
+                await self._connect()
+                delay = self.reconnect_ms
+                await self._session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e) or type(e).__name__
+                print(f"MQTT disconnected: {self.last_error}")
+            finally:
+                await self._close()
+            await asyncio.sleep_ms(random.randint(delay // 2, delay))
+            delay = min(delay * 2, self.max_reconnect_ms)
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.connect_ms / 1000)
+        will = (self.prefix + "/status", self._status("offline"), 1, True)
+        await self._writer.awrite(connect_packet(self.client_id, self.keepalive_s, will, self.user, self.password))
+        kind, _, body = await asyncio.wait_for(read_packet(self._reader), self.connect_ms / 1000)
+        if kind != CONNACK or len(body) < 2:
+            raise OSError("unexpected reply to CONNECT")
+        if body[1] != 0:
+            raise OSError(f"connection refused (code {body[1]})")
+        self.connected = True
+        self.connects += 1
+        self._last_write = time.ticks_ms()
+        print(f"MQTT connected to {self.host}:{self.port}, {len(self.queue)} queued")
+        # 上线状态排在离线期间积压的消息之前
+        self.publish_status(True)
+
+    async def _close(self):
+        if self._writer is not None:
+            # uasyncio 中 close() 什么也不做，wait_closed() 才关闭套接字
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+        self.connected = False
+        self._error = None
+        self._ping_sent = None
+        # 未确认的 QoS 1 消息按原顺序放回队首，重连后重发（至少一次）
+        if self.inflight:
+            msgs = [m[1] for m in self.inflight]
+            self.inflight = []
+            for msg in reversed(msgs):
+                msg[5] = True
+                self._enqueue(msg, True)
+
+    async def _session(self):
+        reader = asyncio.create_task(self._read_loop())
+        tick = min(1000, self.keepalive_s * 250)
+        try:
+            while True:
+                if self._error is not None:
+                    raise self._error
+                await self._check()
+                if self.queue and len(self.inflight) < self.max_inflight:
+                    wait = self.batch_ms - time.ticks_diff(time.ticks_ms(), self.queue[0][4])
+                    if wait > 0 and len(self.queue) < self.max_batch:
+                        await asyncio.sleep_ms(wait)
+                    await self._flush()
+                    continue
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), tick / 1000)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            reader.cancel()
+
+    async def _check(self):
+        """确认超时、心跳和定时状态"""
+        now = time.ticks_ms()
+        if self.inflight and time.ticks_diff(now, self.inflight[0][2]) > self.ack_ms:
+            raise OSError("PUBACK timeout")
+        if self._ping_sent is not None:
+            if time.ticks_diff(now, self._ping_sent) > self.ack_ms:
+                raise OSError("PINGRESP timeout")
+        elif time.ticks_diff(now, self._last_write) >= self.keepalive_s * 500:
+            await self._writer.awrite(packet(PINGREQ))
+            self._ping_sent = self._last_write = now
+        if self.status_ms and time.ticks_diff(now, self._last_status) >= self.status_ms:
+            self.publish_status()
+
+    async def _flush(self):
+        """把队首的消息编码到一个缓冲区，一次写出"""
+        buf = bytearray()
+        sent = []
+        while self.queue and len(sent) < self.max_batch and len(self.inflight) < self.max_inflight:
+            msg = self.queue.pop(0)
+            self.queued_bytes -= len(msg[1])
+            topic, payload, qos, retain, _, _ = msg
+            pid = 0
+            if qos:
+                self._pid = self._pid % 0xFFFF + 1
+                pid = self._pid
+                self.inflight.append([pid, msg, time.ticks_ms()])
+            buf += publish_packet(topic, payload, qos, pid, retain)
+            sent.append(msg)
+        await self._writer.awrite(buf)
+        now = time.ticks_ms()
+        self._last_write = now
+        self.published += len(sent)
+        self.batches += 1
+        self.bytes += len(buf)
+        for msg in sent:
+            if not msg[2]:
+                metrics.observe("mqtt_publish", time.ticks_diff(now, msg[4]))
+
+    async def _read_loop(self):
+        try:
+            while True:
+                kind, _, body = await read_packet(self._reader)
+                if kind == PUBACK:
+                    pid = struct.unpack("!H", body)[0]
+                    for i in range(len(self.inflight)):
+                        if self.inflight[i][0] == pid:
+                            msg = self.inflight.pop(i)[1]
+                            self.acked += 1
+                            # QoS 1 的发布延迟：入队到 broker 确认
+                            metrics.observe("mqtt_publish", time.ticks_diff(time.ticks_ms(), msg[4]))
+                            break
+                elif kind == PINGRESP:
+                    self._ping_sent = None
+                self._wake.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = e if isinstance(e, OSError) else OSError(str(e) or "connection closed")
+            self._wake.set()
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "connected": self.connected,
+            "broker": f"{self.host}:{self.port}",
+            "prefix": self.prefix,
+            "qos": self.qos,
+            "queued": len(self.queue),
+            "queued_bytes": self.queued_bytes,
+            "inflight": len(self.inflight),
+            "published": self.published,
+            "acked": self.acked,
+            "dropped": self.dropped,
+            "connects": self.connects,
+            "failures": self.failures,
+            "batches": self.batches,
+            "bytes": self.bytes,
+            "last_error": self.last_error
+        }
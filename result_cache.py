@@ -0,0 +1,87 @@
+import time
+
+# --------- 分析结果缓存 ----------
+# 以 (帧的感知哈希, 提示词) 为键的 LRU 缓存。固定机位下画面几乎不变时，
+# 汉明距离在阈值内的帧直接复用上次的分析结果，不再调用视觉 API。
+
+class ResultCache:
+    """
+    近似匹配的 LRU 缓存
+    条目按最近使用顺序排列，超过条目数或内存上限时淘汰最久未用的条目
+    """
+
+    def __init__(self, threshold=6, ttl_ms=60000, max_entries=16, max_bytes=8192):
+        """
+        :param threshold: 视为同一画面的最大汉明距离
+        :param ttl_ms: 条目有效期
+        :param max_entries: 最大条目数
+        :param max_bytes: 缓存文本占用的内存上限（字节，按 UTF-8 估算）
+        """
+        self.threshold = threshold
+        self.ttl_ms = ttl_ms
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = []  # [哈希, 提示词, 结果, 时间戳, 大小]，末尾为最近使用
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, phash, prompt):
+        """
+        查找相似画面 + 相同提示词的结果
+        :return: 缓存的结果，未命中返回 None
+        """
+        return self.lookup(phash, (prompt,))[1]
+
+    def lookup(self, phash, prompts):
+        """
+        查找相似画面 + prompts 中任一提示词的结果（取汉明距离最小的）
+        :return: (提示词, 结果)，未命中返回 (None, None)
+        """
+        now = time.ticks_ms()
+        best = None
+        best_dist = self.threshold + 1
+        i = 0
+        while i < len(self.entries):
+            entry = self.entries[i]
+            if time.ticks_diff(now, entry[3]) > self.ttl_ms:
+                self._remove(i)  # 过期
+                continue
+            if entry[1] in prompts:
+                dist = bin(entry[0] ^ phash).count("1")
+                if dist < best_dist:
+                    best, best_dist = entry, dist
+            i += 1
+        if best is None:
+            self.misses += 1
+            return None, None
+        # 移到末尾，标记为最近使用
+        self.entries.remove(best)
+        self.entries.append(best)
+        self.hits += 1
+        return best[1], best[2]
+
+    def put(self, phash, prompt, result):
+        """写入结果，必要时淘汰最久未用的条目"""
+        size = len(result.encode('utf-8')) + len(prompt.encode('utf-8')) + 32
+        if size > self.max_bytes:
+            return
+        self.entries.append([phash, prompt, result, time.ticks_ms(), size])
+        self.size += size
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(0)
+            self.evictions += 1
+
+    def _remove(self, index):
+        self.size -= self.entries.pop(index)[4]
+
+    def stats(self):
+        """命中/未命中/淘汰计数"""
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,107 @@
+import time
+import uasyncio as asyncio
+import jpeg_crop
+import metrics
+
+# --------- 感兴趣区域（ROI） ----------
+# 上传给视觉模型之前把帧裁剪到有用的区域：固定区域（按设备安装位置配置，可以有多个，即分块），
+# 或与上次分析的画面相比发生变化的区域（运动 ROI）。
+# 裁剪用 jpeg_crop 无损完成，上传字节数和图片 token 数按面积减少；
+# 各区域在原图中的位置随结果一起返回，模型给出的坐标可用 Region.to_frame() 映射回原图。
+
+
+def fixed_rects(width, height, regions):
+    """
+    按比例配置的区域换算为像素矩形
+    :param regions: [(x, y, w, h)]，0..1 的比例
+    :return: [(x, y, w, h)] 像素
+    """
+    rects = []
+    for x, y, w, h in regions:
+        rects.append((int(x * width), int(y * height), max(1, int(w * width)), max(1, int(h * height))))
+    return rects
+
+
+class MotionROI:
+    """
+    运动 ROI：与参考画面（上次分析的帧）比较 DC 亮度缩略图，取变化块的外接矩形
+    """
+
+    def __init__(self, level=24, min_blocks=2, margin=2, min_size=64):
+        """
+        :param level: 块亮度差超过该值（0..255）算作变化
+        :param min_blocks: 变化块少于该数时视为无变化
+        :param margin: 外接矩形向外扩展的块数（给模型留一些上下文）
+        :param min_size: 区域的最小边长（像素）
+        """
+        self.level = level
+        self.min_blocks = min_blocks
+        self.margin = margin
+        self.min_size = min_size
+        self.reference = None  # (列数, 行数, 亮度平面)
+
+    def update(self, dc):
+        """
+        与参考画面比较，并把当前帧设为新的参考画面
+        :param dc: jpeg_features.decode_dc() 的结果
+        :return: 变化区域 (x, y, w, h) 像素，没有参考画面、尺寸不同或无变化时返回 None
+        """
+        width, height = dc[0], dc[1]
+        cols, rows, plane = dc[2][0]
+        ref = self.reference
+        self.reference = (cols, rows, bytes(plane))
+        if ref is None or ref[0] != cols or ref[1] != rows:
+            return None
+        old = ref[2]
+        level = self.level
+        x0, y0, x1, y1 = cols, rows, -1, -1
+        n = 0
+        for y in range(rows):
+            row = y * cols
+            for x in range(cols):
+                d = plane[row + x] - old[row + x]
+                if d > level or d < -level:
+                    n += 1
+                    if x < x0:
+                        x0 = x
+                    if x > x1:
+                        x1 = x
+                    if y < y0:
+                        y0 = y
+                    if y > y1:
+                        y1 = y
+        if n < self.min_blocks:
+            return None
+        # 块坐标换算为像素（亮度平面每块 8 像素），扩展边距和最小尺寸
+        m = self.margin
+        px0, py0 = max(0, (x0 - m) * 8), max(0, (y0 - m) * 8)
+        px1, py1 = min(width, (x1 + 1 + m) * 8), min(height, (y1 + 1 + m) * 8)
+        px0, px1 = _grow(px0, px1, self.min_size, width)
+        py0, py1 = _grow(py0, py1, self.min_size, height)
+        return (px0, py0, px1 - px0, py1 - py0)
+
+
+def _grow(a, b, size, limit):
+    """区间 [a, b) 不足 size 时向两边扩展，不超出 [0, limit)"""
+    if b - a >= size:
+        return a, b
+    extra = size - (b - a)
+    a = max(0, a - extra // 2)
+    b = min(limit, a + size)
+    return max(0, b - size), b
+
+
+async def crop(data, rects, rows_per_yield=4):
+    """
+    裁剪（异步，每解码 rows_per_yield 行 MCU 让出一次事件循环）
+    :return: [(JPEG 数据, jpeg_crop.Region)]
+    :raises ValueError: 不支持的 JPEG 或区域为空
+    """
+    start = time.ticks_ms()
+    n = 0
+    for result in jpeg_crop.crop_steps(data, rects):
+        n += 1
+        if n % rows_per_yield == 0:
+            await asyncio.sleep_ms(0)
+    metrics.since("crop", start)
+    return result
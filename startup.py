@@ -0,0 +1,100 @@
+import time
+import uasyncio as asyncio
+
+# --------- 启动过程 ----------
+# 记录启动各阶段的开始/结束时间和各子系统的就绪状态，
+# 供启动日志、/status 以及"未就绪时返回 503"使用。
+# 设备出错就 reset()，启动时间就是停机时间，所以每个阶段都要计时。
+
+PENDING = "pending"
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+async def poll(check, timeout_ms, interval_ms=50, max_interval_ms=500):
+    """
+    轮询等待条件成立（代替固定时长的 sleep）
+    间隔从 interval_ms 开始逐次加倍，不超过 max_interval_ms
+    :param check: 无参函数，返回真值表示完成；可抛出异常表示不必再等
+    :return: check() 的最后一次返回值，超时返回 None
+    """
+    start = time.ticks_ms()
+    while True:
+        result = check()
+        if result:
+            return result
+        elapsed = time.ticks_diff(time.ticks_ms(), start)
+        if elapsed >= timeout_ms:
+            return None
+        await asyncio.sleep_ms(min(interval_ms, timeout_ms - elapsed))
+        interval_ms = min(interval_ms * 2, max_interval_ms)
+
+
+class Startup:
+    """
+    启动状态：各子系统的状态和各阶段耗时
+    """
+
+    def __init__(self, components):
+        """
+        :param components: 需要跟踪的子系统名称，如 ("wifi", "lcd", "camera")
+        """
+        self.started = time.ticks_ms()
+        self.state = {}
+        for name in components:
+            self.state[name] = PENDING
+        self.phases = []  # [名称, 开始(ms, 相对启动), 耗时(ms) 或 None]
+        self.errors = {}
+        self.total_ms = None  # 全部就绪的时间
+
+    def elapsed(self):
+        """自启动以来的毫秒数"""
+        return time.ticks_diff(time.ticks_ms(), self.started)
+
+    def begin(self, phase, component=None):
+        """
+        开始一个阶段
+        :param component: 阶段所属的子系统，同时把其状态设为 starting
+        :return: 阶段记录，传给 end()
+        """
+        record = [phase, self.elapsed(), None]
+        self.phases.append(record)
+        if component is not None:
+            self.state[component] = STARTING
+        return record
+
+    def end(self, record, component=None, ok=True, error=None):
+        """结束一个阶段并打印耗时；提供 component 时更新其状态为 ready / failed"""
+        record[2] = self.elapsed() - record[1]
+        if component is not None:
+            self.state[component] = READY if ok else FAILED
+            if error is not None:
+                self.errors[component] = str(error)
+        print(f"Boot: {record[0]} {'done' if ok else 'FAILED'} in {record[2]} ms (t={record[1] + record[2]} ms)")
+
+    def finish(self):
+        """全部就绪，打印各阶段耗时汇总"""
+        self.total_ms = self.elapsed()
+        parts = ", ".join(f"{p[0]} {p[2]}" for p in self.phases)
+        print(f"Boot complete in {self.total_ms} ms ({parts})")
+
+    def failed(self):
+        """初始化失败的子系统名称列表"""
+        return [name for name, state in self.state.items() if state == FAILED]
+
+    def is_ready(self, *components):
+        for name in components:
+            if self.state.get(name) != READY:
+                return False
+        return True
+
+    def summary(self):
+        """启动状态，用于 /status 和 503 响应"""
+        return {
+            "uptime_ms": self.elapsed(),
+            "boot_ms": self.total_ms,
+            "state": self.state,
+            "errors": self.errors,
+            "phases": [{"name": p[0], "start_ms": p[1], "ms": p[2]} for p in self.phases]
+        }
@@ -0,0 +1,153 @@
+function getDeviceIP() {
+  document.getElementById('device-ip').textContent = window.location.hostname;
+}
+let streaming = false;
+// WebSocket：图像、分析结果和设备状态共用 /ws 一条连接；未连接时回退到 HTTP（/capture、/stream、/analyze/stream）
+let ws = null, wsOpen = false, wsRetry = 1000, frameUrl = null, analyzeId = 0;
+const pending = {};  // 分析 id -> 消息处理函数
+function setStatus(text) {
+  document.getElementById('status').textContent = text;
+}
+function wsSend(msg) {
+  if (!wsOpen) return false;
+  ws.send(JSON.stringify(msg));
+  return true;
+}
+function connectWs() {
+  if (!window.WebSocket) { refreshImage(); return; }
+  let opened = false;
+  ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws');
+  ws.binaryType = 'arraybuffer';
+  ws.onopen = () => {
+    opened = wsOpen = true;
+    wsRetry = 1000;
+    document.getElementById('transport').textContent = 'WebSocket';
+    // 视频中重连时改由 WebSocket 推送，第一帧到达时 MJPEG 连接随之关闭
+    wsSend(streaming ? { type: 'stream', on: true } : { type: 'capture' });
+  };
+  ws.onmessage = ev => {
+    if (typeof ev.data === 'string') handleWsMessage(JSON.parse(ev.data));
+    else showFrame(ev.data);
+  };
+  ws.onclose = () => {
+    const wasOpen = wsOpen;
+    wsOpen = false;
+    document.getElementById('transport').textContent = 'HTTP';
+    Object.keys(pending).forEach(id => pending[id]({ type: 'error', message: '连接断开' }));
+    if (!opened && wsRetry === 1000 && !frameUrl) refreshImage();  // 首次连接失败：先用 HTTP 显示图像
+    if (wasOpen && streaming) document.getElementById('live-image').src = '/stream';
+    setTimeout(connectWs, wsRetry);
+    wsRetry = Math.min(wsRetry * 2, 30000);
+  };
+}
+// binary 消息：4 字节帧序号 + JPEG；显示完成后回 ack，设备据此控制推送速度
+function showFrame(buf) {
+  const img = document.getElementById('live-image');
+  const url = URL.createObjectURL(new Blob([new Uint8Array(buf, 4)], { type: 'image/jpeg' }));
+  const old = frameUrl;
+  frameUrl = url;
+  function done() {
+    img.removeEventListener('load', done);
+    img.removeEventListener('error', done);
+    if (old) URL.revokeObjectURL(old);
+    wsSend({ type: 'ack' });
+  }
+  img.addEventListener('load', done);
+  img.addEventListener('error', done);
+  img.src = url;
+}
+function handleWsMessage(msg) {
+  if (msg.id !== undefined && pending[msg.id]) {
+    pending[msg.id](msg);
+  } else if (msg.type === 'detection' && msg.trigger === 'monitor' && !Object.keys(pending).length) {
+    document.getElementById('result').textContent = String(msg.analysis);
+    setStatus('监控识别结果已更新');
+  } else if (msg.type === 'error') {
+    setStatus(msg.message);
+  }
+}
+function refreshImage() {
+  if (streaming) { toggleStream(); return; }
+  if (!wsSend({ type: 'capture' })) document.getElementById('live-image').src = '/capture?' + Date.now();
+  setStatus('图像已刷新');
+}
+function toggleStream() {
+  const img = document.getElementById('live-image');
+  streaming = !streaming;
+  if (!wsSend({ type: 'stream', on: streaming })) img.src = streaming ? '/stream' : '/capture?' + Date.now();
+  document.getElementById('stream-btn').textContent = streaming ? '停止视频' : '实时视频';
+  setStatus(streaming ? '实时视频中' : '视频已停止');
+}
+function analyzeImage() {
+  const prompt = document.getElementById('prompt-input').value;
+  const resultDiv = document.getElementById('result');
+  resultDiv.innerHTML = '<div class="loading">分析中，请稍候...</div>';
+  setStatus('正在分析图像...');
+  let started = false;
+  const timeoutId = setTimeout(() => {
+    if (!started) resultDiv.innerHTML = '<div class="loading">分析时间较长，请耐心等待...</div>';
+  }, 3000);
+  // 增量文本直接追加，done 给出最终状态（SSE 和 WebSocket 的消息字段相同）
+  function onDelta(text) {
+    if (!started) { started = true; clearTimeout(timeoutId); resultDiv.textContent = ''; }
+    resultDiv.textContent += text;
+  }
+  function onDone(msg) {
+    clearTimeout(timeoutId);
+    if (msg.status !== 'success') resultDiv.textContent = '分析失败: ' + msg.message;
+    const via = { local: '（本地识别）', cache: '（缓存）' }[msg.source] || '';
+    setStatus(msg.status === 'success' ? '分析完成' + via : '分析失败');
+  }
+  function onError(err) {
+    clearTimeout(timeoutId);
+    resultDiv.innerHTML = '请求错误: '+err.message;
+    setStatus('请求出错');
+  }
+  const id = ++analyzeId;
+  if (wsOpen) {
+    pending[id] = msg => {
+      if (msg.type === 'delta') { onDelta(msg.delta); return; }
+      delete pending[id];
+      if (msg.type === 'busy') onError(new Error('设备繁忙，请稍后重试'));
+      else onDone(msg);
+    };
+    wsSend({ type: 'analyze', id: id, prompt: prompt });
+    return;
+  }
+  // 处理一条 server-sent event
+  function handleEvent(block) {
+    let event = 'message', data = '';
+    block.split('\n').forEach(line => {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data += line.slice(5).trim();
+    });
+    if (!data) return;
+    const msg = JSON.parse(data);
+    if (event === 'done') onDone(msg);
+    else onDelta(msg.delta);
+  }
+  fetch('/analyze/stream?prompt=' + encodeURIComponent(prompt))
+    .then(resp => {
+      if (resp.status === 429) throw new Error('设备繁忙，请稍后重试');
+      if (!resp.ok) throw new Error(resp.status);
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      function pump() {
+        return reader.read().then(({ done, value }) => {
+          if (done) return;
+          buffer += decoder.decode(value, { stream: true });
+          let idx;
+          while ((idx = buffer.indexOf('\n\n')) >= 0) {
+            handleEvent(buffer.slice(0, idx));
+            buffer = buffer.slice(idx + 2);
+          }
+          return pump();
+        });
+      }
+      return pump();
+    })
+    .then(() => clearTimeout(timeoutId))
+    .catch(onError);
+}
+window.onload = () => { getDeviceIP(); connectWs(); };
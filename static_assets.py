@@ -0,0 +1,187 @@
+import os
+import hashlib
+import ubinascii
+
+# --------- 静态资源 ----------
+# 主页拆成 static/ 下的 index.html / style.css / app.js，预先 gzip 压缩后存放在 flash 中
+# （build_assets.py 在电脑上生成 .gz；缺少 .gz 且固件带 deflate 压缩时在启动时生成）。
+# 压缩数据在首次加载后常驻内存，以 Content-Encoding: gzip 原样发送，
+# 并带强 ETag，浏览器再次访问时用 If-None-Match 得到 304，不再传输页面。
+
+CHUNK_SIZE = 1024  # 不支持 gzip 的客户端：按块从 flash 读取原文件发送
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def _newer(a, b):
+    """文件 a 是否比 b 新（文件系统不记录修改时间时视为不新）"""
+    try:
+        return os.stat(a)[8] > os.stat(b)[8]
+    except (OSError, IndexError):
+        return False
+
+
+def gzip_file(src, dst):
+    """
+    在设备上用 deflate 模块把 src 压缩为 gzip 格式的 dst
+    先写入临时文件，成功后才替换 dst；失败时已有的 dst（如随固件提供的 .gz）保持不变
+    :return: 是否成功（固件未启用 deflate 压缩时返回 False）
+    """
+    try:
+        import deflate
+    except ImportError:
+        return False
+    tmp = dst + ".tmp"
+    buf = bytearray(CHUNK_SIZE)
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            with deflate.DeflateIO(fout, deflate.GZIP) as out:
+                while True:
+                    n = fin.readinto(buf)
+                    if not n:
+                        break
+                    out.write(memoryview(buf)[:n])
+    except (OSError, AttributeError, NotImplementedError) as e:
+        # 只编译了解压支持的固件没有 write()
+        print(f"gzip {src} failed: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+    try:
+        os.rename(tmp, dst)
+    except OSError:
+        # FAT 文件系统上 rename 不能覆盖已有文件
+        os.remove(dst)
+        os.rename(tmp, dst)
+    return True
+
+
+def _digest(data=None, path=None):
+    """内容的 sha256 前 8 字节（十六进制），用作 ETag"""
+    h = hashlib.sha256()
+    if path is None:
+        h.update(data)
+    else:
+        buf = bytearray(CHUNK_SIZE)
+        with open(path, "rb") as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                h.update(memoryview(buf)[:n])
+    return ubinascii.hexlify(h.digest()[:8]).decode()
+
+
+class Asset:
+    """一个静态文件：原文件路径、压缩数据和 ETag"""
+
+    def __init__(self, path, content_type, cache_control):
+        self.path = path
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.gz = None        # gzip 数据（bytes）
+        self.size = 0         # 原文件大小
+        self.etag = None      # gzip 版本的 ETag
+        self.raw_etag = None  # 未压缩版本的 ETag（强 ETag 必须区分编码）
+
+
+class StaticAssets:
+    """
+    静态资源表
+    url -> Asset，load() 在启动时准备好压缩数据，handler(url) 返回路由处理函数
+    """
+
+    def __init__(self, root="static"):
+        self.root = root
+        self.assets = {}
+        self.sent_gzip = 0
+        self.sent_raw = 0
+        self.not_modified = 0
+
+    def add(self, url, name, content_type, cache_control="no-cache"):
+        """
+        注册静态文件
+        :param url: 请求路径
+        :param name: static 目录下的文件名
+        :param content_type: Content-Type
+        :param cache_control: Cache-Control，默认 no-cache（每次用 ETag 验证）
+        """
+        self.assets[url] = Asset(f"{self.root}/{name}", content_type, cache_control)
+
+    def load(self):
+        """准备所有资源的压缩数据和 ETag"""
+        for url, asset in self.assets.items():
+            path = asset.path
+            gz_path = path + ".gz"
+            has_src = _exists(path)
+            if has_src and (not _exists(gz_path) or _newer(path, gz_path)):
+                print(f"Compressing {path}...")
+                gzip_file(path, gz_path)
+            if _exists(gz_path):
+                with open(gz_path, "rb") as f:
+                    asset.gz = f.read()
+                digest = _digest(asset.gz)
+                asset.etag = '"' + digest + '"'
+                asset.raw_etag = '"' + digest + '-raw"'
+            elif has_src:
+                asset.raw_etag = '"' + _digest(path=path) + '-raw"'
+            else:
+                print(f"Missing static file: {path}")
+                continue
+            asset.size = os.stat(path)[6] if has_src else 0
+            print(f"Static {url}: {asset.size} bytes, gzip {len(asset.gz) if asset.gz else '-'} bytes")
+
+    def handler(self, url):
+        """返回发送该资源的路由处理函数"""
+        async def handle(req, resp):
+            await self.serve(req, resp, self.assets[url])
+        return handle
+
+    async def serve(self, req, resp, asset):
+        accept = req.header("accept-encoding", "")
+        use_gzip = asset.gz is not None and "gzip" in accept and "gzip;q=0" not in accept.replace(" ", "")
+        if not use_gzip and not asset.size:
+            await resp.send("Not Found", 404)
+            return
+        etag = asset.etag if use_gzip else asset.raw_etag
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+
+        # 条件请求：ETag 一致时只返回 304
+        match = req.header("if-none-match")
+        if match and (match.strip() == "*" or etag in [t.strip() for t in match.replace("W/", "").split(",")]):
+            self.not_modified += 1
+            await resp.send(status=304, content_type=None, headers=headers)
+            return
+
+        if use_gzip:
+            self.sent_gzip += 1
+            headers["Content-Encoding"] = "gzip"
+            await resp.send(asset.gz, content_type=asset.content_type, headers=headers)
+            return
+
+        # 客户端不接受 gzip：按块发送原文件，不把整个文件读入内存
+        self.sent_raw += 1
+        await resp.send_head(200, asset.content_type, asset.size, headers)
+        buf = bytearray(CHUNK_SIZE)
+        mv = memoryview(buf)
+        with open(asset.path, "rb") as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                await resp.writer.awrite(mv[:n])
+
+    def stats(self):
+        return {
+            "gzip": self.sent_gzip,
+            "identity": self.sent_raw,
+            "not_modified": self.not_modified
+        }
@@ -0,0 +1,301 @@
+import time
+import struct
+import hashlib
+import ubinascii
+import uasyncio as asyncio
+from http_server import write_body
+
+# --------- WebSocket（RFC 6455，服务端） ----------
+# 在 HTTP 连接上升级（101），之后同一条连接双向收发消息：设备推送 JPEG 帧（binary）和 JSON（text），
+# 页面发送命令。与每次刷新都新建一个 HTTP 请求相比，省去了连接建立、请求解析和响应头。
+# - 客户端发来的帧必须带掩码，服务端发出的帧不带掩码
+# - 支持分片消息（continuation），消息大小有上限
+# - 定时 ping，pong 时计算往返时间；超过 timeout_ms 没有收到任何数据时断开
+# - 背压：所有发送经过同一把锁依次写出，写不动时发送方等待；
+#   post() 的消息进入有上限的发件箱，满了丢弃最旧的；
+#   binary 消息按窗口流量控制：客户端处理完一条后回 ack，未确认的达到 window 时 wait_window() 等待
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SMALL = 1024  # 不超过该大小的消息与帧头合并为一次写出（避免小报文分成两个 TCP 分段）
+
+CONT = 0x0
+TEXT = 0x1
+BINARY = 0x2
+CLOSE = 0x8
+PING = 0x9
+PONG = 0xA
+
+# 关闭码
+NORMAL = 1000
+GOING_AWAY = 1001
+PROTOCOL_ERROR = 1002
+INVALID_DATA = 1007
+TOO_BIG = 1009
+
+
+class ProtocolError(Exception):
+    """客户端违反协议，以 code 关闭连接"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def accept_key(key):
+    """Sec-WebSocket-Accept = base64(sha1(key + GUID))"""
+    return ubinascii.b2a_base64(hashlib.sha1(key.encode() + GUID).digest()).strip().decode()
+
+
+def header(opcode, length):
+    """服务端帧头（FIN，无掩码）"""
+    if length < 126:
+        return bytearray((0x80 | opcode, length))
+    if length < 0x10000:
+        return bytearray(struct.pack("!BBH", 0x80 | opcode, 126, length))
+    return bytearray(struct.pack("!BBII", 0x80 | opcode, 127, 0, length))
+
+
+async def accept(req, resp, **kwargs):
+    """
+    完成握手
+    :param kwargs: 传给 WebSocket 的参数
+    :return: WebSocket，不是有效的升级请求时返回 None（已发送 426）
+    """
+    key = req.header("sec-websocket-key")
+    if req.header("upgrade", "").lower() != "websocket" or "upgrade" not in req.header("connection", "").lower() or not key:
+        await resp.send("WebSocket upgrade expected", 426, headers={"Upgrade": "websocket"})
+        return None
+    if req.header("sec-websocket-version") != "13":
+        await resp.send("Unsupported WebSocket version", 426, headers={"Sec-WebSocket-Version": "13"})
+        return None
+    await resp.upgrade("websocket", {"Sec-WebSocket-Accept": accept_key(key)})
+    ws = WebSocket(resp.reader, resp.writer, **kwargs)
+    ws.start()
+    return ws
+
+
+class WebSocket:
+    """
+    一条 WebSocket 连接
+    receive() 读取消息（控制帧在内部处理），send() / post() 发送
+    """
+
+    def __init__(self, reader, writer, max_message=4096, ping_ms=15000, timeout_ms=45000, max_outbox=8, window=2):
+        """
+        :param max_message: 接收消息的大小上限（字节），超过时以 1009 关闭
+        :param ping_ms: 发送 ping 的间隔
+        :param timeout_ms: 超过该时间没有收到任何帧（包括 pong）时断开
+        :param max_outbox: post() 发件箱的消息数上限
+        :param window: 未确认的 binary 消息上限
+        """
+        self.reader = reader
+        self.writer = writer
+        self.max_message = max_message
+        self.ping_ms = ping_ms
+        self.timeout_ms = timeout_ms
+        self.max_outbox = max_outbox
+        self.window = window
+        self.closed = False
+        self.outbox = []
+        self.unacked = 0
+        self.rtt_ms = None
+        self.last_recv = time.ticks_ms()
+        self._last_ping = self.last_recv
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._acked = asyncio.Event()
+        self._task = None
+        # 统计
+        self.received = 0
+        self.sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0  # 发件箱满被丢弃的消息数
+
+    def start(self):
+        self._task = asyncio.create_task(self._keep())
+
+    async def _read_frame(self):
+        """:return: (FIN, 操作码, 去掉掩码后的数据)"""
+        head = await self.reader.readexactly(2)
+        n = head[1] & 0x7F
+        if not head[1] & 0x80:
+            raise ProtocolError(PROTOCOL_ERROR, "client frame not masked")
+        if n == 126:
+            n = struct.unpack("!H", await self.reader.readexactly(2))[0]
+        elif n == 127:
+            hi, n = struct.unpack("!II", await self.reader.readexactly(8))
+            if hi:
+                raise ProtocolError(TOO_BIG, "message too big")
+        if n > self.max_message:
+            raise ProtocolError(TOO_BIG, "message too big")
+        mask = await self.reader.readexactly(4)
+        data = bytearray(await self.reader.readexactly(n)) if n else bytearray()
+        for i in range(n):
+            data[i] ^= mask[i & 3]
+        return head[0] & 0x80, head[0] & 0x0F, data
+
+    async def receive(self):
+        """
+        读取下一条消息
+        :return: str（text）或 bytes（binary），连接关闭时返回 None
+        """
+        message = None
+        kind = None
+        while not self.closed:
+            try:
+                fin, opcode, data = await self._read_frame()
+                self.last_recv = time.ticks_ms()
+                if opcode >= CLOSE:
+                    if not fin or len(data) > 125:
+                        raise ProtocolError(PROTOCOL_ERROR, "bad control frame")
+                    if opcode == CLOSE:
+                        code = struct.unpack("!H", data[:2])[0] if len(data) >= 2 else NORMAL
+                        await self.close(code)
+                        return None
+                    if opcode == PING:
+                        await self._send(PONG, data)
+                    elif opcode == PONG and len(data) == 4:
+                        self.rtt_ms = time.ticks_diff(self.last_recv, struct.unpack("!I", data)[0])
+                    continue
+                if opcode == CONT:
+                    if message is None:
+                        raise ProtocolError(PROTOCOL_ERROR, "unexpected continuation")
+                    if len(message) + len(data) > self.max_message:
+                        raise ProtocolError(TOO_BIG, "message too big")
+                    message += data
+                elif opcode in (TEXT, BINARY):
+                    if message is not None:
+                        raise ProtocolError(PROTOCOL_ERROR, "interleaved message")
+                    kind = opcode
+                    message = data
+                else:
+                    raise ProtocolError(PROTOCOL_ERROR, "unknown opcode")
+                if fin:
+                    self.received += 1
+                    if kind == TEXT:
+                        try:
+                            return message.decode()
+                        except UnicodeError:
+                            raise ProtocolError(INVALID_DATA, "invalid UTF-8")
+                    return bytes(message)
+            except ProtocolError as e:
+                print(f"WebSocket protocol error: {e}")
+                await self.close(e.code)
+                return None
+            except (OSError, EOFError):
+                self.abort()
+                return None
+        return None
+
+    async def _send(self, opcode, data=b"", prefix=None):
+        """写出一帧；prefix 与帧头一起写出，较大的 data 单独分块写出（不复制）"""
+        if self.closed:
+            raise OSError("websocket closed")
+        n = len(data) + (len(prefix) if prefix else 0)
+        head = header(opcode, n)
+        if prefix:
+            head += prefix
+        if len(data) <= SMALL:
+            head += data
+            data = b""
+        async with self._lock:
+            await self.writer.awrite(head)
+            if data:
+                await write_body(self.writer, data)
+        self.bytes_sent += len(head) + len(data)
+
+    async def send(self, data, binary=False, prefix=None):
+        """
+        发送一条消息（等待写出）
+        :param data: str 或 bytes
+        :param prefix: binary 消息在 data 前附加的字节（如帧序号）
+        :raises OSError: 连接已关闭
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        await self._send(BINARY if binary else TEXT, data, prefix)
+        self.sent += 1
+        if binary:
+            self.unacked += 1
+
+    def post(self, text):
+        """放入发件箱后立即返回，由后台任务发送；发件箱满时丢弃最旧的"""
+        if self.closed:
+            return
+        self.outbox.append(text)
+        if len(self.outbox) > self.max_outbox:
+            self.outbox.pop(0)
+            self.dropped += 1
+        self._wake.set()
+
+    def ack(self, n=1):
+        """客户端确认处理完 n 条 binary 消息"""
+        self.unacked = max(0, self.unacked - n)
+        self._acked.set()
+
+    async def wait_window(self):
+        """等待未确认的 binary 消息少于 window"""
+        while self.unacked >= self.window and not self.closed:
+            self._acked.clear()
+            await self._acked.wait()
+        if self.closed:
+            raise OSError("websocket closed")
+
+    async def _keep(self):
+        """后台任务：发送发件箱中的消息、定时 ping、检测超时（每次写出都限时，客户端不读时也能断开）"""
+        limit = self.timeout_ms / 1000
+        try:
+            while not self.closed:
+                self._wake.clear()
+                while self.outbox and not self.closed:
+                    await asyncio.wait_for(self.send(self.outbox.pop(0)), limit)
+                now = time.ticks_ms()
+                if time.ticks_diff(now, self.last_recv) > self.timeout_ms:
+                    raise OSError("timeout")
+                if time.ticks_diff(now, self._last_ping) >= self.ping_ms:
+                    self._last_ping = now
+                    await asyncio.wait_for(self._send(PING, struct.pack("!I", now)), limit)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), min(self.ping_ms, 1000) / 1000)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WebSocket closed: {e}")
+            self.abort()
+
+    async def close(self, code=NORMAL):
+        """发送关闭帧并关闭连接"""
+        if not self.closed:
+            try:
+                await asyncio.wait_for(self._send(CLOSE, struct.pack("!H", code)), 1)
+            except Exception:
+                pass
+        self.abort()
+
+    def abort(self):
+        """立即关闭连接（正在等待的读写会以异常结束）"""
+        if self.closed:
+            return
+        self.closed = True
+        self._acked.set()
+        self._wake.set()
+        # uasyncio 中 close() 什么也不做，wait_closed() 才关闭套接字，阻塞在 receive() 中的读取随之结束
+        asyncio.create_task(self._shutdown())
+
+    async def _shutdown(self):
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "unacked": self.unacked,
+            "rtt_ms": self.rtt_ms
+        }
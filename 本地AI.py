@@ -1,8 +1,7 @@
 import network
-import urequests
-import json
-import gc
-import ubinascii
+import uasyncio as asyncio
+import async_http
+import llm_client
 
 # 连接WiFi
 sta_if = network.WLAN(network.STA_IF)
@@ -16,95 +15,48 @@ print("Connected! IP:", sta_if.ifconfig()[0])
 API_KEY = "sk-4******************28"  # 请使用有效密钥
 API_URL = "https://api.deepseek.com/v1/chat/completions"
 
-def ask_llm(prompt):
-    # 创建请求头
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json; charset=utf-8"  # 添加字符集声明
-    }
-    
-    # 创建请求体
-    payload = {
-        "model": "deepseek-chat",
-        "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": 100,
-        "temperature": 0.7
-    }
-    
-    try:
-        print("\nSending request to DeepSeek API...")
-        
-        # 手动构建JSON字符串（确保UTF-8编码）
-        json_payload = '{"model":"deepseek-chat","messages":[{"role":"user","content":"'
-        
-        # 安全转义中文字符
-        escaped_prompt = ""
-        for char in prompt:
-            if char == '"':
-                escaped_prompt += '\\"'
-            elif char == '\\':
-                escaped_prompt += '\\\\'
-            else:
-                escaped_prompt += char
-        
-        json_payload += escaped_prompt
-        json_payload += '"}],"max_tokens":100,"temperature":0.7}'
-        
-        print("JSON Payload:", json_payload)
-        print("Length:", len(json_payload))
-        
-        # 发送请求前检查内存
-        gc.collect()
-        free_mem = gc.mem_free()
-        alloc_mem = gc.mem_alloc()
-        print(f"Memory: Free={free_mem}, Allocated={alloc_mem}")
-        
-        # 发送请求（显式编码为UTF-8）
-        response = urequests.post(
-            API_URL, 
-            headers=headers, 
-            data=json_payload.encode('utf-8')  # 关键修改：显式编码
-        )
-        
-        status = response.status_code
-        raw_response = response.text
-        
-        print(f"API Response Status: {status}")
-        print("Raw Response:", raw_response[:200])  # 打印前200个字符
-        
-        # 检查HTTP状态码
-        if status != 200:
-            return f"API error {status}: {raw_response[:100]}"  # 返回错误摘要
-        
-        # 解析JSON响应
-        try:
-            response_data = json.loads(raw_response)
-            
-            # 提取助手的回复内容
-            if "choices" in response_data and len(response_data["choices"]) > 0:
-                return response_data["choices"][0]["message"]["content"]
-            else:
-                return "Unexpected API response format"
-                
-        except ValueError as e:
-            print("JSON parse error:", e)
-            return "JSON parse error in API response"
-            
-    except Exception as e:
-        print("Request failed:", e)
-        return f"API request failed: {str(e)}"
+# keep-alive 连接池：连续提问时复用同一条 TLS 连接，省去每次的握手
+api_pool = async_http.ConnectionPool(max_idle=1, idle_ms=20000)
 
-# 使用示例
-print("\n=== DeepSeek API 测试 ===")
+# 请求头和请求体模板只生成一次，提问时只转义并拼接提示词
+client = llm_client.LLMClient(llm_client.deepseek(API_KEY, url=API_URL), pool=api_pool)
 
-# 测试中文问题 - 使用简单中文
-question = "什么是MicroPython?"
-print(f"\n提问: {question}")
-response = ask_llm(question)
-print(f"\nAI回复: {response}")
+async def ask_llm(prompt, on_delta=None):
+    """
+    向DeepSeek提问
+    :param prompt: 问题
+    :param on_delta: 可选协程回调。提供时使用流式模式（stream: true），
+                     每收到一段增量文本即 await on_delta(text)，不缓存完整回复
+    :return: 非流式模式返回AI回复；流式模式成功时返回 None；出错返回错误信息
+    """
+    return await client.ask(prompt, on_delta)
+
+# 使用示例
+async def main():
+    print("\n=== DeepSeek API 测试 ===")
+    
+    # 测试中文问题 - 使用简单中文
+    question = "什么是MicroPython?"
+    print(f"\n提问: {question}")
+    response = await ask_llm(question)
+    print(f"\nAI回复: {response}")
+    
+    # 测试更复杂的中文问题（复用上一次的连接）
+    question = "ESP32和MicroPython有什么关系？"
+    print(f"\n提问: {question}")
+    response = await ask_llm(question)
+    print(f"\nAI回复: {response}")
+    
+    # 流式输出：回复边生成边打印
+    question = "用一句话介绍ESP32"
+    print(f"\n提问: {question}")
+    print("\nAI回复: ", end="")
+    async def show(text):
+        print(text, end="")
+    error = await ask_llm(question, on_delta=show)
+    print("" if error is None else error)
+    
+    print(f"\n连接统计: {api_pool.stats()}")
+    await api_pool.close_all()
 
-# 测试更复杂的中文问题
-question = "ESP32和MicroPython有什么关系？"
-print(f"\n提问: {question}")
-response = ask_llm(question)
-print(f"\nAI回复: {response}")
\ No newline at end of file
+asyncio.run(main())
\ No newline at end of file